@@ -1,53 +1,248 @@
 #from langchain.chat_models import ChatOpenAI
 from langchain.schema import SystemMessage, HumanMessage, AIMessage
-from typing import List
+import copy
+import asyncio
+from typing import AsyncIterator, List
 
 # OLD (OpenAI)
 # from langchain.chat_models import ChatOpenAI
 
 # NEW (Ollama)
-from langchain_community.chat_models import ChatOllama
 from langchain.schema import SystemMessage, HumanMessage, AIMessage
+from agents.registry import get_llm
 from utils.agent_logger import log_agent_interaction
 from utils.memory_store import save_memory, get_recent_context
+from utils.llm_cache import get_llm_cache, make_cache_key, cache_bypassed
+from utils.context_window import ContextWindow
+from utils.prompt_registry import get_prompt
+from utils.agent_limits import TIMEOUT_MARKER, agent_timeout, agent_num_predict
+from utils.model_routing import get_route
+from utils.ollama_client import call_timings
+from utils.structured_output import SchemaViolation, ollama_format, parse_structured, structured_retries, violation_feedback
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TEMPERATURE = 0.1
 
 
 
 class BaseAgent:
-    def __init__(self, system_prompt: str, model: str = "mistral", temperature: float = 0.1):
-        self.llm = ChatOllama(model=model, temperature=temperature)
+    def __init__(self, system_prompt: str, model: str = None, temperature: float = None, cache_responses: bool = False,
+                 token_budget: int = None, keep_turns: int = None, prompt_name: str = None,
+                 timeout: float = None, num_predict: int = None, task: str = "default"):
+        agent_name = self.__class__.__name__
+        # Model and generation settings come from the task's route (utils/model_routing.py);
+        # explicit arguments take precedence
+        self.task = task
+        route = get_route(task)
+        self.model = model or route["model"]
+        self.temperature = temperature if temperature is not None else route.get("temperature", DEFAULT_TEMPERATURE)
+        # Deadline per call and output-token cap (utils/agent_limits.py); None means unlimited
+        self.timeout = timeout if timeout is not None else agent_timeout(agent_name)
+        if num_predict is None:
+            num_predict = route.get("num_predict", agent_num_predict(agent_name))
+        self.num_predict = num_predict
+        # The client is stateless and shared by every agent using the same model settings
+        self.num_ctx = route.get("num_ctx")
+        self.llm = get_llm(self.model, self.temperature, self.num_predict, self.num_ctx, route.get("keep_alive"))
         self.system_prompt = system_prompt
+        # Name of the prompts/ template the system prompt came from; edits to it are picked up per call
+        self.prompt_name = prompt_name
+        # Identical prompts are answered from the on-disk response cache (utils/llm_cache.py);
+        # off by default, the deterministic agents opt in
+        self.cache_responses = cache_responses and not cache_bypassed(self.__class__.__name__)
         self.history = [SystemMessage(content=system_prompt)]
+        # Completed (HumanMessage, AIMessage) turns; bounded by the context window
+        self.turns = []
+        self.context_window = ContextWindow(token_budget=token_budget, keep_turns=keep_turns)
+        self.last_prompt_tokens = 0
 
+    def task_llm(self, task: str):
+        """(model, client) for a sub-task routed separately from the agent's own task, e.g. entity extraction."""
+        route = get_route(task)
+        client = get_llm(route["model"], route.get("temperature", self.temperature),
+                         route.get("num_predict", self.num_predict), route.get("num_ctx"), route.get("keep_alive"))
+        return route["model"], client
 
+    def fork(self):
+        """
+        Shallow copy with fresh conversation state: the LLM client and anything else built in
+        __init__ (executor, KG handles) stay shared. Used by agents/registry.py for per-session agents.
+        """
+        agent = copy.copy(self)
+        agent.history = [SystemMessage(content=self.system_prompt)]
+        agent.turns = []
+        agent.context_window = ContextWindow(token_budget=self.context_window.token_budget,
+                                             keep_turns=self.context_window.keep_turns,
+                                             summarize=self.context_window.summarize)
+        agent.last_prompt_tokens = 0
+        return agent
 
-    async def __call__(self, user_msg: str) -> str:
-        self.history.append(HumanMessage(content=user_msg))
-        # Include recent memory context if exists
-        recent_msgs = get_recent_context(self.__class__.__name__, key="user_intent")
+    def _refresh_system_prompt(self) -> None:
+        if not self.prompt_name:
+            return
+        system_prompt = get_prompt(self.prompt_name, default=self.system_prompt)
+        if system_prompt != self.system_prompt:
+            self.system_prompt = system_prompt
+            self.history[0] = SystemMessage(content=system_prompt)
+
+    def _build_prompt(self, user_msg: str):
+        """System prompt + recent turns within the token budget + this turn (and memory context, not kept)."""
+        self._refresh_system_prompt()
+        current = [HumanMessage(content=user_msg)]
+        # Include recent memory context if exists. Caching agents go without: it changes whenever any
+        # session saves an intent, so the same request would never be answered from the cache.
+        caching = self.cache_responses and get_llm_cache().enabled
+        recent_msgs = [] if caching else get_recent_context(self.__class__.__name__, key="user_intent")
         if recent_msgs:
             memory_str = "\n".join(f"Previous intent: {m}" for m in recent_msgs)
-            self.history.append(SystemMessage(content=f"Context from memory:\n{memory_str}"))
+            current.append(SystemMessage(content=f"Context from memory:\n{memory_str}"))
+        return self.context_window.build(self.history[0], self.turns, current)
 
-        try:
-            response = await self.llm.agenerate([self.history])
-            # Save current user intent
-            save_memory(self.__class__.__name__, key="user_intent", value=user_msg)
+    def _remember_turn(self, user_msg: str, msg: str) -> None:
+        self.turns.append([HumanMessage(content=user_msg), AIMessage(content=msg)])
+        self.turns = self.context_window.trim(self.turns)
+        self.history = [self.history[0]] + [m for turn in self.turns for m in turn]
+
+    def _prepare(self, user_msg: str):
+        """Builds the prompt and looks it up in the response cache: (messages, prompt_tokens, cache_key, cached reply)."""
+        messages, prompt_tokens = self._build_prompt(user_msg)
+        self.last_prompt_tokens = prompt_tokens
+        logger.info(f"{self.__class__.__name__}: sending ~{prompt_tokens} prompt tokens ({len(messages)} messages).")
+        cache = get_llm_cache()
+        cache_key = None
+        cached = None
+        if self.cache_responses and cache.enabled:
+            # Keyed on exactly what is sent: every message and the generation options
+            cache_key = make_cache_key(self.model, self.temperature, self.system_prompt, messages,
+                                       options={"num_predict": self.num_predict, "num_ctx": self.num_ctx})
+            cached = cache.get(cache_key)
+        return messages, prompt_tokens, cache_key, cached
+
+    def _finish_turn(self, user_msg: str, msg: str, prompt_tokens: int, cache_key: str = None, cache_hit: bool = False,
+                     timings: dict = None) -> None:
+        """Caches the reply and records it in memory, history and the interaction log (with Ollama's `timings`)."""
+        if cache_key and not cache_hit:
+            get_llm_cache().set(cache_key, msg, model=self.model)
+        # Save current user intent
+        save_memory(self.__class__.__name__, key="user_intent", value=user_msg)
+
+        self._remember_turn(user_msg, msg)
+
+        # ✅ Log interaction
+        log_agent_interaction(
+            agent_name=self.__class__.__name__,
+            input_text=user_msg,
+            output_text=msg,
+            context={"system_prompt": self.system_prompt, "cache_hit": cache_hit, "prompt_tokens": prompt_tokens,
+                     "model": self.model, "task": self.task, "llm_timings": timings or {}}
+        )
+
+    async def with_deadline(self, coro):
+        """Awaits `coro` for at most self.timeout seconds; on expiry it is cancelled and TimeoutError raised."""
+        return await asyncio.wait_for(coro, self.timeout)
 
-            msg = response.generations[0][0].text
-            print("🧠 Response from LLM:", msg)  # DEBUG
-            self.history.append(AIMessage(content=msg))
+    def _timeout_message(self) -> str:
+        logger.warning(f"{self.__class__.__name__}: LLM call timed out after {self.timeout:g}s.")
+        return f"{TIMEOUT_MARKER} after {self.timeout:g}s"
 
-            # ✅ Log interaction
+    async def structured(self, messages: List, schema: dict, task: str = None, retries: int = None) -> dict:
+        """
+        The reply to `messages` as JSON matching `schema` (utils/structured_output.py), from the agent's
+        client or the one routed for `task`. Only a schema violation is retried, with the errors fed
+        back to the model; it raises SchemaViolation once retries run out. LLM errors and
+        timeouts propagate to the caller unretried.
+        """
+        model, client = self.task_llm(task) if task else (self.model, self.llm)
+        retries = structured_retries() if retries is None else retries
+        messages = list(messages)
+        request = messages[-1].content
+        for attempt in range(retries + 1):
+            response = await self.with_deadline(client.agenerate([messages], format=ollama_format(schema)))
+            generation = response.generations[0][0]
+            try:
+                data = parse_structured(generation.text, schema)
+            except SchemaViolation as violation:
+                logger.warning(f"{self.__class__.__name__}: {model} reply violates the schema "
+                               f"(attempt {attempt + 1}/{retries + 1}): {violation}")
+                if attempt == retries:
+                    raise
+                messages += [AIMessage(content=generation.text), HumanMessage(content=violation_feedback(violation))]
+                continue
             log_agent_interaction(
                 agent_name=self.__class__.__name__,
-                input_text=user_msg,
-                output_text=msg,
-                context={"system_prompt": self.system_prompt}
+                input_text=request,
+                output_text=generation.text,
+                context={"task": task or self.task, "model": model, "structured": True, "attempts": attempt + 1,
+                         "llm_timings": call_timings(generation.generation_info)}
             )
+            return data
 
+    async def __call__(self, user_msg: str) -> str:
+        try:
+            messages, prompt_tokens, cache_key, msg = self._prepare(user_msg)
+            cache_hit = msg is not None
+            timings = None
+            if not cache_hit:
+                response = await self.with_deadline(self.llm.agenerate([messages]))
+                msg = response.generations[0][0].text
+                timings = call_timings(response.generations[0][0].generation_info)
+                logger.debug(f"{self.__class__.__name__}: response from LLM: {msg}")
+            else:
+                logger.debug(f"{self.__class__.__name__}: response from cache: {msg}")
+            self._finish_turn(user_msg, msg, prompt_tokens, cache_key, cache_hit, timings)
             return msg.strip()
+        except asyncio.TimeoutError:
+            return self._timeout_message()
         except Exception as e:
             print("❌ LLM failed:", str(e))
             return "# ERROR: LLM call failed"
 
+    async def stream(self, user_msg: str) -> AsyncIterator[str]:
+        """
+        Yields the reply in chunks as the model generates it (a cached reply arrives as one chunk).
+        Once the stream completes, memory, history, cache and log are updated as in __call__.
+        """
+        try:
+            messages, prompt_tokens, cache_key, cached = self._prepare(user_msg)
+        except Exception as e:
+            print("❌ LLM failed:", str(e))
+            yield "# ERROR: LLM call failed"
+            return
+        if cached is not None:
+            yield cached
+            self._finish_turn(user_msg, cached, prompt_tokens, cache_key, cache_hit=True)
+            return
+
+        chunks = []
+        timings = None
+        loop = asyncio.get_running_loop()
+        # The deadline covers the whole reply, not each chunk
+        deadline = loop.time() + self.timeout if self.timeout else None
+        stream = self.llm.astream(messages)
+        try:
+            while True:
+                remaining = None if deadline is None else max(0.0, deadline - loop.time())
+                try:
+                    chunk = await asyncio.wait_for(anext(stream), remaining)
+                except StopAsyncIteration:
+                    break
+                if chunk.response_metadata.get("done"):
+                    timings = call_timings(chunk.response_metadata)
+                if chunk.content:
+                    chunks.append(chunk.content)
+                    yield chunk.content
+        except asyncio.TimeoutError:
+            # Closing the generator closes the HTTP response, so Ollama stops generating
+            await stream.aclose()
+            yield ("\n\n" if chunks else "") + self._timeout_message()
+            return
+        except Exception as e:
+            print("❌ LLM failed:", str(e))
+            if not chunks:
+                yield "# ERROR: LLM call failed"
+            return
+        msg = "".join(chunks)
+        logger.debug(f"{self.__class__.__name__}: streamed response from LLM: {msg}")
+        self._finish_turn(user_msg, msg, prompt_tokens, cache_key, timings=timings)
@@ -1,18 +1,13 @@
 from .base_agent import BaseAgent
-from pathlib import Path
+from utils.prompt_registry import get_prompt
 # from kg_interface import KGInterface # No longer directly needed if context is prepared externally
 
 class CritiqueAgent(BaseAgent):
     def __init__(self):
-        prompt_path = Path("prompts/critique_agent.txt")
-        if not prompt_path.exists():
-            # Fallback or error if prompt file is missing, though it should have been created
-            system_prompt = "You are a helpful NDT critique agent."
-            print(f"Warning: Prompt file {prompt_path} not found. Using default system prompt.")
-        else:
-            system_prompt = prompt_path.read_text()
+        # Falls back to a default if prompts/critique_agent.txt is missing (logged by the registry)
+        system_prompt = get_prompt("critique_agent", default="You are a helpful NDT critique agent.")
 
-        super().__init__(system_prompt, temperature=0.1) # Critique should be fairly consistent
+        super().__init__(system_prompt, prompt_name="critique_agent", task="critique", cache_responses=True) # Temperature from the "critique" route
         # self.kg = KGInterface() # Context including RAG details is expected to be passed to run()
 
     async def run(self, critique_context: str) -> str:
@@ -1,11 +1,10 @@
 from .base_agent import BaseAgent
-from pathlib import Path
+from utils.prompt_registry import get_prompt
 import datetime as dt
 
 class ForecasterAgent(BaseAgent):
     def __init__(self):
-        prompt = Path("prompts/forecaster.txt").read_text()
-        super().__init__(prompt)
+        super().__init__(get_prompt("forecaster"), prompt_name="forecaster", task="forecast")
 
     async def run(self, context: str) -> str:
         today = dt.date.today().isoformat()
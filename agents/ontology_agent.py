@@ -1,10 +1,9 @@
 from .base_agent import BaseAgent
-from pathlib import Path
+from utils.prompt_registry import get_prompt
 
 class OntologyBuilderAgent(BaseAgent):
     def __init__(self):
-        prompt = Path("prompts/ontology_builder.txt").read_text()
-        super().__init__(prompt, temperature=0.0)
+        super().__init__(get_prompt("ontology_builder"), prompt_name="ontology_builder", task="ontology", cache_responses=True)
 
     async def run(self, cq: str) -> str:
         return await self(cq)
@@ -8,6 +8,7 @@ from agents.forecaster_agent import ForecasterAgent
 from agents.risk_assessment_agent import RiskAssessmentAgent
 from agents.tool_agent import ToolSelectorAgent
 from utils.session_utils import log_agent_response  # ✅ Import the logger
+from utils.prompt_registry import get_prompt
 from pathlib import Path
 from datetime import date
 import asyncio
@@ -15,8 +16,7 @@ import asyncio
 
 class PlannerAgent(BaseAgent):
     def __init__(self):
-        prompt = Path("prompts/planner.txt").read_text()
-        super().__init__(prompt, temperature=0.0)
+        super().__init__(get_prompt("planner"), prompt_name="planner", task="planning", cache_responses=True)
 
     # In agents/planner_agent.py
     async def __call__(self, user_msg: str, plan_id: str = None) -> str:
@@ -25,3 +25,10 @@ class PlannerAgent(BaseAgent):
             log_agent_response(plan_id, "PlannerAgent", plan_text, user_input=user_msg)
         return plan_text
 
+    async def stream(self, user_msg: str, plan_id: str = None):
+        chunks = []
+        async for chunk in super().stream(user_msg):
+            chunks.append(chunk)
+            yield chunk
+        if plan_id:
+            log_agent_response(plan_id, "PlannerAgent", "".join(chunks).strip(), user_input=user_msg)
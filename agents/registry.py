@@ -0,0 +1,89 @@
+# agents/registry.py
+"""
+Process-level registry of agents.
+
+Building an agent is not free: ToolSelectorAgent loads its ReAct prompt, opens KG handles
+and builds an AgentExecutor. The registry builds one prototype per agent class per process
+and hands out per-session copies (BaseAgent.fork) that share the heavy parts: the LLM client,
+the executor and the KG handles. Conversation state (history, turns, context window) is
+separate per copy, so Streamlit sessions never see each other's turns.
+"""
+import logging
+import threading
+from typing import Dict, Optional, Tuple, Type, TypeVar
+
+logger = logging.getLogger(__name__)
+
+AgentT = TypeVar("AgentT")
+
+_prototypes: Dict[type, object] = {}
+_llms: Dict[Tuple, object] = {}
+_kg = None
+_async_kg = None
+_lock = threading.RLock()
+
+
+def get_llm(model: str, temperature: float, num_predict: Optional[int] = None, num_ctx: Optional[int] = None,
+            keep_alive=None):
+    """
+    Shared client per model and generation settings; the client holds no conversation state.
+    All clients send their requests over the same connection pools (utils/ollama_client.py).
+    """
+    from utils.ollama_client import OllamaChat, base_url
+
+    key = (model, temperature, num_predict, num_ctx, keep_alive)
+    with _lock:
+        llm = _llms.get(key)
+        if llm is None:
+            llm = OllamaChat(base_url=base_url(), model=model, temperature=temperature, num_predict=num_predict,
+                             num_ctx=num_ctx, keep_alive=keep_alive)
+            _llms[key] = llm
+    return llm
+
+
+def get_shared_kg():
+    """Process-wide KGInterface (the driver underneath is pooled by utils/neo4j_pool.py)."""
+    global _kg
+    from kg_interface import KGInterface
+
+    with _lock:
+        if _kg is None:
+            _kg = KGInterface()
+    return _kg
+
+
+def get_shared_async_kg():
+    """Process-wide AsyncKGInterface; its driver is resolved per event loop on first use."""
+    global _async_kg
+    from kg_interface_async import AsyncKGInterface
+
+    with _lock:
+        if _async_kg is None:
+            _async_kg = AsyncKGInterface()
+    return _async_kg
+
+
+def get_shared_agent(agent_cls: Type[AgentT]) -> AgentT:
+    """The process-wide prototype of `agent_cls`, built on first use. Don't converse with it directly."""
+    with _lock:
+        agent = _prototypes.get(agent_cls)
+        if agent is None:
+            logger.info(f"Building shared {agent_cls.__name__}.")
+            agent = agent_cls()
+            _prototypes[agent_cls] = agent
+    return agent
+
+
+def new_session_agent(agent_cls: Type[AgentT]) -> AgentT:
+    """A per-session agent: shares the prototype's clients, has its own conversation state."""
+    return get_shared_agent(agent_cls).fork()
+
+
+def clear_registry() -> None:
+    """Drops every shared agent and client, e.g. after changing prompts or models."""
+    global _kg, _async_kg
+    with _lock:
+        _prototypes.clear()
+        _llms.clear()
+        _kg = None
+        _async_kg = None
@@ -1,17 +1,12 @@
 from .base_agent import BaseAgent
-from pathlib import Path
+from utils.prompt_registry import get_prompt
 # from kg_interface import KGInterface # No longer directly needed if context is prepared externally
 
 class RiskAssessmentAgent(BaseAgent):
     def __init__(self):
-        prompt_path = Path("prompts/risk_assessment_agent.txt")
-        if not prompt_path.exists():
-            system_prompt = "You are a helpful NDT risk assessment agent."
-            print(f"Warning: Prompt file {prompt_path} not found. Using default system prompt.")
-        else:
-            system_prompt = prompt_path.read_text()
+        system_prompt = get_prompt("risk_assessment_agent", default="You are a helpful NDT risk assessment agent.")
 
-        super().__init__(system_prompt, temperature=0.0) # Risks should be identified consistently
+        super().__init__(system_prompt, prompt_name="risk_assessment_agent", task="risk", cache_responses=True) # Temperature from the "risk" route
         # KG access will be indirect via context prepared by app/main.py, so no self.kg needed.
 
     async def run(self, risk_assessment_context: str) -> str:
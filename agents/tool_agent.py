@@ -1,15 +1,43 @@
 from .base_agent import BaseAgent
-from kg_interface import KGInterface
+from agents.registry import get_shared_kg, get_shared_async_kg
 from pathlib import Path
 from langchain.schema import SystemMessage, HumanMessage
 from langchain.tools import Tool
-from langchain.agents import AgentExecutor, create_react_agent
-from langchain import hub
-from langchain.prompts import PromptTemplate # For fallback prompt
-import json
+from langchain.agents import AgentExecutor, AgentOutputParser, create_react_agent
+from langchain.agents.format_scratchpad import format_log_to_str
+from langchain.prompts import PromptTemplate
+from langchain.tools.render import render_text_description
+from langchain_core.agents import AgentAction, AgentFinish
+from langchain_core.exceptions import OutputParserException
+from langchain_core.runnables import RunnablePassthrough
+from utils.prompt_registry import REACT_PROMPT_NAME, REACT_JSON_PROMPT_NAME, get_prompt
+from utils.structured_output import (ENTITY_SCHEMA, FINAL_ANSWER, SchemaViolation, ollama_format, parse_structured,
+                                     react_step_schema, violation_feedback)
+from utils.gazetteer import SLOTS, Gazetteer
+from utils.kg_cache import get_graph_version
+from utils.agent_logger import log_agent_interaction
+from utils.agent_limits import is_timeout
+from typing import Optional
+import os
+import asyncio
 
-# Basic ReAct prompt template string (fallback if hub.pull fails)
-# This is a simplified version of hwchase17/react. For best results, the hub version is preferred.
+METHOD_NAMES_HEADER = "Recommended Method Names:"
+SENSOR_NAMES_HEADER = "Recommended Sensor Names:"
+
+# (graph version, Gazetteer) for local entity extraction, see ToolSelectorAgent._get_gazetteer
+_gazetteer = None
+
+
+def structured_mode() -> str:
+    """TOOL_SELECTOR_MODE: "kg" answers run_structured from the KG plus one LLM call, "agent" uses the ReAct executor."""
+    return os.getenv("TOOL_SELECTOR_MODE", "kg").lower()
+
+
+def react_format() -> str:
+    """TOOL_SELECTOR_REACT_FORMAT: "json" constrains each ReAct step to a JSON schema, "text" is the classic ReAct format."""
+    return os.getenv("TOOL_SELECTOR_REACT_FORMAT", "json").lower()
+
+# Basic ReAct prompt template string (fallback if prompts/react.txt is missing or invalid)
 FALLBACK_REACT_PROMPT_TEMPLATE = """\
 Answer the following questions as best you can. You have access to the following tools:
 
@@ -31,69 +59,143 @@ Begin!
 Question: {input}
 Thought:{agent_scratchpad}"""
 
+# JSON ReAct template (fallback if prompts/react_json.txt is missing or invalid)
+FALLBACK_JSON_REACT_PROMPT_TEMPLATE = """\
+Answer the following questions as best you can. You have access to the following tools:
+
+{tools}
+
+Reply to each step with one JSON object: {{"thought": "...", "action": "one of [{tool_names}]", "action_input": "..."}}
+When you know the final answer, use the action "Final Answer" with the answer in prose as action_input, and add
+"recommended_methods" and "recommended_sensors" as lists of exact names.
+
+Question: {input}
+{agent_scratchpad}"""
+
+
+class JsonReActOutputParser(AgentOutputParser):
+    """Turns one schema-constrained ReAct step (see react_step_schema) into a tool call or the final answer."""
+
+    step_schema: dict
+
+    def parse(self, text: str):
+        try:
+            step = parse_structured(text, self.step_schema)
+        except SchemaViolation as violation:
+            # With handle_parsing_errors=True the executor hands the violations back to the model as the observation
+            raise OutputParserException(str(violation), observation=violation_feedback(violation), llm_output=text,
+                                        send_to_llm=True)
+        if step["action"] != FINAL_ANSWER:
+            return AgentAction(step["action"], step["action_input"], text)
+        methods, sensors = step["recommended_methods"], step["recommended_sensors"]
+        return AgentFinish({"output": ToolSelectorAgent._with_name_lists(step["action_input"], methods, sensors),
+                            "recommended_methods": methods, "recommended_sensors": sensors}, text)
+
+    @property
+    def _type(self) -> str:
+        return "json-react"
+
 class ToolSelectorAgent(BaseAgent):
     def __init__(self):
         # Load the main system prompt for this agent from the file.
         # This prompt contains the detailed instructions for the ReAct agent.
-        prompt_file_path = Path("prompts/tool_selector.txt")
-        try:
-            system_prompt_for_agent = prompt_file_path.read_text()
-        except FileNotFoundError:
-            print(f"ERROR: prompts/tool_selector.txt not found. ToolSelectorAgent may not function correctly.")
-            system_prompt_for_agent = "You are an NDT Tool Selection assistant. Select tools and justify." # Basic fallback
+        system_prompt_for_agent = get_prompt(
+            "tool_selector", default="You are an NDT Tool Selection assistant. Select tools and justify." # Basic fallback
+        )
 
-        super().__init__(system_prompt_for_agent) # Initialize BaseAgent with the correct system prompt
-        self.kg = KGInterface()
+        super().__init__(system_prompt_for_agent, prompt_name="tool_selector", task="tool_selection") # Initialize BaseAgent with the correct system prompt
+        # KG handles are process-wide (agents/registry.py); neither holds per-session state
+        self.kg = get_shared_kg()
+        # The executor runs via ainvoke, so tools await the async driver instead of blocking the event loop
+        self.async_kg = get_shared_async_kg()
 
         self.tools = [
             Tool(
                 name="get_initial_recommendations",
                 func=self._get_initial_recommendations_wrapper,
+                coroutine=self._aget_initial_recommendations_wrapper,
                 description="Use this tool to get initial NDT method and sensor recommendations. Input must be a comma-separated string: 'material,defect,environment'. Example: 'Concrete,Cracking,Humid'",
             ),
             Tool(
                 name="get_ndt_method_details",
                 func=self.kg.get_ndt_method_structured_details,
+                coroutine=self.async_kg.get_ndt_method_structured_details,
                 description="Use this tool to get detailed information about a specific NDT method (description, category, cost, capabilities, limitations, risks). Input is the exact NDT method name.",
             ),
             Tool(
                 name="get_material_details",
                 func=self.kg.get_material_structured_details,
+                coroutine=self.async_kg.get_material_structured_details,
                 description="Use this tool to get details about a specific material (description, common applications). Input is the exact material name.",
             ),
             Tool(
                 name="get_defect_details",
                 func=self.kg.get_defect_structured_details,
+                coroutine=self.async_kg.get_defect_structured_details,
                 description="Use this tool to get a detailed description of a specific defect/observation. Input is the exact defect name.",
             ),
         ]
 
-        try:
-            # The prompt from prompts/tool_selector.txt will contain the core instructions for the LLM's reasoning.
-            # This will be used as the 'instructions' part of the ReAct prompt.
-            # The ReAct prompt template itself (hwchase17/react) provides the Thought/Action/Observation structure.
-            # LangChain's create_react_agent typically expects a prompt that can format {tools}, {tool_names}, {input}, {agent_scratchpad}.
-            # The prompt from tool_selector.txt needs to be the main instruction set.
-            # For ReAct, we often don't pass a full prompt object to create_react_agent, but rather use a template
-            # that includes placeholders for instructions, tools, etc.
-            # The instructions will come from our prompts/tool_selector.txt file.
-
-            # For now, we'll load our specific instructions and they will be part of the input to the agent executor.
-            # The ReAct prompt template from the hub will provide the structure.
-            react_prompt_template = hub.pull("hwchase17/react")
-        except Exception as e:
-            print(f"ERROR: Could not pull ReAct prompt from LangChain Hub: {e}. Using basic fallback. Functionality may be limited.")
-            react_prompt_template = PromptTemplate.from_template(FALLBACK_REACT_PROMPT_TEMPLATE)
-
-        agent = create_react_agent(self.llm, self.tools, react_prompt_template)
+        # The ReAct loop has its own route; the agent's client (task "tool_selection") writes justifications
+        self.react_model, react_llm = self.task_llm("react")
+        if react_format() == "json":
+            agent = self._create_json_react_agent(react_llm)
+            # Only an actual schema violation costs an iteration, and the model is told what was wrong
+            handle_parsing_errors = True
+        else:
+            # The instructions from prompts/tool_selector.txt are the agent's system prompt; the ReAct
+            # template (hwchase17/react) provides the Thought/Action/Observation structure. It ships as
+            # prompts/react.txt, so building the executor never goes to LangChain Hub.
+            react_prompt_template = PromptTemplate.from_template(
+                get_prompt(REACT_PROMPT_NAME, default=FALLBACK_REACT_PROMPT_TEMPLATE)
+            )
+            agent = create_react_agent(react_llm, self.tools, react_prompt_template)
+            handle_parsing_errors = "Check your output and make sure it conforms to the expected A ROUGH PARSING OF THE OUTPUT OF YOUR ACTION IS AVAILABLE TO YOU. IF IT IS NOT PERFECTLY PARSED, YOU SHOULD TRY TO PARSE MORE CAREFULLY. IF THE OUTPUT IS NOT AS EXPECTED, YOU SHOULD TRY A DIFFERENT ACTION." # More robust error handling
         self.agent_executor = AgentExecutor(
             agent=agent,
             tools=self.tools,
             verbose=True,
-            handle_parsing_errors="Check your output and make sure it conforms to the expected A ROUGH PARSING OF THE OUTPUT OF YOUR ACTION IS AVAILABLE TO YOU. IF IT IS NOT PERFECTLY PARSED, YOU SHOULD TRY TO PARSE MORE CAREFULLY. IF THE OUTPUT IS NOT AS EXPECTED, YOU SHOULD TRY A DIFFERENT ACTION.", # More robust error handling
-            max_iterations=10 # Increased max_iterations
+            handle_parsing_errors=handle_parsing_errors,
+            max_iterations=int(os.getenv("TOOL_SELECTOR_MAX_ITERATIONS", "10")),
+            # Wall-clock budget for the whole ReAct loop, checked between steps; a step that hangs is
+            # cancelled by the deadline around ainvoke (see _invoke_executor)
+            max_execution_time=self.timeout,
+        )
+
+    def _create_json_react_agent(self, llm):
+        """ReAct agent whose every step is Ollama output constrained to react_step_schema, validated locally."""
+        tool_names = [tool.name for tool in self.tools]
+        step_schema = react_step_schema(tool_names)
+        prompt = PromptTemplate.from_template(
+            get_prompt(REACT_JSON_PROMPT_NAME, default=FALLBACK_JSON_REACT_PROMPT_TEMPLATE)
+        ).partial(tools=render_text_description(self.tools), tool_names=", ".join(tool_names))
+        return (
+            RunnablePassthrough.assign(
+                agent_scratchpad=lambda x: format_log_to_str(x["intermediate_steps"], llm_prefix="")
+            )
+            | prompt
+            | llm.bind(format=ollama_format(step_schema))
+            | JsonReActOutputParser(step_schema=step_schema)
         )
 
+    async def _invoke_executor(self, agent_input: str) -> dict:
+        """Runs the ReAct executor: {"output", "recommended_methods", "recommended_sensors"}."""
+        try:
+            result = await self.with_deadline(self.agent_executor.ainvoke({"input": agent_input}))
+            output = result.get("output", "")
+        except asyncio.TimeoutError:
+            result, output = {}, self._timeout_message()
+        log_agent_interaction(agent_name=self.__class__.__name__, input_text=agent_input, output_text=output,
+                              context={"task": "react", "model": self.react_model})
+        if "recommended_methods" in result:
+            # A JSON final answer: the lists were validated against the step schema
+            return {"output": output, "recommended_methods": result["recommended_methods"],
+                    "recommended_sensors": result["recommended_sensors"]}
+        # Text ReAct, or the loop stopped before a final answer
+        return {"output": output,
+                "recommended_methods": self._parse_list_from_llm_output(output, METHOD_NAMES_HEADER),
+                "recommended_sensors": self._parse_list_from_llm_output(output, SENSOR_NAMES_HEADER)}
+
     def _get_initial_recommendations_wrapper(self, input_str: str) -> dict:
         try:
             parts = [s.strip().strip("'\"") for s in input_str.split(",")]
@@ -105,6 +207,17 @@ class ToolSelectorAgent(BaseAgent):
         except Exception as e:
             return {"error": f"Error in get_initial_recommendations_wrapper: {str(e)}"}
 
+    async def _aget_initial_recommendations_wrapper(self, input_str: str) -> dict:
+        try:
+            parts = [s.strip().strip("'\"") for s in input_str.split(",")]
+            if len(parts) == 3:
+                material, defect, environment = parts
+                return await self.async_kg.get_initial_recommendations_structured(material, defect, environment)
+            else:
+                return {"error": "Input string for get_initial_recommendations must be 3 comma-separated values: material, defect, environment."}
+        except Exception as e:
+            return {"error": f"Error in get_initial_recommendations_wrapper: {str(e)}"}
+
     def _parse_list_from_llm_output(self, llm_output: str, header: str) -> list[str]:
         try:
             for line in llm_output.splitlines():
@@ -126,8 +239,8 @@ class ToolSelectorAgent(BaseAgent):
             print(f"Error parsing list with header '{header}' from LLM output: {e}")
             return []
 
-    async def run(self, plan_text: str) -> dict:
-        # Step 1: Extract material, defect, environment from plan_text
+    async def _extract_entities_llm(self, plan_text: str) -> tuple:
+        """LLM extraction of (material, defect, environment), with a regex/keyword fallback; "unknown" if absent."""
         extraction_prompt_content = """\
 You are an expert entity extractor. From the provided inspection plan text, extract the primary material being inspected, the main defect or observation of concern, and the relevant environment.
 Return the information as a simple JSON object with keys "material", "defect", and "environment".
@@ -137,59 +250,81 @@ Plan Text: "Preliminary Inspection Plan for Concrete with observed Cracking in H
 Output: {"material": "Concrete", "defect": "Cracking", "environment": "Humid"}"""
 
         temp_extraction_history = [SystemMessage(content=extraction_prompt_content), HumanMessage(content=plan_text)]
-        raw_llm_output_for_extraction = ""
         try:
-            extraction_llm_response = await self.llm.agenerate([temp_extraction_history])
-            extracted_json_str = extraction_llm_response.generations[0][0].text
+            # Constrained to ENTITY_SCHEMA and validated; retried only if the reply violates it
+            entities = await self.structured(temp_extraction_history, ENTITY_SCHEMA, task="extraction")
         except Exception as e:
             print(f"ToolSelectorAgent (run) entity extraction LLM call failed: {e}")
-            extracted_json_str = "{}"
+            return self._extract_entities_by_keywords(plan_text)
+        return entities["material"], entities["defect"], entities["environment"]
 
+    @staticmethod
+    def _extract_entities_by_keywords(plan_text: str) -> tuple:
+        """(material, defect, environment) from "material: ..." style fields or common keywords in the plan text."""
+        import re
         material, defect, environment = "unknown", "unknown", "unknown"
-        try:
-            import json
-            entities = json.loads(extracted_json_str)
-            material = entities.get("material", "unknown")
-            defect = entities.get("defect", "unknown")
-            environment = entities.get("environment", "unknown")
-            # Handle cases where defect/material/environment are lists
-            if isinstance(material, list):
-                material = ", ".join(str(x) for x in material)
-            if isinstance(defect, list):
-                defect = ", ".join(str(x) for x in defect)
-            if isinstance(environment, list):
-                environment = ", ".join(str(x) for x in environment)
-        # ...existing code...
-        except json.JSONDecodeError:
-            print(f"ToolSelectorAgent (run): Failed to parse JSON from extraction: {extracted_json_str}")
-            # Fallback: Try to extract keywords from the plan_text directly
-            import re
-            material_match = re.search(r"material\s*[:=]\s*([A-Za-z0-9_ -]+)", plan_text, re.IGNORECASE)
-            defect_match = re.search(r"(defect|observation)\s*[:=]\s*([A-Za-z0-9_ -]+)", plan_text, re.IGNORECASE)
-            environment_match = re.search(r"environment\s*[:=]\s*([A-Za-z0-9_ -]+)", plan_text, re.IGNORECASE)
-            if material_match:
-                material = material_match.group(1).strip()
-            else:
-                # Try to find common material keywords
-                for mat in ["concrete", "steel", "aluminum", "wood"]:
-                    if mat in plan_text.lower():
-                        material = mat.capitalize()
-                        break
-            if defect_match:
-                defect = defect_match.group(2).strip()
-            else:
-                for defect_kw in ["crack", "corrosion", "delamination", "void"]:
-                    if defect_kw in plan_text.lower():
-                        defect = defect_kw.capitalize()
-                        break
-            if environment_match:
-                environment = environment_match.group(1).strip()
-            else:
-                for env in ["humid", "dry", "marine", "underground"]:
-                    if env in plan_text.lower():
-                        environment = env.capitalize()
-                        break
-        # ...existing code...
+        material_match = re.search(r"material\s*[:=]\s*([A-Za-z0-9_ -]+)", plan_text, re.IGNORECASE)
+        defect_match = re.search(r"(defect|observation)\s*[:=]\s*([A-Za-z0-9_ -]+)", plan_text, re.IGNORECASE)
+        environment_match = re.search(r"environment\s*[:=]\s*([A-Za-z0-9_ -]+)", plan_text, re.IGNORECASE)
+        if material_match:
+            material = material_match.group(1).strip()
+        else:
+            # Try to find common material keywords
+            for mat in ["concrete", "steel", "aluminum", "wood"]:
+                if mat in plan_text.lower():
+                    material = mat.capitalize()
+                    break
+        if defect_match:
+            defect = defect_match.group(2).strip()
+        else:
+            for defect_kw in ["crack", "corrosion", "delamination", "void"]:
+                if defect_kw in plan_text.lower():
+                    defect = defect_kw.capitalize()
+                    break
+        if environment_match:
+            environment = environment_match.group(1).strip()
+        else:
+            for env in ["humid", "dry", "marine", "underground"]:
+                if env in plan_text.lower():
+                    environment = env.capitalize()
+                    break
+        return material, defect, environment
+
+    async def _get_gazetteer(self) -> Optional[Gazetteer]:
+        """Gazetteer over the KG vocabulary, shared by all ToolSelectorAgents and rebuilt when the graph changes."""
+        global _gazetteer
+        version = get_graph_version()
+        if _gazetteer is None or _gazetteer[0] != version:
+            try:
+                vocabulary = await self.async_kg.get_vocabulary()
+            except Exception as e:
+                print(f"ToolSelectorAgent: could not load the KG vocabulary for local extraction: {e}")
+                return None
+            _gazetteer = (version, Gazetteer(vocabulary))
+        return _gazetteer[1]
+
+    async def _extract_entities(self, plan_text: str) -> tuple:
+        """
+        (material, defect, environment) from the plan text. The KG gazetteer answers when it finds one
+        entity per slot; otherwise the LLM extracts them, and slots the gazetteer did settle keep the KG names.
+        """
+        gazetteer = await self._get_gazetteer()
+        local = gazetteer.extract(plan_text) if gazetteer is not None else None
+        if local is not None and local.resolved:
+            print(f"ToolSelectorAgent (run): entities matched locally: {local.entities}")
+            return local.entities["material"], local.entities["defect"], local.entities["environment"]
+        llm_entities = await self._extract_entities_llm(plan_text)
+        if local is None:
+            return llm_entities
+        return tuple(
+            local.entities[slot] if local.entities[slot] is not None and slot not in local.ambiguous else llm_value
+            for slot, llm_value in zip(SLOTS, llm_entities)
+        )
+
+    async def run(self, plan_text: str) -> dict:
+        # Step 1: Extract material, defect, environment from plan_text (locally when the KG vocabulary settles it)
+        material, defect, environment = await self._extract_entities(plan_text)
+        raw_llm_output_for_extraction = ""
 
         if material == "unknown" or defect == "unknown" or environment == "unknown":
             print(f"ToolSelectorAgent (run): Entity extraction resulted in unknowns: M={material}, D={defect}, E={environment}")
@@ -213,7 +348,6 @@ Output: {"material": "Concrete", "defect": "Cracking", "environment": "Humid"}""
         # The ReAct agent's prompt will include the system message (from tool_selector.txt)
         # and then the specific input for this run.
 
-        main_instructions = Path("prompts/tool_selector.txt").read_text()
         # We need to ensure the {tools} and {tool_names} are formatted correctly for the react_prompt_template
         # And then the {input} should be the task-specific part.
 
@@ -234,6 +368,7 @@ Output: {"material": "Concrete", "defect": "Cracking", "environment": "Humid"}""
         )
 
         raw_agent_output = ""
+        executor_result = {}
         try:
             if self.agent_executor:
                 # The agent's system prompt (from BaseAgent, loaded from tool_selector.txt)
@@ -261,16 +396,16 @@ Output: {"material": "Concrete", "defect": "Cracking", "environment": "Humid"}""
                 # This is correctly set in __init__.
                 # The AgentExecutor will use this LLM.
 
-                result = await self.agent_executor.ainvoke({"input": agent_input})
-                raw_agent_output = result.get("output", "")
+                executor_result = await self._invoke_executor(agent_input)
+                raw_agent_output = executor_result["output"]
             else: # Fallback if AgentExecutor failed to initialize
                 raw_agent_output = "AgentExecutor not initialized. Cannot perform tool selection."
         except Exception as e:
             print(f"Error during ToolSelectorAgent agent_executor.ainvoke: {e}")
             raw_agent_output = f"# ERROR: Agent execution failed: {str(e)}"
 
-        recommended_methods = self._parse_list_from_llm_output(raw_agent_output, "Recommended Method Names:")
-        recommended_sensors = self._parse_list_from_llm_output(raw_agent_output, "Recommended Sensor Names:")
+        recommended_methods = executor_result.get("recommended_methods", [])
+        recommended_sensors = executor_result.get("recommended_sensors", [])
         return {
             "summary_text": raw_agent_output,
             "recommended_methods": recommended_methods,
@@ -280,7 +415,63 @@ Output: {"material": "Concrete", "defect": "Cracking", "environment": "Humid"}""
             "extracted_environment": environment
         }
 
+    @staticmethod
+    def _with_name_lists(text: str, methods: list[str], sensors: list[str]) -> str:
+        """Replaces any name lists in `text` with the given ones, so the summary always matches the returned lists."""
+        lines = [l for l in text.strip().splitlines()
+                 if not l.strip().strip("`").startswith((METHOD_NAMES_HEADER, SENSOR_NAMES_HEADER))]
+        lines += ["", f"{METHOD_NAMES_HEADER} [{', '.join(methods)}]", f"{SENSOR_NAMES_HEADER} [{', '.join(sensors)}]"]
+        return "\n".join(lines).strip()
+
     async def run_structured(self, material: str, defect: str, environment: str) -> dict:
+        """
+        Tool selection for a known material/defect/environment. By default the methods and sensors come
+        straight from the KG and the LLM is called once, only to write the justification (see
+        TOOL_SELECTOR_MODE); set it to "agent" to let the ReAct executor pick them instead.
+        """
+        if structured_mode() == "agent":
+            return await self._run_structured_agent(material, defect, environment)
+        return await self._run_structured_kg(material, defect, environment)
+
+    async def _run_structured_kg(self, material: str, defect: str, environment: str) -> dict:
+        recommendations = await self.async_kg.get_initial_recommendations_structured(material, defect, environment)
+        methods = recommendations["recommended_methods"]
+        sensors = recommendations["recommended_sensors"]
+        if not methods:
+            summary = (f"The Knowledge Graph has no NDT method recommendations for {material} with "
+                       f"{defect} in a {environment} environment.")
+            return {
+                "summary_text": self._with_name_lists(summary, methods, sensors),
+                "recommended_methods": methods,
+                "recommended_sensors": sensors
+            }
+
+        # Material, defect and method details in a single round-trip
+        kg_details = await self.async_kg.get_entities_details_for_rag(
+            material_name=material, defect_name=defect, method_names=methods
+        )
+        context = (
+            f"Primary Material: {material}\n"
+            f"Defect/Observation: {defect}\n"
+            f"Environment: {environment}\n"
+            f"KG Recommended NDT Methods: {', '.join(methods)}\n"
+            f"KG Recommended Sensors: {', '.join(sensors) if sensors else 'None'}\n\n"
+            f"Detailed Information from Knowledge Graph:\n{kg_details}\n\n"
+            f"These recommendations are final: justify them, and do not recommend methods or sensors outside these lists."
+        )
+        justification = await self(context)
+        if justification.startswith("# ERROR"):
+            fallback = (f"KG recommendations for {material} with {defect} in a {environment} environment "
+                        f"(justification unavailable: the LLM call failed).\n\n{kg_details}")
+            # Keep the timeout marker so the pipeline reports this stage as timed out (utils/pipeline.py)
+            justification = f"{justification}\n\n{fallback}" if is_timeout(justification) else fallback
+        return {
+            "summary_text": self._with_name_lists(justification, methods, sensors),
+            "recommended_methods": methods,
+            "recommended_sensors": sensors
+        }
+
+    async def _run_structured_agent(self, material: str, defect: str, environment: str) -> dict:
         agent_input = (
             f"Material: {material}\n"
             f"Defect/Observation: {defect}\n"
@@ -291,18 +482,19 @@ Output: {"material": "Concrete", "defect": "Cracking", "environment": "Humid"}""
             f"'Recommended Method Names: [...]' and 'Recommended Sensor Names: [...]'."
         )
         raw_agent_output = ""
+        executor_result = {}
         try:
             if self.agent_executor:
-                result = await self.agent_executor.ainvoke({"input": agent_input})
-                raw_agent_output = result.get("output", "")
+                executor_result = await self._invoke_executor(agent_input)
+                raw_agent_output = executor_result["output"]
             else:
                 raw_agent_output = "AgentExecutor not initialized. Cannot perform tool selection."
         except Exception as e:
             print(f"Error during ToolSelectorAgent (structured) agent_executor.ainvoke: {e}")
             raw_agent_output = f"# ERROR: Agent execution failed: {str(e)}"
 
-        recommended_methods = self._parse_list_from_llm_output(raw_agent_output, "Recommended Method Names:")
-        recommended_sensors = self._parse_list_from_llm_output(raw_agent_output, "Recommended Sensor Names:")
+        recommended_methods = executor_result.get("recommended_methods", [])
+        recommended_sensors = executor_result.get("recommended_sensors", [])
         return {
             "summary_text": raw_agent_output,
             "recommended_methods": recommended_methods,
@@ -6,11 +6,13 @@ from pathlib import Path
 ROOT_DIR = Path(__file__).resolve().parent.parent
 sys.path.append(str(ROOT_DIR))
 
+import os
 import time
 
 project_root = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(project_root))  
 import streamlit as st
+from neo4j import READ_ACCESS, WRITE_ACCESS
 import asyncio
 from utils.graph_vis import render_kg_graph
 from utils.forecast_chart import render_forecast_chart
@@ -19,19 +21,18 @@ from agents.tool_agent import ToolSelectorAgent
 from agents.forecaster_agent import ForecasterAgent
 from agents.critique_agent import CritiqueAgent
 from agents.risk_assessment_agent import RiskAssessmentAgent # Added
-from kg_interface import KGInterface
+from agents.registry import new_session_agent, get_shared_kg
+from kg_interface import KGInterface, take_rows
 from utils.gantt_chart import render_gantt_chart
 from utils.session_utils import generate_plan_id, log_agent_response
-
-
-
-
-import asyncio
-loop = asyncio.new_event_loop()
-asyncio.set_event_loop(loop)
-
-
-
+from utils.kg_schema import ensure_schema_once
+from utils.kg_telemetry import kg_telemetry
+from utils.kg_write_queue import get_write_queue, write_behind_enabled
+from utils.pipeline import Pipeline, TIMED_OUT
+from utils.prompt_registry import get_prompt_registry
+from utils.agent_limits import TIMEOUT_MARKER
+from utils.ollama_client import ollama_telemetry, warm_up_once
+from utils.event_loop import SessionLoop
 
 
 # Set up page configuration with a custom theme
@@ -199,6 +200,47 @@ def display_agent_output(title: str, html_content: str, css_class: str, icon: st
     </div>
     """, unsafe_allow_html=True)
 
+# Backstop deadline per pipeline stage; each agent also enforces its own (utils/agent_limits.py)
+PIPELINE_STAGE_TIMEOUT = float(os.getenv("PIPELINE_STAGE_TIMEOUT_SECONDS", "300")) or None
+STAGE_TIMEOUT_TEXT = f"{TIMEOUT_MARKER} (stage deadline exceeded)"
+TOOLS_TIMEOUT_RESULT = {"summary_text": STAGE_TIMEOUT_TEXT, "recommended_methods": [], "recommended_sensors": []}
+
+async def display_agent_output_stream(container, title: str, chunks, css_class: str, icon: str = "🤖",
+                                     html_newlines: bool = False, refresh_seconds: float = 0.05) -> str:
+    """
+    Renders an agent reply into `container` while it is generated (see BaseAgent.stream) and returns the full text.
+    Writes go through the container's own placeholder, so concurrent stages can't interleave into each other.
+    """
+    placeholder = container.empty()
+    text = ""
+    last_refresh = 0.0
+
+    def render(body: str) -> None:
+        body = body.replace('\n', '<br>') if html_newlines else body
+        placeholder.markdown(f"""
+        <div class="agent-section {css_class}">
+            <h4>{icon} {title}</h4>
+            <p>{body}</p>
+        </div>
+        """, unsafe_allow_html=True)
+
+    async for chunk in chunks:
+        text += chunk
+        now = time.monotonic()
+        if now - last_refresh >= refresh_seconds:
+            render(text + "▌")
+            last_refresh = now
+    text = text.strip()
+    render(text)
+    return text
+
+def render_stage_timings(pipeline_run):
+    timed_out = [row["stage"] for row in pipeline_run.timing_rows() if row["status"] == TIMED_OUT]
+    if timed_out:
+        st.warning(f"⏱️ Timed out (partial or fallback results): {', '.join(timed_out)}")
+    with st.expander(f"⏱️ Stage timings ({pipeline_run.total_seconds:.1f}s end-to-end)"):
+        st.dataframe(pipeline_run.timing_rows(), use_container_width=True)
+
 def render_focused_forecast_ui(loop, recommended_methods_list: list, forecaster_agent, base_context_parts: dict, key_suffix: str):
     st.markdown("---")
     st.markdown("#### Focused Deterioration Forecast")
@@ -223,7 +265,7 @@ def render_focused_forecast_ui(loop, recommended_methods_list: list, forecaster_
                 focused_context_rerun = "\n".join(context_lines)
 
                 with st.spinner("ForecasterAgent running focused forecast..."):
-                    focused_forecast_output = loop.run_until_complete(forecaster_agent.run(focused_context_rerun))
+                    focused_forecast_output = loop.run(forecaster_agent.run(focused_context_rerun))
                     st.markdown("##### Focused Forecast Results:")
                     st.code(focused_forecast_output, language="markdown")
                     if "material" in base_context_parts: # Only render charts if it's from structured planner (Tab2-like) for now
@@ -332,17 +374,39 @@ def seed_knowledge_graph():
     MERGE (s2)-[:RECOMMENDED_FOR]->(n3)
     MERGE (s3)-[:RECOMMENDED_FOR]->(n1)
     """
-    kg.cypher(seed_query, log=False)
+    kg.cypher(seed_query, log=False, name="seed_demo_kg")
     return True
 
+# A snapshot (KG_BACKEND=embedded, utils/kg_embedded.py) only answers the app's named queries: free-form
+# Cypher such as the demo seed, the Advanced Query box and the OWL export needs Neo4j
+snapshot_mode = get_shared_kg().backend is not None
+SNAPSHOT_ONLY = "Not available in snapshot mode (KG_BACKEND=embedded): this needs a Neo4j connection."
+
+# Create missing constraints/indexes once per process (no-op after the first run)
+if os.getenv("KG_ENSURE_SCHEMA", "1").lower() not in ("0", "false", "no"):
+    ensure_schema_once(KGInterface())
+
+# Prompt templates are read and validated once per process, then served from memory
+prompt_registry = get_prompt_registry()
+if prompt_registry.failed:
+    st.warning(f"Invalid or unreadable prompt templates (using defaults): {', '.join(prompt_registry.failed)}")
+
+# Preload the routed Ollama models in the background, once per process, so the first request isn't a cold load
+if os.getenv("OLLAMA_WARMUP", "1").lower() not in ("0", "false", "no"):
+    warm_up_once()
+
 # Ensure event loop and agents
-if "loop" not in st.session_state:
-    st.session_state.loop   = asyncio.new_event_loop()
-    st.session_state.plan   = PlannerAgent()
-    st.session_state.tools  = ToolSelectorAgent()
-    st.session_state.fore   = ForecasterAgent()
-    st.session_state.critique = CritiqueAgent()
-    st.session_state.risk = RiskAssessmentAgent() # Added RiskAssessmentAgent
+if not isinstance(st.session_state.get("loop"), SessionLoop):
+    # One loop per session for every tab: async KG drivers and LLM connections are per loop and reused across
+    # reruns, then closed with the loop when the session ends (utils/event_loop.py)
+    st.session_state.loop   = SessionLoop()
+    # Agents are built once per process (agents/registry.py); each session gets its own conversation state
+    st.session_state.plan   = new_session_agent(PlannerAgent)
+    st.session_state.tools  = new_session_agent(ToolSelectorAgent)
+    st.session_state.fore   = new_session_agent(ForecasterAgent)
+    st.session_state.critique = new_session_agent(CritiqueAgent)
+    st.session_state.risk = new_session_agent(RiskAssessmentAgent) # Added RiskAssessmentAgent
+loop = st.session_state.loop
 
 # Create a sidebar for navigation and stats
 with st.sidebar:
@@ -350,7 +414,7 @@ with st.sidebar:
     
     counts = KGInterface().cypher("""
         MATCH (n) RETURN labels(n)[0] AS label, count(*) AS count ORDER BY count DESC
-    """)
+    """, name="sidebar.label_counts")
     
     if counts:
         for row in counts:
@@ -366,10 +430,39 @@ with st.sidebar:
     
     st.markdown("---")
     
-    if st.button("🧪 Seed Demo Knowledge Graph", key="sidebar_seed"):
+    if st.button("🧪 Seed Demo Knowledge Graph", key="sidebar_seed", disabled=snapshot_mode,
+                 help=SNAPSHOT_ONLY if snapshot_mode else None):
         if seed_knowledge_graph():
             st.success("✅ Knowledge graph seeded successfully!")
     
+    with st.expander("⏱️ KG Query Telemetry"):
+        query_stats = KGInterface.query_stats()
+        if query_stats:
+            st.dataframe(
+                [{k: v for k, v in row.items() if k not in ("slow_samples", "plan")} for row in query_stats],
+                use_container_width=True
+            )
+            for row in query_stats:
+                if row["plan"]:
+                    st.markdown(f"**Plan: {row['query']}**")
+                    st.code(row["plan"])
+        else:
+            st.caption("No queries recorded yet.")
+        st.caption(f"Query cache: {KGInterface.cache_stats()}")
+        if write_behind_enabled():
+            st.caption(f"Write queue: {get_write_queue().stats()}")
+        if st.button("Reset telemetry", key="reset_kg_telemetry"):
+            kg_telemetry.reset()
+
+    with st.expander("🧠 LLM Call Timings"):
+        llm_stats = ollama_telemetry.snapshot()
+        if llm_stats:
+            st.dataframe(llm_stats, use_container_width=True)
+        else:
+            st.caption("No LLM calls recorded yet.")
+        if st.button("Reset timings", key="reset_llm_telemetry"):
+            ollama_telemetry.reset()
+    
     st.markdown("---")
     st.markdown("### 📚 Documentation")
     st.markdown("""
@@ -405,126 +498,148 @@ with tab1:
         run_nl = st.button("🔍 Plan Inspection", key="run_nl", use_container_width=True)
 
     if user_input and run_nl:
-        from kg_interface import KGInterface
-
-        if "kg_instance_tab1" not in st.session_state:
-            st.session_state.kg_instance_tab1 = KGInterface()
-
-        kg_instance_tab1 = st.session_state.get("kg_instance_tab1", KGInterface())  # Fallback instance
-
+        kg_instance_tab1 = get_shared_kg()
 
         plan_id = generate_plan_id()
         st.session_state.plan_id_tab1 = plan_id
 
-        from agents.planner_agent import PlannerAgent
-        planner_agent = PlannerAgent()
-
-        with st.spinner("PlannerAgent thinking..."):
-            plan_output = loop.run_until_complete(planner_agent(user_input, plan_id))  # 🔁 use run_until_complete
-
-        st.session_state.plan_text = plan_output
-        display_agent_output("PlannerAgent", plan_output, "planner-agent", icon="🧭")
-        log_agent_response(plan_id, "PlannerAgent", plan_output, user_input=user_input)
-
+        planner_agent = st.session_state.plan
+        tool_agent = st.session_state.tools
+        critique_agent = st.session_state.critique
+        risk_agent = st.session_state.risk
+        forecaster_agent = st.session_state.fore
+
+        # Fixed slots keep the page order stable while independent stages finish in any order
+        planner_slot = st.container()
+        tools_slot = st.container()
+        subgraph_slot = st.container()
+        critique_slot = st.container()
+        risk_slot = st.container()
+        forecast_slot = st.container()
+
+        # PlannerAgent
+        async def run_planner(results):
+            return await display_agent_output_stream(planner_slot, "PlannerAgent", planner_agent.stream(user_input, plan_id),
+                                                     "planner-agent", icon="🧭")
+
+        def show_planner(plan_output):
+            st.session_state.plan_text = plan_output
+            log_agent_response(plan_id, "PlannerAgent", plan_output, user_input=user_input)
 
         # ToolSelectorAgent
-        from agents.tool_agent import ToolSelectorAgent
-        with st.spinner("ToolSelectorAgent working..."):
-            tool_agent = ToolSelectorAgent()
-            tool_result = loop.run_until_complete(tool_agent.run(plan_output))
+        async def run_tools(results):
+            return await tool_agent.run(results["planner"])
+
+        def show_tools(tool_result):
             st.session_state.tool_result = tool_result
-                # Display and log tool output
-                # --- Display and log ToolSelectorAgent results ---
-        # Display summary of recommended methods
-        display_agent_output("ToolSelectorAgent", tool_result.get("summary_text", ""), "tool-agent", icon="🔧")
-        log_agent_response(plan_id, "ToolSelectorAgent", tool_result.get("summary_text", ""))
+            with tools_slot:
+                display_agent_output("ToolSelectorAgent", tool_result.get("summary_text", ""), "tool-agent", icon="🔧")
+            log_agent_response(plan_id, "ToolSelectorAgent", tool_result.get("summary_text", ""))
 
         # Optional: Visualize Knowledge Graph reasoning used by ToolSelector
-        st.markdown("""
-        <div class="dashboard-card">
-            <h4>🔗 Knowledge Graph Reasoning Subgraph</h4>
-            <p>This visual shows how the ToolSelectorAgent connected material, defect, environment, and sensors using the NDT knowledge graph.</p>
-        </div>
-        """, unsafe_allow_html=True)
-
-        # Extract components and render subgraph
-        extracted_material = tool_result.get("extracted_material", "NL_Derived_Unknown")
-        extracted_defect = tool_result.get("extracted_defect", "NL_Derived_Unknown")
-        extracted_environment = tool_result.get("extracted_environment", "NL_Derived_Unknown")
+        def fetch_subgraph(results):
+            tool_result = results["tools"]
+            try:
+                return kg_instance_tab1.get_recommendation_subgraph(
+                    material=tool_result.get("extracted_material", "NL_Derived_Unknown"),
+                    defect=tool_result.get("extracted_defect", "NL_Derived_Unknown"),
+                    environment=tool_result.get("extracted_environment", "NL_Derived_Unknown")
+                )
+            except Exception as e:
+                return e
 
-        try:
-            subgraph = kg_instance_tab1.get_recommendation_subgraph(
-                material=extracted_material,
-                defect=extracted_defect,
-                environment=extracted_environment
+        def show_subgraph(subgraph):
+            with subgraph_slot:
+                st.markdown("""
+                <div class="dashboard-card">
+                    <h4>🔗 Knowledge Graph Reasoning Subgraph</h4>
+                    <p>This visual shows how the ToolSelectorAgent connected material, defect, environment, and sensors using the NDT knowledge graph.</p>
+                </div>
+                """, unsafe_allow_html=True)
+                try:
+                    if isinstance(subgraph, Exception):
+                        raise subgraph
+                    render_kg_graph(subgraph)
+                except Exception as e:
+                    st.warning(f"❗ Could not render KG subgraph: {e}")
+
+        def fetch_rag_details(results):
+            recommended_methods = results["tools"].get("recommended_methods", [])
+            if not recommended_methods:
+                return ""
+            return kg_instance_tab1.get_entities_details_for_rag(method_names=recommended_methods)
+
+        # CritiqueAgent and RiskAssessmentAgent only need the tool selection and RAG context, so they run concurrently
+        async def run_critique(results):
+            critique_input = (
+                f"**Scenario Context (from user input & planner):**\nUser Input: {user_input}\nPlanner Output: {results['planner']}\n\n"
+                f"**Proposed NDT Approach by ToolSelectorAgent:**\n{results['tools'].get('summary_text', '')}\n"
+                f"**Detailed NDT Method Information (from Knowledge Graph for RAG):**\n{results['rag']}"
             )
-            
-            render_kg_graph(subgraph)
-        except Exception as e:
-            st.warning(f"❗ Could not render KG subgraph: {e}")
-
+            return await display_agent_output_stream(critique_slot, "CritiqueAgent", critique_agent.stream(critique_input),
+                                                     "critique-agent-custom", icon="🕵️‍♂️")
 
+        def show_critique(critique_output):
+            log_agent_response(plan_id, "CritiqueAgent", critique_output)
 
+        async def run_risk(results):
+            risk_input = (
+                f"User Input: {user_input}\nPlanner Output: {results['planner']}\n\n"
+                f"Proposed NDT Methods: {', '.join(results['tools'].get('recommended_methods', []))}\n\n"
+                f"Detailed NDT Method Information (including potential risks):\n{results['rag']}"
+            )
+            return await display_agent_output_stream(risk_slot, "RiskAssessmentAgent", risk_agent.stream(risk_input),
+                                                     "risk-agent-custom", icon="⚠️")
 
-        # CritiqueAgent
-        from agents.critique_agent import CritiqueAgent
-        recommended_methods = tool_result.get("recommended_methods", [])
-        rag_details = ""
-        if recommended_methods:
-            rag_details = kg_instance_tab1.get_entities_details_for_rag(method_names=recommended_methods)
-        critique_input = (
-            f"**Scenario Context (from user input & planner):**\nUser Input: {user_input}\nPlanner Output: {plan_output}\n\n"
-            f"**Proposed NDT Approach by ToolSelectorAgent:**\n{tool_result.get('summary_text', '')}\n"
-            f"**Detailed NDT Method Information (from Knowledge Graph for RAG):**\n{rag_details}"
-        )
-        with st.spinner("CritiqueAgent reviewing recommendations..."):
-            critique_agent = CritiqueAgent()
-            critique_output = loop.run_until_complete(critique_agent(critique_input))
-        display_agent_output("CritiqueAgent", critique_output, "critique-agent-custom", icon="🕵️‍♂️")
-        log_agent_response(plan_id, "CritiqueAgent", critique_output)
-
-        # RiskAssessmentAgent
-        from agents.risk_assessment_agent import RiskAssessmentAgent
-        risk_input = (
-            f"User Input: {user_input}\nPlanner Output: {plan_output}\n\n"
-            f"Proposed NDT Methods: {', '.join(recommended_methods)}\n\n"
-            f"Detailed NDT Method Information (including potential risks):\n{rag_details}"
-        )
-        with st.spinner("RiskAssessmentAgent analyzing potential risks..."):
-            risk_agent = RiskAssessmentAgent()
-            risk_output = loop.run_until_complete(risk_agent(risk_input))
-        display_agent_output("RiskAssessmentAgent", risk_output, "risk-agent-custom", icon="⚠️")
-        log_agent_response(plan_id, "RiskAssessmentAgent", risk_output)
+        def show_risk(risk_output):
+            log_agent_response(plan_id, "RiskAssessmentAgent", risk_output)
 
         # ForecasterAgent
-        from agents.forecaster_agent import ForecasterAgent
-        forecaster_context = f"{tool_result.get('summary_text', '')}\nCritique: {critique_output}\nRisks: {risk_output}"
-        with st.spinner("ForecasterAgent running..."):
-            forecaster_agent = ForecasterAgent()
-            forecast_output = loop.run_until_complete(forecaster_agent(forecaster_context))
-        display_agent_output("ForecasterAgent", forecast_output, "forecaster-agent", icon="📉")
-        log_agent_response(plan_id, "ForecasterAgent", forecast_output)
-
-        # Summary block
-        st.markdown("""
-        <div class="dashboard-card">
-            <h3>📊 Final Inspection Plan Summary</h3>
-        </div>
-        """, unsafe_allow_html=True)
-        st.code(forecast_output, language="markdown")
+        async def run_forecaster(results):
+            forecaster_context = f"{results['tools'].get('summary_text', '')}\nCritique: {results['critique']}\nRisks: {results['risk']}"
+            return await display_agent_output_stream(forecast_slot, "ForecasterAgent", forecaster_agent.stream(forecaster_context),
+                                                     "forecaster-agent", icon="📉")
+
+        def show_forecast(forecast_output):
+            with forecast_slot:
+                # Summary block
+                st.markdown("""
+                <div class="dashboard-card">
+                    <h3>📊 Final Inspection Plan Summary</h3>
+                </div>
+                """, unsafe_allow_html=True)
+                st.code(forecast_output, language="markdown")
+            log_agent_response(plan_id, "ForecasterAgent", forecast_output)
 
         # Log plan to KG
-        extracted_material = tool_result.get("extracted_material", "NL_Derived_Unknown")
-        extracted_defect = tool_result.get("extracted_defect", "NL_Derived_Unknown")
-        extracted_environment = tool_result.get("extracted_environment", "NL_Derived_Unknown")
-        st.session_state.current_plan_id_tab1 = kg_instance_tab1.log_inspection_plan(
-            plan_text=forecast_output,
-            material=extracted_material,
-            defect=extracted_defect,
-            environment=extracted_environment
+        def log_plan(results):
+            tool_result = results["tools"]
+            return kg_instance_tab1.log_inspection_plan(
+                plan_text=results["forecaster"],
+                material=tool_result.get("extracted_material", "NL_Derived_Unknown"),
+                defect=tool_result.get("extracted_defect", "NL_Derived_Unknown"),
+                environment=tool_result.get("extracted_environment", "NL_Derived_Unknown")
+            )
+
+        tab1_pipeline = (
+            Pipeline("nl_planner", stage_timeout=PIPELINE_STAGE_TIMEOUT)
+            .add("planner", run_planner, on_done=show_planner, fallback=STAGE_TIMEOUT_TEXT)
+            .add("tools", run_tools, ["planner"], on_done=show_tools, fallback=TOOLS_TIMEOUT_RESULT)
+            .add("subgraph", fetch_subgraph, ["tools"], on_done=show_subgraph,
+                 fallback=TimeoutError("the subgraph query timed out"))
+            .add("rag", fetch_rag_details, ["tools"], fallback="")
+            .add("critique", run_critique, ["planner", "tools", "rag"], on_done=show_critique, fallback=STAGE_TIMEOUT_TEXT)
+            .add("risk", run_risk, ["planner", "tools", "rag"], on_done=show_risk, fallback=STAGE_TIMEOUT_TEXT)
+            .add("forecaster", run_forecaster, ["tools", "critique", "risk"], on_done=show_forecast, fallback=STAGE_TIMEOUT_TEXT)
+            .add("log_plan", log_plan, ["tools", "forecaster"])
         )
+        with st.spinner("Agents planning the inspection..."):
+            tab1_run = loop.run(tab1_pipeline.run())
+
+        st.session_state.current_plan_id_tab1 = tab1_run.results["log_plan"]
         if st.session_state.current_plan_id_tab1:
             st.caption(f"Plan logged with ID: {st.session_state.current_plan_id_tab1}")
+        render_stage_timings(tab1_run)
 
         render_feedback_buttons(kg_instance_tab1, "current_plan_id_tab1", "tab1")
 
@@ -538,7 +653,7 @@ with tab2:
     </div>
     """, unsafe_allow_html=True)
 
-    kg_tab2_instance = KGInterface()
+    kg_tab2_instance = get_shared_kg()
     material_options = kg_tab2_instance.get_materials()
     deterioration_options = kg_tab2_instance.get_deterioration_types()
     environment_options = kg_tab2_instance.get_environments()
@@ -569,69 +684,87 @@ with tab2:
         st.session_state.current_plan_id_tab2 = None
 
         col1_results_kg, col2_results_kg = st.columns([3, 2])
-
         with col1_results_kg:
-            with st.spinner("ToolSelectorAgent analyzing KG..."):
-                tool_agent_output_tab2 = loop.run_until_complete(
-                    st.session_state.tools.run_structured(material, deterioration, environment)
-                )
-                plan_summary_tab2 = tool_agent_output_tab2.get("summary_text", "")
-                recommended_methods_tab2_list = tool_agent_output_tab2.get("recommended_methods", [])
+            tools_slot_tab2 = st.container()
+            critique_slot_tab2 = st.container()
+            risk_slot_tab2 = st.container()
+            forecast_slot_tab2 = st.container()
+        with col2_results_kg:
+            st.markdown("""
+            <div class="dashboard-card">
+                <h4>👁 Knowledge Graph Reasoning Path</h4>
+            </div>
+            """, unsafe_allow_html=True)
+            subgraph_slot_tab2 = st.container()
+
+        async def run_tools_tab2(results):
+            return await st.session_state.tools.run_structured(material, deterioration, environment)
 
+        def show_tools_tab2(tool_agent_output_tab2):
+            with tools_slot_tab2:
                 st.markdown("""
                 <div class="dashboard-card">
                     <h4>🔍 ToolSelectorAgent Decision</h4>
                 </div>
                 """, unsafe_allow_html=True)
-                st.code(plan_summary_tab2, language="markdown")
+                st.code(tool_agent_output_tab2.get("summary_text", ""), language="markdown")
 
-            with st.spinner("CritiqueAgent reviewing recommendations..."):
-                rag_details_for_critique_tab2 = kg_tab2_instance.get_entities_details_for_rag(
-                    material_name=material,
-                    defect_name=deterioration,
-                    method_names=recommended_methods_tab2_list
-                )
-                critique_context_tab2 = (
-                    f"**Scenario:**\n"
-                    f"Material: {material}\n"
-                    f"Defect/Observation: {deterioration}\n"
-                    f"Environment: {environment}\n\n"
-                    f"**Proposed NDT Approach by ToolSelectorAgent:**\n{plan_summary_tab2}\n"
-                    f"**Detailed NDT Method Information (from Knowledge Graph for RAG):**\n{rag_details_for_critique_tab2}"
-                )
-                critique_output_tab2 = loop.run_until_complete(st.session_state.critique.run(critique_context_tab2))
-                critique_output_tab2_html = critique_output_tab2.replace('\n', '<br>')
-                display_agent_output("Critique & Considerations", critique_output_tab2_html, "critique-agent-custom", icon="🕵️‍♂️")
-
-            with st.spinner("RiskAssessmentAgent analyzing potential risks..."):
-                # RAG details already include risk information due to previous step
-                rag_details_for_risk_tab2 = rag_details_for_critique_tab2
-                risk_context_tab2 = (
-                    f"**Scenario Context:**\nMaterial: {material}\nDefect/Observation: {deterioration}\nEnvironment: {environment}\n\n"
-                    f"**Proposed NDT Methods:** {', '.join(recommended_methods_tab2_list)}\n\n"
-                    f"**Detailed NDT Method Information (including potential risks from KG):**\n{rag_details_for_risk_tab2}"
-                )
-                risk_output_tab2 = loop.run_until_complete(st.session_state.risk.run(risk_context_tab2))
-                risk_output_tab2_html = risk_output_tab2.replace('\n', '<br>')
-                display_agent_output("Potential Risk Analysis", risk_output_tab2_html, "risk-agent-custom", icon="⚠️")
-
-            forecast_text_tab2 = ""
-            with st.spinner("ForecasterAgent modeling damage evolution..."):
-                forecast_context_tab2_initial = f"""
-                Material: {material}
-                Defect: {deterioration}
-                Environment: {environment}
-                Recommended NDT Methods by ToolSelector: {', '.join(recommended_methods_tab2_list) if recommended_methods_tab2_list else "None specified"}
-                Critique: {critique_output_tab2}
-                Risks: {risk_output_tab2}
-                """
-                forecast_text_tab2 = loop.run_until_complete(st.session_state.fore.run(forecast_context_tab2_initial))
-
-                plan_id_tab2 = kg_tab2_instance.log_inspection_plan(plan_summary_tab2, material, deterioration, environment)
-                if 'current_plan_id_tab2' not in st.session_state:
-                    st.session_state.current_plan_id_tab2 = None
-                st.session_state.current_plan_id_tab2 = plan_id_tab2
+        # The reasoning path only depends on the selection, so it is fetched while the agents run
+        def fetch_reasoning_subgraph(results):
+            return kg_tab2_instance.get_reasoning_subgraph(material, deterioration, environment)
 
+        def show_reasoning_subgraph(subgraph):
+            with subgraph_slot_tab2:
+                if subgraph:
+                    render_kg_graph(subgraph)
+                else:
+                    st.warning("No subgraph data found for current inputs.")
+
+        def fetch_rag_details_tab2(results):
+            return kg_tab2_instance.get_entities_details_for_rag(
+                material_name=material,
+                defect_name=deterioration,
+                method_names=results["tools"].get("recommended_methods", [])
+            )
+
+        async def run_critique_tab2(results):
+            critique_context_tab2 = (
+                f"**Scenario:**\n"
+                f"Material: {material}\n"
+                f"Defect/Observation: {deterioration}\n"
+                f"Environment: {environment}\n\n"
+                f"**Proposed NDT Approach by ToolSelectorAgent:**\n{results['tools'].get('summary_text', '')}\n"
+                f"**Detailed NDT Method Information (from Knowledge Graph for RAG):**\n{results['rag']}"
+            )
+            return await display_agent_output_stream(critique_slot_tab2, "Critique & Considerations",
+                                                     st.session_state.critique.stream(critique_context_tab2),
+                                                     "critique-agent-custom", icon="🕵️‍♂️", html_newlines=True)
+
+        async def run_risk_tab2(results):
+            # RAG details already include risk information
+            risk_context_tab2 = (
+                f"**Scenario Context:**\nMaterial: {material}\nDefect/Observation: {deterioration}\nEnvironment: {environment}\n\n"
+                f"**Proposed NDT Methods:** {', '.join(results['tools'].get('recommended_methods', []))}\n\n"
+                f"**Detailed NDT Method Information (including potential risks from KG):**\n{results['rag']}"
+            )
+            return await display_agent_output_stream(risk_slot_tab2, "Potential Risk Analysis",
+                                                     st.session_state.risk.stream(risk_context_tab2),
+                                                     "risk-agent-custom", icon="⚠️", html_newlines=True)
+
+        async def run_forecaster_tab2(results):
+            recommended_methods_tab2_list = results["tools"].get("recommended_methods", [])
+            forecast_context_tab2_initial = f"""
+            Material: {material}
+            Defect: {deterioration}
+            Environment: {environment}
+            Recommended NDT Methods by ToolSelector: {', '.join(recommended_methods_tab2_list) if recommended_methods_tab2_list else "None specified"}
+            Critique: {results['critique']}
+            Risks: {results['risk']}
+            """
+            return await st.session_state.fore.run(forecast_context_tab2_initial)
+
+        def show_forecast_tab2(forecast_text_tab2):
+            with forecast_slot_tab2:
                 st.markdown("""
                 <div class="dashboard-card">
                     <h4>📈 Forecasted Deterioration (12-month projection)</h4>
@@ -641,32 +774,40 @@ with tab2:
                 render_forecast_chart(forecast_text_tab2)
                 render_gantt_chart(forecast_text_tab2)
 
-                # Use the refactored UI function for focused forecast
-                tab2_focused_forecast_context_parts = {
-                    "material": material, # Ensure this is available in scope
-                    "defect": deterioration, # Ensure this is available
-                    "environment": environment # Ensure this is available
-                }
-                render_focused_forecast_ui(loop, recommended_methods_tab2_list, st.session_state.fore, tab2_focused_forecast_context_parts, "tab2")
+        def log_plan_tab2(results):
+            return kg_tab2_instance.log_inspection_plan(results["tools"].get("summary_text", ""), material, deterioration, environment)
+
+        tab2_pipeline = (
+            Pipeline("structured_planner", stage_timeout=PIPELINE_STAGE_TIMEOUT)
+            .add("tools", run_tools_tab2, on_done=show_tools_tab2, fallback=TOOLS_TIMEOUT_RESULT)
+            .add("reasoning_subgraph", fetch_reasoning_subgraph, on_done=show_reasoning_subgraph, fallback=[])
+            .add("rag", fetch_rag_details_tab2, ["tools"], fallback="")
+            .add("critique", run_critique_tab2, ["tools", "rag"], fallback=STAGE_TIMEOUT_TEXT)
+            .add("risk", run_risk_tab2, ["tools", "rag"], fallback=STAGE_TIMEOUT_TEXT)
+            .add("forecaster", run_forecaster_tab2, ["tools", "critique", "risk"], on_done=show_forecast_tab2,
+                 fallback=STAGE_TIMEOUT_TEXT)
+            .add("log_plan", log_plan_tab2, ["tools"])
+        )
+        with st.spinner("Agents analyzing the KG scenario..."):
+            tab2_run = loop.run(tab2_pipeline.run())
 
-                if forecast_text_tab2:
-                    # Use the refactored UI function for feedback buttons
-                    render_feedback_buttons(kg_tab2_instance, "current_plan_id_tab2", "tab2")
+        st.session_state.current_plan_id_tab2 = tab2_run.results["log_plan"]
+        recommended_methods_tab2_list = tab2_run.results["tools"].get("recommended_methods", [])
+        forecast_text_tab2 = tab2_run.results["forecaster"]
 
-        with col2_results_kg:
-            st.markdown("""
-            <div class="dashboard-card">
-                <h4>👁 Knowledge Graph Reasoning Path</h4>
-            </div>
-            """, unsafe_allow_html=True)
-
-            if run_kg:
-                with st.spinner("Generating visualization..."):
-                    subgraph = kg_tab2_instance.get_reasoning_subgraph(material, deterioration, environment)
-                    if subgraph:
-                        render_kg_graph(subgraph)
-                    else:
-                        st.warning("No subgraph data found for current inputs.")
+        with col1_results_kg:
+            # Use the refactored UI function for focused forecast
+            tab2_focused_forecast_context_parts = {
+                "material": material, # Ensure this is available in scope
+                "defect": deterioration, # Ensure this is available
+                "environment": environment # Ensure this is available
+            }
+            render_focused_forecast_ui(loop, recommended_methods_tab2_list, st.session_state.fore, tab2_focused_forecast_context_parts, "tab2")
+
+            if forecast_text_tab2:
+                # Use the refactored UI function for feedback buttons
+                render_feedback_buttons(kg_tab2_instance, "current_plan_id_tab2", "tab2")
+            render_stage_timings(tab2_run)
 
 # ------------------- TAB 3: Knowledge Graph Explorer -------------------
 with tab3:
@@ -688,7 +829,7 @@ with tab3:
         
         counts = KGInterface().cypher("""
             MATCH (n) RETURN labels(n)[0] AS label, count(*) AS count ORDER BY count DESC
-        """)
+        """, name="explorer.label_counts")
         
         if counts:
             for row in counts:
@@ -707,7 +848,8 @@ with tab3:
         else:
             st.info("No nodes found. Try seeding first.")
             
-        if st.button("🧪 Seed Demo Knowledge Graph", key="tab3_seed", use_container_width=True):
+        if st.button("🧪 Seed Demo Knowledge Graph", key="tab3_seed", use_container_width=True, disabled=snapshot_mode,
+                     help=SNAPSHOT_ONLY if snapshot_mode else None):
             if seed_knowledge_graph():
                 st.success("✅ KG seeded successfully!")
     
@@ -723,7 +865,7 @@ with tab3:
             RETURN labels(a)[0] AS from, type(r) AS relation, labels(b)[0] AS to,
                    a.name AS from_name, b.name AS to_name
             LIMIT 10
-        """)
+        """, name="explorer.sample_relationships")
         
         if rels:
             for rel in rels:
@@ -783,7 +925,7 @@ with tab4:
                 for cq_item in cqs:
                     start = time.time()
                     try:
-                        axiom = loop.run_until_complete(agent.run(cq_item))
+                        axiom = loop.run(agent.run(cq_item))
                         results.append((cq_item, axiom))
                         latencies.append(time.time() - start)
                     except Exception as e:
@@ -816,19 +958,36 @@ with tab4:
         <p>Run custom Cypher queries against the knowledge graph</p>
     </div>
     """, unsafe_allow_html=True)
+    if snapshot_mode:
+        st.info(SNAPSHOT_ONLY)
     
     query_text_area = st.text_area("Enter Cypher query:",
-                        height=100,
+                        height=100, disabled=snapshot_mode,
                         value="""MATCH (n)-[r]->(m)
 WHERE n:Material AND m:Deterioration
 RETURN n.name AS Material, type(r) AS Relation, m.name AS Deterioration""")
+    # Free-form Cypher runs read-only unless writes are explicitly allowed (no guessing from keywords)
+    allow_writes = st.checkbox("Allow writes (CREATE / MERGE / SET / DELETE)", value=False, key="advanced_query_writes",
+                               disabled=snapshot_mode)
     
-    if st.button("🔎 Run Query", key="run_cypher", use_container_width=True):
+    if st.button("🔎 Run Query", key="run_cypher", use_container_width=True, disabled=snapshot_mode):
+        # Stream the result so the first rows show up early and an unbounded query can't exhaust memory
+        max_rows = int(os.getenv("KG_ADVANCED_QUERY_MAX_ROWS", "5000"))
+        results_placeholder = st.empty()
         try:
-            results_cypher = KGInterface().cypher(query_text_area)
+            stream = KGInterface().cypher_stream(query_text_area, name="advanced_query",
+                                                 access_mode=WRITE_ACCESS if allow_writes else READ_ACCESS)
+            # A write is read to the end so it commits (closing it early would roll it back); only the display is capped
+            results_cypher, seen = take_rows(stream, max_rows, drain=allow_writes,
+                                             on_progress=lambda rows: results_placeholder.dataframe(rows, use_container_width=True))
+            if allow_writes:
+                st.success(f"Query committed ({seen} rows returned).")
             if results_cypher:
-                st.dataframe(results_cypher, use_container_width=True)
-            else:
+                results_placeholder.dataframe(results_cypher, use_container_width=True)
+                if seen > len(results_cypher):
+                    shown = f"the first {max_rows} of {seen} rows" if allow_writes else f"the first {max_rows} rows"
+                    st.warning(f"Showing {shown} only. Add a LIMIT or refine the query to see the rest.")
+            elif not allow_writes:
                 st.info("Query returned no results")
         except Exception as e:
             st.error(f"Query error: {str(e)}")
@@ -837,7 +996,7 @@ from utils.kg_exporter import export_kg_to_owl
 from utils.shacl_validator import validate_owl_with_shacl
 
 with st.sidebar.expander("🔁 KG Export / Validation"):
-    if st.button("⬇️ Export KG to Turtle/OWL"):
+    if st.button("⬇️ Export KG to Turtle/OWL", disabled=snapshot_mode, help=SNAPSHOT_ONLY if snapshot_mode else None):
         try:
             kg_interface_for_export = KGInterface() # Create an instance for the export
             output_filename = "ndt_knowledge_graph.ttl"
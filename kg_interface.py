@@ -1,12 +1,24 @@
 # kg_interface.py (updated for active decision support)
 
 import os
-from neo4j import GraphDatabase, exceptions as neo4j_exceptions
-from typing import List, Dict
+from neo4j import READ_ACCESS, WRITE_ACCESS, unit_of_work, exceptions as neo4j_exceptions
+from typing import Callable, List, Dict, Iterator, Tuple
 import uuid # Added for uuid.uuid4()
 from dotenv import load_dotenv
 import logging # For logging errors
 from typing import Optional, Dict
+from utils.neo4j_pool import get_driver, get_connection_settings, close_all_drivers
+from utils.kg_cache import kg_query_cache
+from utils.graph_engine import get_compiled_graph
+from utils.kg_schema import ensure_schema
+from utils.kg_telemetry import kg_telemetry, query_name, summarize_plan
+from utils.kg_write_queue import get_write_queue, close_write_queue, write_behind_enabled
+from utils.kg_embedded import embedded_backend_enabled, get_embedded_store
+import functools
+import random
+import re
+import threading
+import time
 
 load_dotenv()
 
@@ -14,15 +26,240 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Managed-transaction policy for KGInterface.cypher
+QUERY_TIMEOUT_SECONDS = float(os.getenv("KG_QUERY_TIMEOUT_SECONDS", "30"))
+QUERY_MAX_RETRIES = int(os.getenv("KG_QUERY_MAX_RETRIES", "3"))
+QUERY_RETRY_BASE_DELAY = float(os.getenv("KG_QUERY_RETRY_BASE_DELAY", "0.2"))
+# Records pulled from the server per batch by KGInterface.cypher_stream
+STREAM_FETCH_SIZE = int(os.getenv("KG_STREAM_FETCH_SIZE", "1000"))
+
+# String literals, quoted identifiers and comments; blanked out before looking for write clauses
+_LITERAL_OR_COMMENT_RE = re.compile(r"""'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|`[^`]*`|//[^\n]*|/\*.*?\*/""", re.DOTALL)
+# Aliases ("RETURN n.offset AS set") can be keywords too
+_ALIAS_RE = re.compile(r"\bAS\s+\w+", re.IGNORECASE)
+# Write clauses in clause position: a keyword not used as a property ("n.set"), parameter or map key,
+# followed by what the clause takes (a pattern, a property/label assignment, a variable, a schema object)
+_WRITE_CLAUSE_RE = re.compile(r"""
+    (?<![\w.$])
+    (?: CREATE \s* \(
+      | CREATE \s+ (?:OR\s+REPLACE\s+)? (?:\w+\s+)? (?:INDEX|CONSTRAINT|DATABASE|ALIAS|USER|ROLE) \b
+      | MERGE \s* \(
+      | DELETE \s+ \w
+      | SET \s+ \w+ \s* (?:\.|\+?=|:)
+      | REMOVE \s+ \w+ \s* [.:]
+      | DROP \s+ (?:INDEX|CONSTRAINT|DATABASE|ALIAS|USER|ROLE) \b
+    )""", re.IGNORECASE | re.VERBOSE)
+
+def is_write_query(query: str) -> bool:
+    """
+    Best-effort guess of whether `query` writes, used when the caller gives no access_mode.
+    Literals, comments and aliases are ignored, and keywords only count in clause position.
+    """
+    text = _ALIAS_RE.sub("AS _", _LITERAL_OR_COMMENT_RE.sub(" _ ", query))
+    return bool(_WRITE_CLAUSE_RE.search(text))
+
+def cache_scope(backend=None, uri: Optional[str] = None, user: Optional[str] = None) -> str:
+    """Identity of the graph an interface reads from; query-cache keys include it, so graphs never share entries."""
+    if backend is not None:
+        return f"{type(backend).__name__}:{id(backend)}"
+    return f"neo4j:{user}@{uri}"
+
+def take_rows(stream: Iterator[Dict], max_rows: int, drain: bool = False,
+              on_progress: Optional[Callable[[List[Dict]], None]] = None) -> Tuple[List[Dict], int]:
+    """
+    Keeps the first `max_rows` records of a cypher_stream and returns (rows, records seen). Closing
+    a stream early rolls its transaction back, so with `drain` the remaining records are read and
+    dropped and a write commits; otherwise the stream is closed as soon as the cap is passed.
+    `on_progress` gets the kept rows every 500 records.
+    """
+    rows: List[Dict] = []
+    seen = 0
+    try:
+        for row in stream:
+            seen += 1
+            if len(rows) < max_rows:
+                rows.append(row)
+                if on_progress is not None and len(rows) % 500 == 0:
+                    on_progress(rows)
+            elif not drain:
+                break
+    finally:
+        stream.close()
+    return rows, seen
+
+def cached_query(method):
+    """Serves a read-only KGInterface lookup from the shared, versioned query cache."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        key = (self.cache_scope, method.__name__, args, tuple(sorted(kwargs.items())))
+        return self._query_cache.get_or_load(key, lambda: method(self, *args, **kwargs))
+    return wrapper
+
+# --- Cypher used by KGInterface and AsyncKGInterface (kg_interface_async.py) ---
+
+RECOMMEND_NDT_METHODS_QUERY = """
+    // High-level path
+    MATCH (m:Material {name:$material})-[:HAS_DETERIORATION_MECHANISM]->(d:Deterioration {name:$defect})
+    MATCH (d)-[:DETECTED_BY]->(n:NDTMethod)-[:REQUIRES_ENVIRONMENT]->(e:Environment {name:$environment})
+    RETURN DISTINCT n.name AS method
+
+    UNION
+
+    // Mechanism-based path
+    MATCH (m:Material {name:$material})-[:HAS_DETERIORATION_MECHANISM]->(dm:DeteriorationMechanism {name:$defect})
+    MATCH (dm)-[:CAUSES_PHYSICAL_CHANGE]->(p:PhysicalChange)
+    MATCH (p)-[:DETECTED_BY]->(n:NDTMethod)-[:REQUIRES_ENVIRONMENT]->(e:Environment {name:$environment})
+    RETURN DISTINCT n.name AS method
+"""
+
+RECOMMEND_SENSORS_QUERY = """
+    // Path A: Deterioration → NDTMethod → Sensor
+    MATCH (d:Deterioration {name:$defect})-[:DETECTED_BY]->(n:NDTMethod)
+    MATCH (s:Sensor)-[:RECOMMENDED_FOR]->(n)
+    RETURN DISTINCT s.name AS sensor
+
+    UNION
+
+    // Path B: DeteriorationMechanism → PhysicalChange → NDTMethod → Sensor
+    MATCH (dm:DeteriorationMechanism {name:$defect})-[:CAUSES_PHYSICAL_CHANGE]->(p:PhysicalChange)
+    MATCH (p)-[:DETECTED_BY]->(n:NDTMethod)
+    MATCH (s:Sensor)-[:RECOMMENDED_FOR]->(n)
+    RETURN DISTINCT s.name AS sensor
+"""
+
+REASONING_SUBGRAPH_QUERY = """
+    OPTIONAL MATCH (m:Material {name:$material})-[:HAS_DETERIORATION_MECHANISM]->(d)
+    WHERE d.name = $defect
+    OPTIONAL MATCH (d)-[:DETECTED_BY]->(n:NDTMethod)-[:REQUIRES_ENVIRONMENT]->(e:Environment {name:$environment})
+    OPTIONAL MATCH (s:Sensor)-[:RECOMMENDED_FOR]->(n)
+    RETURN m.name AS material, d.name AS defect, n.name AS method, e.name AS env, s.name AS sensor
+"""
+
+LOG_INSPECTION_PLAN_QUERY = """
+    CREATE (ip:InspectionPlan {
+        planID: $plan_id,
+        text: $plan_text,
+        material: $material,
+        defect: $defect,
+        environment: $environment,
+        timestamp: datetime()
+    })
+    RETURN ip.planID AS generatedPlanId
+"""
+
+LOG_PLAN_FEEDBACK_QUERY = """
+    MATCH (ip:InspectionPlan {planID: $plan_id_param})
+    CREATE (f:Feedback {
+        uuid: $feedback_uuid_param, // Store the UUID on the node
+        is_helpful: $is_helpful,
+        comment: $feedback_text,
+        timestamp: datetime()
+    })
+    CREATE (f)-[:REFERS_TO_PLAN]->(ip)
+    RETURN f.uuid AS feedback_node_uuid, f.timestamp AS feedback_timestamp
+"""
+
+RAG_CONTEXT_QUERY = """
+    OPTIONAL MATCH (m:Material {name: $material_name})
+    WITH head(collect(m {.description, .commonApplications})) AS material
+    OPTIONAL MATCH (d:Deterioration {name: $defect_name})
+    WITH material, head(collect(d.detailedDescription)) AS deterioration_description
+    OPTIONAL MATCH (pc:PhysicalChange {name: $defect_name})
+    WITH material, deterioration_description, head(collect(pc.detailedDescription)) AS physical_change_description
+    CALL {
+        UNWIND range(0, size($method_names) - 1) AS idx
+        MATCH (n:NDTMethod {name: $method_names[idx]})
+        WITH idx, head(collect(n)) AS n
+        OPTIONAL MATCH (n)-[:hasPotentialRisk]->(r:RiskType)
+        WITH idx, n, collect(r {riskName: r.name, riskDescription: r.riskDescription, mitigationSuggestion: r.mitigationSuggestion}) AS risks
+        ORDER BY idx
+        RETURN collect(n {.name, .description, .costEstimate, .methodCategory, .detectionCapabilities,
+                          .applicableMaterialsNote, .methodLimitations, risks: risks}) AS methods
+    }
+    RETURN material, deterioration_description, physical_change_description, methods
+"""
+
+NDT_METHOD_DETAILS_QUERY = """
+    MATCH (n:NDTMethod {name: $method_name})
+    OPTIONAL MATCH (n)-[:hasPotentialRisk]->(r:RiskType)
+    RETURN n.name AS name,
+           n.description AS description,
+           n.costEstimate AS costEstimate,
+           n.methodCategory AS methodCategory,
+           n.detectionCapabilities AS detectionCapabilities,
+           n.applicableMaterialsNote AS applicableMaterialsNote,
+           n.methodLimitations AS methodLimitations,
+           collect({riskName: r.name, riskDescription: r.riskDescription, mitigationSuggestion: r.mitigationSuggestion}) AS potential_risks
+    LIMIT 1
+"""
+
+MATERIAL_DETAILS_QUERY = """
+    MATCH (m:Material {name: $material_name})
+    RETURN m.name AS name, m.description AS description, m.commonApplications AS commonApplications
+    LIMIT 1
+"""
+
+DETERIORATION_DETAILS_QUERY = """
+    MATCH (d:Deterioration {name: $defect_name})
+    RETURN d.name AS name, d.detailedDescription AS detailedDescription
+    LIMIT 1
+"""
+
+PHYSICAL_CHANGE_DETAILS_QUERY = """
+    MATCH (pc:PhysicalChange {name: $defect_name})
+    RETURN pc.name AS name, pc.detailedDescription AS detailedDescription
+    LIMIT 1
+"""
+
+RECOMMENDATION_SUBGRAPH_QUERY = """
+    MATCH (m:Material {name: $material})-[:AFFECTS]->(d:Defect {name: $defect})
+    OPTIONAL MATCH (d)-[:INSPECTED_BY]->(n:NDTMethod)-[:REQUIRES]->(s:Sensor)
+    OPTIONAL MATCH (n)-[:USED_IN]->(e:Environment {name: $environment})
+    RETURN DISTINCT m.name AS material, d.name AS defect, n.name AS method,
+                    s.name AS sensor, e.name AS environment,
+                    labels(m)[0] AS m_label, labels(d)[0] AS d_label,
+                    labels(n)[0] AS n_label, labels(s)[0] AS s_label,
+                    labels(e)[0] AS e_label
+"""
+
+MATERIALS_QUERY = "MATCH (m:Material) RETURN DISTINCT m.name AS name ORDER BY name"
+
+DETERIORATION_TYPES_QUERY = "MATCH (d:Deterioration) RETURN DISTINCT d.name AS name ORDER BY name"
+
+ENVIRONMENTS_QUERY = "MATCH (e:Environment) RETURN DISTINCT e.name AS name ORDER BY name"
+
+# Entity names (and optional synonyms) the local entity extractor matches against (utils/gazetteer.py)
+VOCABULARY_QUERY = """
+MATCH (n)
+WHERE n:Material OR n:Deterioration OR n:DeteriorationMechanism OR n:PhysicalChange OR n:Environment
+WITH n, [label IN labels(n) WHERE label IN ['Material', 'Deterioration', 'DeteriorationMechanism', 'PhysicalChange', 'Environment']][0] AS label
+WHERE n.name IS NOT NULL
+RETURN label, n.name AS name, coalesce(n.synonyms, []) AS synonyms
+"""
+
 class KGInterface:
-    def __init__(self):
-        uri = os.getenv("NEO4J_URI", "bolt://localhost:7687")
-        user = os.getenv("NEO4J_USER", "neo4j")
-        password = os.getenv("NEO4J_PASSWORD", "eklil@2017")
+    _query_cache = kg_query_cache
+
+    def __init__(self, use_compiled_engine: Optional[bool] = None, backend=None):
+        # Answer the fixed recommendation traversals in-process (utils/graph_engine.py)
+        if use_compiled_engine is None:
+            use_compiled_engine = os.getenv("KG_COMPILED_ENGINE", "0").lower() in ("1", "true", "yes")
+        self.use_compiled_engine = use_compiled_engine
+        # A backend answers named queries without Neo4j: backend.run(name, query, params) -> records
+        # (KG_BACKEND=embedded loads utils/kg_embedded.py from KG_SNAPSHOT_PATH)
+        if backend is None and embedded_backend_enabled():
+            backend = get_embedded_store()
+        self.backend = backend
+        if backend is not None:
+            self.driver = None
+            self.cache_scope = cache_scope(backend)
+            return
+        # The driver (and its connection pool) is shared process-wide; constructing a
+        # KGInterface is cheap and only the first one per process pays the handshake.
+        uri, user, password = get_connection_settings()
+        self.cache_scope = cache_scope(uri=uri, user=user)
         try:
-            self.driver = GraphDatabase.driver(uri, auth=(user, password))
-            self.driver.verify_connectivity()
-            logger.info("Successfully connected to Neo4j.")
+            self.driver = get_driver(uri, user, password)
         except neo4j_exceptions.AuthError as e:
             logger.error(f"Neo4j authentication failed: {e}")
             raise
@@ -33,93 +270,207 @@ class KGInterface:
             logger.error(f"Failed to create Neo4j driver: {e}")
             raise
 
-    def cypher(self, query: str, params: Dict = None, log: bool = True) -> List[Dict]:
-        if log:
-            logger.info(f"\n[Cypher Query]\n{query}\nWith Params: {params}")
+    @staticmethod
+    def shutdown() -> None:
+        """Flushes the write-behind queue and closes the shared Neo4j drivers. Call once when the process is shutting down."""
+        close_write_queue()
+        close_all_drivers()
+
+    def ensure_schema(self, dry_run: bool = False) -> Dict[str, List[str]]:
+        """Creates any missing uniqueness constraints/indexes (see utils/kg_schema.py) and reports them."""
+        return ensure_schema(self, dry_run=dry_run)
+
+    @classmethod
+    def cache_stats(cls) -> Dict:
+        """Hit/miss counters and size of the shared query cache."""
+        return cls._query_cache.stats()
+
+    def cypher(self, query: str, params: Dict = None, log: bool = True, invalidate_cache: Optional[bool] = None,
+               access_mode: Optional[str] = None, timeout: Optional[float] = None, name: Optional[str] = None) -> List[Dict]:
+        """
+        Runs a Cypher query in a managed transaction and returns its records as dicts.
+
+        access_mode is READ_ACCESS or WRITE_ACCESS; when omitted it is guessed from the query's
+        clauses (is_write_query), so callers running user-supplied Cypher should pass it. Retryable failures (leader switches, lock contention, dropped connections) are
+        retried with bounded exponential backoff, and each attempt is limited by `timeout`
+        seconds (KG_QUERY_TIMEOUT_SECONDS by default).
+        Write queries invalidate the shared query cache; pass invalidate_cache=False for
+        writes that cannot affect cached lookups (plan/feedback logging).
+        Latency and row counts are recorded under `name` (see utils/kg_telemetry.py); the query
+        text is only logged when the query is slow or sampled, and log=False suppresses it.
+        """
+        name = query_name(query, name)
+        logger.debug(f"[Cypher {name}]\n{query}\nWith Params: {params}")
+        if access_mode is None:
+            access_mode = WRITE_ACCESS if is_write_query(query) else READ_ACCESS
+        if invalidate_cache is None:
+            invalidate_cache = access_mode == WRITE_ACCESS
+        if timeout is None:
+            timeout = QUERY_TIMEOUT_SECONDS
+
+        @unit_of_work(timeout=timeout)
+        def work(tx):
+            result = tx.run(query, params or {})
+            return [record.data() for record in result]
+
+        started = time.perf_counter()
+        try:
+            if self.backend is not None:
+                records = self.backend.run(name, query, params or {})
+            else:
+                records = self._run_managed(work, access_mode, query, params)
+        except Exception:
+            kg_telemetry.record(name, (time.perf_counter() - started) * 1000, error=True, params=params)
+            raise
+        self._record_query(name, query, params, (time.perf_counter() - started) * 1000, len(records), log, access_mode)
+        if invalidate_cache:
+            self._query_cache.invalidate()
+        return records
+
+    def _run_managed(self, work, access_mode: str, query: str, params: Dict) -> List[Dict]:
+        """Runs a transaction function with bounded exponential-backoff retries."""
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                with self.driver.session() as session:
+                    if access_mode == WRITE_ACCESS:
+                        records = session.execute_write(work)
+                    else:
+                        records = session.execute_read(work)
+                if attempt > 1:
+                    logger.info(f"Cypher query succeeded after {attempt} attempts.")
+                return records
+            except neo4j_exceptions.CypherSyntaxError as e:
+                logger.error(f"Cypher syntax error in query: {query} | PARAMS: {params} | ERROR: {e}")
+                raise # Re-raise for the caller to handle or decide on fallback
+            except neo4j_exceptions.ConstraintError as e:
+                logger.error(f"Constraint violation: {query} | PARAMS: {params} | ERROR: {e}")
+                raise
+            except (neo4j_exceptions.Neo4jError, neo4j_exceptions.DriverError) as e:
+                # Transient errors (leader switch, deadlock, db busy) and lost connections
+                if e.is_retryable() and attempt <= QUERY_MAX_RETRIES:
+                    delay = QUERY_RETRY_BASE_DELAY * (2 ** (attempt - 1)) * random.uniform(0.8, 1.2)
+                    logger.warning(f"Neo4j retryable error (attempt {attempt}/{QUERY_MAX_RETRIES + 1}), retrying in {delay:.2f}s: {e}")
+                    time.sleep(delay)
+                    continue
+                logger.error(f"Neo4j error after {attempt} attempt(s): {query} | PARAMS: {params} | ERROR: {e}")
+                raise
+            except Exception as e: # Catch any other Neo4j operational errors
+                logger.error(f"An unexpected Neo4j error occurred: {query} | PARAMS: {params} | ERROR: {e}")
+                raise
+
+    def _record_query(self, name: str, query: str, params: Dict, latency_ms: float, rows: int, log: bool, access_mode: str) -> None:
+        kg_telemetry.record(name, latency_ms, rows, params=params)
+        if log and kg_telemetry.should_log(latency_ms):
+            slow = " (slow)" if kg_telemetry.is_slow(latency_ms) else ""
+            logger.info(f"\n[Cypher {name}] {latency_ms:.1f} ms, {rows} rows{slow}\n{query}\nWith Params: {params}")
+        if self.driver is not None and kg_telemetry.should_capture_plan(name, latency_ms):
+            threading.Thread(target=self._capture_plan, args=(name, query, params, access_mode), daemon=True).start()
+
+    def _capture_plan(self, name: str, query: str, params: Dict, access_mode: str) -> None:
+        """Records the EXPLAIN (or, for reads with KG_QUERY_PLAN_MODE=PROFILE, PROFILE) plan of a slow query."""
+        mode = "PROFILE" if kg_telemetry.plan_mode == "PROFILE" and access_mode == READ_ACCESS else "EXPLAIN"
+        try:
+            with self.driver.session(default_access_mode=access_mode) as session:
+                summary = session.run(f"{mode} {query}", params or {}).consume()
+            kg_telemetry.record_plan(name, summarize_plan(summary.profile if mode == "PROFILE" else summary.plan))
+        except Exception as e:
+            logger.debug(f"Could not capture {mode} plan for {name}: {e}")
+
+    @staticmethod
+    def query_stats() -> List[Dict]:
+        """Per-query-name latency/row statistics (see utils/kg_telemetry.py)."""
+        return kg_telemetry.snapshot()
+
+    def cypher_stream(self, query: str, params: Dict = None, fetch_size: Optional[int] = None, log: bool = True,
+                      access_mode: Optional[str] = None, timeout: Optional[float] = None, name: Optional[str] = None) -> Iterator[Dict]:
+        """
+        Yields records as dicts while they arrive from the server instead of materialising the
+        whole result, pulling `fetch_size` records per batch (KG_STREAM_FETCH_SIZE by default).
+        Closing the generator early rolls the transaction back. Unlike cypher(), a stream is
+        not retried, since records already handed to the caller can't be replayed.
+        """
+        name = query_name(query, name)
+        logger.debug(f"[Cypher Stream {name}]\n{query}\nWith Params: {params}")
+        if access_mode is None:
+            access_mode = WRITE_ACCESS if is_write_query(query) else READ_ACCESS
+        if timeout is None:
+            timeout = QUERY_TIMEOUT_SECONDS
+
+        started = time.perf_counter()
+        rows = 0
         try:
-            with self.driver.session() as session:
-                result = session.run(query, params or {})
-                return [record.data() for record in result]
+            if self.backend is not None:
+                for record in self.backend.run(name, query, params or {}):
+                    rows += 1
+                    yield record
+            else:
+                with self.driver.session(default_access_mode=access_mode, fetch_size=fetch_size or STREAM_FETCH_SIZE) as session:
+                    with session.begin_transaction(timeout=timeout) as tx:
+                        for record in tx.run(query, params or {}):
+                            rows += 1
+                            yield record.data()
+                        tx.commit()
         except neo4j_exceptions.CypherSyntaxError as e:
+            kg_telemetry.record(name, (time.perf_counter() - started) * 1000, rows, error=True, params=params)
             logger.error(f"Cypher syntax error in query: {query} | PARAMS: {params} | ERROR: {e}")
-            raise # Re-raise for the caller to handle or decide on fallback
-        except neo4j_exceptions.ConstraintError as e:
-            logger.error(f"Constraint violation: {query} | PARAMS: {params} | ERROR: {e}")
             raise
-        except neo4j_exceptions.TransientError as e: # For temporary issues like leader switch, db busy
-            logger.warning(f"Neo4j transient error: {query} | PARAMS: {params} | ERROR: {e}. Consider retrying.")
-            # Depending on policy, could implement retries here or raise
+        except (neo4j_exceptions.Neo4jError, neo4j_exceptions.DriverError) as e:
+            kg_telemetry.record(name, (time.perf_counter() - started) * 1000, rows, error=True, params=params)
+            logger.error(f"Neo4j error while streaming: {query} | PARAMS: {params} | ERROR: {e}")
             raise
-        except Exception as e: # Catch any other Neo4j operational errors
-            logger.error(f"An unexpected Neo4j error occurred: {query} | PARAMS: {params} | ERROR: {e}")
-            raise
-        return [] # Should not be reached if exceptions are re-raised, but as a fallback
+        # Includes the time the caller spent consuming the stream
+        self._record_query(name, query, params, (time.perf_counter() - started) * 1000, rows, log, access_mode)
+        if access_mode == WRITE_ACCESS:
+            self._query_cache.invalidate()
+
+    def _compiled_graph(self):
+        """Returns the in-process recommendation engine, or None to fall back to Cypher."""
+        if not self.use_compiled_engine:
+            return None
+        try:
+            return get_compiled_graph(self)
+        except Exception as e:
+            logger.warning(f"Compiled recommendation graph unavailable, falling back to Cypher: {e}")
+            return None
 
+    @cached_query
     def recommend_ndt_methods(self, material: str, defect: str, environment: str) -> List[str]:
-        query = """
-        // High-level path
-        MATCH (m:Material {name:$material})-[:HAS_DETERIORATION_MECHANISM]->(d:Deterioration {name:$defect})
-        MATCH (d)-[:DETECTED_BY]->(n:NDTMethod)-[:REQUIRES_ENVIRONMENT]->(e:Environment {name:$environment})
-        RETURN DISTINCT n.name AS method
-
-        UNION
-
-        // Mechanism-based path
-        MATCH (m:Material {name:$material})-[:HAS_DETERIORATION_MECHANISM]->(dm:DeteriorationMechanism {name:$defect})
-        MATCH (dm)-[:CAUSES_PHYSICAL_CHANGE]->(p:PhysicalChange)
-        MATCH (p)-[:DETECTED_BY]->(n:NDTMethod)-[:REQUIRES_ENVIRONMENT]->(e:Environment {name:$environment})
-        RETURN DISTINCT n.name AS method
-        """
+        engine = self._compiled_graph()
+        if engine is not None:
+            return engine.recommend_ndt_methods(material, defect, environment)
+
+        query = RECOMMEND_NDT_METHODS_QUERY
         return [r["method"] for r in self.cypher(query, {
             "material": material,
             "defect": defect,
             "environment": environment
-        })]
+        }, name="recommend_ndt_methods")]
 
 
+    @cached_query
     def recommend_sensors(self, defect: str) -> List[str]:
-        query = """
-        // Path A: Deterioration → NDTMethod → Sensor
-        MATCH (d:Deterioration {name:$defect})-[:DETECTED_BY]->(n:NDTMethod)
-        MATCH (s:Sensor)-[:RECOMMENDED_FOR]->(n)
-        RETURN DISTINCT s.name AS sensor
-
-        UNION
-
-        // Path B: DeteriorationMechanism → PhysicalChange → NDTMethod → Sensor
-        MATCH (dm:DeteriorationMechanism {name:$defect})-[:CAUSES_PHYSICAL_CHANGE]->(p:PhysicalChange)
-        MATCH (p)-[:DETECTED_BY]->(n:NDTMethod)
-        MATCH (s:Sensor)-[:RECOMMENDED_FOR]->(n)
-        RETURN DISTINCT s.name AS sensor
-        """
-        return [r["sensor"] for r in self.cypher(query, {"defect": defect})]
+        engine = self._compiled_graph()
+        if engine is not None:
+            return engine.recommend_sensors(defect)
+
+        query = RECOMMEND_SENSORS_QUERY
+        return [r["sensor"] for r in self.cypher(query, {"defect": defect}, name="recommend_sensors")]
 
     def get_reasoning_subgraph(self, material: str, defect: str, environment: str) -> List[Dict]:
-        query = """
-        OPTIONAL MATCH (m:Material {name:$material})-[:HAS_DETERIORATION_MECHANISM]->(d)
-        WHERE d.name = $defect
-        OPTIONAL MATCH (d)-[:DETECTED_BY]->(n:NDTMethod)-[:REQUIRES_ENVIRONMENT]->(e:Environment {name:$environment})
-        OPTIONAL MATCH (s:Sensor)-[:RECOMMENDED_FOR]->(n)
-        RETURN m.name AS material, d.name AS defect, n.name AS method, e.name AS env, s.name AS sensor
-        """
-        return self.cypher(query, {"material": material, "defect": defect, "environment": environment})
+        query = REASONING_SUBGRAPH_QUERY
+        return self.cypher(query, {"material": material, "defect": defect, "environment": environment}, name="reasoning_subgraph")
 
     # --- 1️⃣ Update KGInterface.py ---
     # Add this function to KGInterface class
 
     def log_inspection_plan(self, plan_text: str, material: str, defect: str, environment: str) -> str:
         plan_id = str(uuid.uuid4())
-        query = """
-        CREATE (ip:InspectionPlan {
-            planID: $plan_id,
-            text: $plan_text,
-            material: $material,
-            defect: $defect,
-            environment: $environment,
-            timestamp: datetime()
-        })
-        RETURN ip.planID AS generatedPlanId
-        """
+        if write_behind_enabled():
+            # Spooled and written in a batch by utils/kg_write_queue.py; the ID is valid immediately
+            return get_write_queue().enqueue_plan(plan_id, plan_text, material, defect, environment)
+        query = LOG_INSPECTION_PLAN_QUERY
         # Assuming cypher returns a list of dicts, and CREATE...RETURN returns one record
         result = self.cypher(query, {
             "plan_id": plan_id,
@@ -127,7 +478,7 @@ class KGInterface:
             "material": material,
             "defect": defect,
             "environment": environment
-        })
+        }, invalidate_cache=False, access_mode=WRITE_ACCESS, name="log_inspection_plan")
         if result and result[0].get("generatedPlanId"):
             logger.info(f"InspectionPlan logged with ID: {result[0]['generatedPlanId']}")
             return result[0]["generatedPlanId"]
@@ -137,17 +488,25 @@ class KGInterface:
         # if the calling code is prepared to handle it. Let's return plan_id as intended.
         return plan_id # Fallback to initially generated UUID if RETURN fails to be parsed, though it shouldn't.
 
+    @cached_query
     def get_materials(self) -> List[str]:
-        query = "MATCH (m:Material) RETURN DISTINCT m.name AS name ORDER BY name"
-        return [r["name"] for r in self.cypher(query)]
+        query = MATERIALS_QUERY
+        return [r["name"] for r in self.cypher(query, name="materials")]
 
+    @cached_query
     def get_deterioration_types(self) -> List[str]:
-        query = "MATCH (d:Deterioration) RETURN DISTINCT d.name AS name ORDER BY name"
-        return [r["name"] for r in self.cypher(query)]
+        query = DETERIORATION_TYPES_QUERY
+        return [r["name"] for r in self.cypher(query, name="deterioration_types")]
 
+    @cached_query
     def get_environments(self) -> List[str]:
-        query = "MATCH (e:Environment) RETURN DISTINCT e.name AS name ORDER BY name"
-        return [r["name"] for r in self.cypher(query)]
+        query = ENVIRONMENTS_QUERY
+        return [r["name"] for r in self.cypher(query, name="environments")]
+
+    @cached_query
+    def get_vocabulary(self) -> List[Dict]:
+        """Rows of label, name and synonyms for every material, defect and environment entity."""
+        return self.cypher(VOCABULARY_QUERY, name="vocabulary")
 
     def log_plan_feedback(self, plan_id: str, is_helpful: bool, feedback_text: str = None) -> None:
         """
@@ -159,24 +518,19 @@ class KGInterface:
 
         feedback_uuid = str(uuid.uuid4()) # Generate a UUID for the Feedback node
 
-        query = """
-        MATCH (ip:InspectionPlan {planID: $plan_id_param})
-        CREATE (f:Feedback {
-            uuid: $feedback_uuid_param, // Store the UUID on the node
-            is_helpful: $is_helpful,
-            comment: $feedback_text,
-            timestamp: datetime()
-        })
-        CREATE (f)-[:REFERS_TO_PLAN]->(ip)
-        RETURN f.uuid AS feedback_node_uuid, f.timestamp AS feedback_timestamp
-        """
+        if write_behind_enabled():
+            get_write_queue().enqueue_feedback(plan_id, feedback_uuid, is_helpful, feedback_text)
+            logger.info(f"Feedback queued for plan ID: {plan_id}. Helpful: {is_helpful}.")
+            return
+
+        query = LOG_PLAN_FEEDBACK_QUERY
         try:
             result = self.cypher(query, {
                 "plan_id_param": plan_id,
                 "feedback_uuid_param": feedback_uuid,
                 "is_helpful": is_helpful,
                 "feedback_text": feedback_text
-            })
+            }, invalidate_cache=False, access_mode=WRITE_ACCESS, name="log_plan_feedback")
             if result and result[0].get("feedback_timestamp"):
                 logger.info(f"Feedback logged for plan ID: {plan_id}. Helpful: {is_helpful}.")
             else:
@@ -185,11 +539,50 @@ class KGInterface:
             logger.error(f"Failed to log feedback for plan ID {plan_id}: {e}")
             # Optionally re-raise or handle if critical
 
-    def get_entities_details_for_rag(self, material_name: str = None, defect_name: str = None, method_names: list[str] = None) -> str:
+    def get_entities_details_for_rag(self, material_name: str = None, defect_name: str = None, method_names: list[str] = None, batched: bool = True) -> str:
         """
         Fetches details for specified material, defect (name only for now), and NDT methods
         to be used as context for Retrieval Augmented Generation.
+
+        By default everything (material, defect, every method and its risks) is fetched in a
+        single round-trip; pass batched=False to fall back to one query per entity.
         """
+        if not batched:
+            return self._get_entities_details_for_rag_per_entity(material_name, defect_name, method_names)
+
+        query = RAG_CONTEXT_QUERY
+        results = self.cypher(query, {
+            "material_name": material_name,
+            "defect_name": defect_name,
+            "method_names": list(method_names or [])
+        }, name="rag_context")
+        return self._format_rag_context(results[0] if results else {}, material_name, defect_name, method_names)
+
+    @classmethod
+    def _format_rag_context(cls, row: Dict, material_name: str = None, defect_name: str = None, method_names: list[str] = None) -> str:
+        """Formats the single row returned by RAG_CONTEXT_QUERY into the RAG context text."""
+        context_parts = []
+        if material_name and row.get("material"):
+            cls._append_material_context(context_parts, material_name, row["material"])
+
+        if defect_name:
+            context_parts.append(f"--- Defect/Observation of Concern: {defect_name} ---")
+            defect_description = row.get("deterioration_description") or row.get("physical_change_description")
+            if defect_description:
+                context_parts.append(f"Defect Description: {defect_description}")
+
+        if method_names:
+            context_parts.append("--- NDT Method Details ---")
+            for m_details in row.get("methods") or []:
+                cls._append_method_context(context_parts, m_details["name"], m_details, m_details.get("risks"))
+
+        if not context_parts:
+            return "No specific details found in KG for the provided entities."
+
+        return "\n".join(context_parts)
+
+    def _get_entities_details_for_rag_per_entity(self, material_name: str = None, defect_name: str = None, method_names: list[str] = None) -> str:
+        """Original N+1 implementation of get_entities_details_for_rag (one query per entity)."""
         context_parts = []
 
         if material_name:
@@ -198,14 +591,9 @@ class KGInterface:
             RETURN m.description AS description, m.commonApplications AS commonApplications
             LIMIT 1
             """
-            material_details = self.cypher(query_material, {"material_name": material_name})
+            material_details = self.cypher(query_material, {"material_name": material_name}, name="rag.material")
             if material_details and material_details[0]:
-                md = material_details[0]
-                context_parts.append(f"--- Material: {material_name} ---")
-                if md.get("description"):
-                    context_parts.append(f"Description: {md['description']}")
-                if md.get("commonApplications"):
-                    context_parts.append(f"Common Applications: {md['commonApplications']}")
+                self._append_material_context(context_parts, material_name, material_details[0])
 
         if defect_name:
             context_parts.append(f"--- Defect/Observation of Concern: {defect_name} ---")
@@ -215,7 +603,7 @@ class KGInterface:
             RETURN d.detailedDescription AS description
             LIMIT 1
             """
-            defect_desc_details = self.cypher(query_defect_desc, {"defect_name": defect_name})
+            defect_desc_details = self.cypher(query_defect_desc, {"defect_name": defect_name}, name="rag.deterioration")
             if defect_desc_details and defect_desc_details[0] and defect_desc_details[0].get("description"):
                 context_parts.append(f"Defect Description: {defect_desc_details[0]['description']}")
             else: # Try PhysicalChange if not found on Deterioration
@@ -224,7 +612,7 @@ class KGInterface:
                 RETURN pc.detailedDescription AS description
                 LIMIT 1
                 """
-                defect_pc_desc_details = self.cypher(query_defect_pc_desc, {"defect_name": defect_name})
+                defect_pc_desc_details = self.cypher(query_defect_pc_desc, {"defect_name": defect_name}, name="rag.physical_change")
                 if defect_pc_desc_details and defect_pc_desc_details[0] and defect_pc_desc_details[0].get("description"):
                      context_parts.append(f"Defect Description: {defect_pc_desc_details[0]['description']}")
 
@@ -242,42 +630,53 @@ class KGInterface:
                        n.methodLimitations AS methodLimitations
                 LIMIT 1
                 """
-                method_details = self.cypher(query_method, {"method_name": method_name})
+                method_details = self.cypher(query_method, {"method_name": method_name}, name="rag.method")
                 if method_details and method_details[0]:
-                    m_details = method_details[0]
-                    context_parts.append(f"Method: {method_name}")
-                    if m_details.get("description"):
-                        context_parts.append(f"  Description: {m_details['description']}")
-                    if m_details.get("methodCategory"):
-                        context_parts.append(f"  Category: {m_details['methodCategory']}")
-                    if m_details.get("costEstimate"):
-                        context_parts.append(f"  Cost Estimate: {m_details['costEstimate']}")
-                    if m_details.get("detectionCapabilities"):
-                        context_parts.append(f"  Detection Capabilities: {m_details['detectionCapabilities']}")
-                    if m_details.get("applicableMaterialsNote"):
-                        context_parts.append(f"  Applicable Materials Note: {m_details['applicableMaterialsNote']}")
-                    if m_details.get("methodLimitations"):
-                        context_parts.append(f"  Method Limitations: {m_details['methodLimitations']}")
-
-                    # Fetch and append linked risks for the NDT method
+                    # Fetch linked risks for the NDT method
                     query_risks = """
                     MATCH (n:NDTMethod {name: $method_name})-[:hasPotentialRisk]->(r:RiskType)
                     RETURN r.name AS riskName, r.riskDescription AS riskDescription, r.mitigationSuggestion AS mitigationSuggestion
                     """
-                    risks_details = self.cypher(query_risks, {"method_name": method_name}, log=False) # log=False to reduce noise for sub-queries
-                    if risks_details:
-                        context_parts.append(f"  Potential Risks:")
-                        for risk_detail in risks_details:
-                            risk_name = risk_detail.get('riskName', 'Unnamed Risk')
-                            desc = risk_detail.get('riskDescription', 'No description.')
-                            mitigation = risk_detail.get('mitigationSuggestion', 'None specified.')
-                            context_parts.append(f"    - {risk_name}: {desc} (Mitigation: {mitigation})")
+                    risks_details = self.cypher(query_risks, {"method_name": method_name}, log=False, name="rag.method_risks") # log=False to reduce noise for sub-queries
+                    self._append_method_context(context_parts, method_name, method_details[0], risks_details)
 
         if not context_parts:
             return "No specific details found in KG for the provided entities."
 
         return "\n".join(context_parts)
 
+    @staticmethod
+    def _append_material_context(context_parts: List[str], material_name: str, md: Dict) -> None:
+        context_parts.append(f"--- Material: {material_name} ---")
+        if md.get("description"):
+            context_parts.append(f"Description: {md['description']}")
+        if md.get("commonApplications"):
+            context_parts.append(f"Common Applications: {md['commonApplications']}")
+
+    @staticmethod
+    def _append_method_context(context_parts: List[str], method_name: str, m_details: Dict, risks_details: Optional[List[Dict]]) -> None:
+        context_parts.append(f"Method: {method_name}")
+        if m_details.get("description"):
+            context_parts.append(f"  Description: {m_details['description']}")
+        if m_details.get("methodCategory"):
+            context_parts.append(f"  Category: {m_details['methodCategory']}")
+        if m_details.get("costEstimate"):
+            context_parts.append(f"  Cost Estimate: {m_details['costEstimate']}")
+        if m_details.get("detectionCapabilities"):
+            context_parts.append(f"  Detection Capabilities: {m_details['detectionCapabilities']}")
+        if m_details.get("applicableMaterialsNote"):
+            context_parts.append(f"  Applicable Materials Note: {m_details['applicableMaterialsNote']}")
+        if m_details.get("methodLimitations"):
+            context_parts.append(f"  Method Limitations: {m_details['methodLimitations']}")
+
+        if risks_details:
+            context_parts.append(f"  Potential Risks:")
+            for risk_detail in risks_details:
+                risk_name = risk_detail.get('riskName', 'Unnamed Risk')
+                desc = risk_detail.get('riskDescription', 'No description.')
+                mitigation = risk_detail.get('mitigationSuggestion', 'None specified.')
+                context_parts.append(f"    - {risk_name}: {desc} (Mitigation: {mitigation})")
+
     # --- Methods for LLM Function Calling ---
 
     def get_initial_recommendations_structured(self, material: str, defect: str, environment: str) -> Dict:
@@ -288,23 +687,14 @@ class KGInterface:
             "recommended_sensors": recommended_sensors
         }
 
+    @cached_query
     def get_ndt_method_structured_details(self, method_name: str) -> Optional[Dict]:
+        query = NDT_METHOD_DETAILS_QUERY
+        results = self.cypher(query, {"method_name": method_name}, name="ndt_method_details")
+        return self._clean_method_details(results)
 
-
-        query = """
-        MATCH (n:NDTMethod {name: $method_name})
-        OPTIONAL MATCH (n)-[:hasPotentialRisk]->(r:RiskType)
-        RETURN n.name AS name,
-               n.description AS description,
-               n.costEstimate AS costEstimate,
-               n.methodCategory AS methodCategory,
-               n.detectionCapabilities AS detectionCapabilities,
-               n.applicableMaterialsNote AS applicableMaterialsNote,
-               n.methodLimitations AS methodLimitations,
-               collect({riskName: r.name, riskDescription: r.riskDescription, mitigationSuggestion: r.mitigationSuggestion}) AS potential_risks
-        LIMIT 1
-        """
-        results = self.cypher(query, {"method_name": method_name})
+    @staticmethod
+    def _clean_method_details(results: List[Dict]) -> Optional[Dict]:
         if not results or not results[0] or results[0].get("name") is None: # Check if method was found
             return None
 
@@ -318,58 +708,35 @@ class KGInterface:
         return details
 
 
+    @cached_query
     def get_material_structured_details(self, material_name: str) -> Optional[Dict]:
 
-        query = """
-        MATCH (m:Material {name: $material_name})
-        RETURN m.name AS name, m.description AS description, m.commonApplications AS commonApplications
-        LIMIT 1
-        """
-        results = self.cypher(query, {"material_name": material_name})
+        query = MATERIAL_DETAILS_QUERY
+        results = self.cypher(query, {"material_name": material_name}, name="material_details")
         return results[0] if results and results[0].get("name") is not None else None
 
+    @cached_query
     def get_defect_structured_details(self, defect_name: str) -> Optional[Dict]:
-        query_det = """
-        MATCH (d:Deterioration {name: $defect_name})
-        RETURN d.name AS name, d.detailedDescription AS detailedDescription
-        LIMIT 1
-        """
-        results_det = self.cypher(query_det, {"defect_name": defect_name})
+        query_det = DETERIORATION_DETAILS_QUERY
+        results_det = self.cypher(query_det, {"defect_name": defect_name}, name="deterioration_details")
         if results_det and results_det[0].get("name") is not None:
             return results_det[0]
 
-        query_pc = """
-        MATCH (pc:PhysicalChange {name: $defect_name})
-        RETURN pc.name AS name, pc.detailedDescription AS detailedDescription
-        LIMIT 1
-        """
-        results_pc = self.cypher(query_pc, {"defect_name": defect_name})
+        query_pc = PHYSICAL_CHANGE_DETAILS_QUERY
+        results_pc = self.cypher(query_pc, {"defect_name": defect_name}, name="physical_change_details")
         if results_pc and results_pc[0].get("name") is not None:
             return results_pc[0]
 
         return None
-    # Inside class KGInterface in kg_interface.py
+
     def get_recommendation_subgraph(self, material, defect, environment):
-        with self.driver.session() as session:
-            return session.read_transaction(
-                self._get_recommendation_subgraph_tx, material, defect, environment
-            )
+        query = RECOMMENDATION_SUBGRAPH_QUERY
+        records = self.cypher(query, {"material": material, "defect": defect, "environment": environment},
+                              access_mode=READ_ACCESS, name="recommendation_subgraph")
+        return self._build_recommendation_subgraph(records)
 
     @staticmethod
-    def _get_recommendation_subgraph_tx(tx, material, defect, environment):
-        query = """
-        MATCH (m:Material {name: $material})-[:AFFECTS]->(d:Defect {name: $defect})
-        OPTIONAL MATCH (d)-[:INSPECTED_BY]->(n:NDTMethod)-[:REQUIRES]->(s:Sensor)
-        OPTIONAL MATCH (n)-[:USED_IN]->(e:Environment {name: $environment})
-        RETURN DISTINCT m.name AS material, d.name AS defect, n.name AS method,
-                        s.name AS sensor, e.name AS environment,
-                        labels(m)[0] AS m_label, labels(d)[0] AS d_label,
-                        labels(n)[0] AS n_label, labels(s)[0] AS s_label,
-                        labels(e)[0] AS e_label
-        """
-        result = tx.run(query, material=material, defect=defect, environment=environment)
-        records = list(result)  # ✅ fetch all before consume
-
+    def _build_recommendation_subgraph(records: List[Dict]) -> Dict:
         nodes = []
         edges = []
         seen = set()
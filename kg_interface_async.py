@@ -0,0 +1,326 @@
+# kg_interface_async.py
+"""
+AsyncKGInterface: the KGInterface method surface on top of the async Neo4j driver.
+
+The agents are coroutines; calling the synchronous KGInterface from them blocks the event
+loop (and every other session/LLM stream on it) for the whole round-trip. This class uses
+the same Cypher, cache and retry policy as KGInterface but awaits the network instead, so
+independent lookups can run concurrently, e.g. with get_ndt_methods_structured_details().
+"""
+import asyncio
+import functools
+import logging
+import random
+import time
+import uuid
+from typing import AsyncIterator, Dict, List, Optional
+
+from neo4j import READ_ACCESS, WRITE_ACCESS, unit_of_work, exceptions as neo4j_exceptions
+
+from kg_interface import (
+    KGInterface,
+    cache_scope,
+    is_write_query,
+    QUERY_TIMEOUT_SECONDS,
+    QUERY_MAX_RETRIES,
+    QUERY_RETRY_BASE_DELAY,
+    STREAM_FETCH_SIZE,
+    RECOMMEND_NDT_METHODS_QUERY,
+    RECOMMEND_SENSORS_QUERY,
+    REASONING_SUBGRAPH_QUERY,
+    LOG_INSPECTION_PLAN_QUERY,
+    LOG_PLAN_FEEDBACK_QUERY,
+    RAG_CONTEXT_QUERY,
+    NDT_METHOD_DETAILS_QUERY,
+    MATERIAL_DETAILS_QUERY,
+    DETERIORATION_DETAILS_QUERY,
+    PHYSICAL_CHANGE_DETAILS_QUERY,
+    RECOMMENDATION_SUBGRAPH_QUERY,
+    MATERIALS_QUERY,
+    DETERIORATION_TYPES_QUERY,
+    ENVIRONMENTS_QUERY,
+    VOCABULARY_QUERY,
+)
+from utils.kg_cache import kg_query_cache
+from utils.kg_telemetry import kg_telemetry, query_name, summarize_plan
+from utils.kg_write_queue import get_write_queue, write_behind_enabled
+from utils.kg_embedded import embedded_backend_enabled, get_embedded_store
+from utils.neo4j_pool import get_async_driver, get_connection_settings
+
+logger = logging.getLogger(__name__)
+
+
+def async_cached_query(method):
+    """Async counterpart of kg_interface.cached_query; shares the same cache entries."""
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        cache = self._query_cache
+        if not cache.enabled:
+            return await method(self, *args, **kwargs)
+        key = (self.cache_scope, method.__name__, args, tuple(sorted(kwargs.items())))
+        hit, value = cache.get(key)
+        if hit:
+            return value
+        version = cache.version
+        value = await method(self, *args, **kwargs)
+        cache.set(key, value, version=version)
+        return value
+    return wrapper
+
+
+class AsyncKGInterface:
+    _query_cache = kg_query_cache
+
+    def __init__(self, uri: Optional[str] = None, user: Optional[str] = None, password: Optional[str] = None, backend=None):
+        # Same backend protocol as KGInterface; the embedded store answers in-process
+        if backend is None and embedded_backend_enabled():
+            backend = get_embedded_store()
+        self.backend = backend
+        # The driver is created lazily on the loop that first uses it (see utils/neo4j_pool.py)
+        env_uri, env_user, env_password = get_connection_settings()
+        self._credentials = (uri or env_uri, user or env_user, password or env_password)
+        # Same scope as a KGInterface on the same graph, so the two share cache entries
+        self.cache_scope = cache_scope(backend) if backend is not None else cache_scope(uri=self._credentials[0],
+                                                                                      user=self._credentials[1])
+
+    async def _driver(self):
+        try:
+            return await get_async_driver(*self._credentials)
+        except neo4j_exceptions.AuthError as e:
+            logger.error(f"Neo4j authentication failed: {e}")
+            raise
+        except neo4j_exceptions.ServiceUnavailable as e:
+            logger.error(f"Neo4j is unavailable at {self._credentials[0]}: {e}")
+            raise
+
+    async def cypher(self, query: str, params: Dict = None, log: bool = True, invalidate_cache: Optional[bool] = None,
+                     access_mode: Optional[str] = None, timeout: Optional[float] = None, name: Optional[str] = None) -> List[Dict]:
+        """Async KGInterface.cypher: managed transaction, bounded retries, per-transaction timeout, telemetry."""
+        name = query_name(query, name)
+        logger.debug(f"[Cypher {name}]\n{query}\nWith Params: {params}")
+        if access_mode is None:
+            access_mode = WRITE_ACCESS if is_write_query(query) else READ_ACCESS
+        if invalidate_cache is None:
+            invalidate_cache = access_mode == WRITE_ACCESS
+        if timeout is None:
+            timeout = QUERY_TIMEOUT_SECONDS
+
+        @unit_of_work(timeout=timeout)
+        async def work(tx):
+            result = await tx.run(query, params or {})
+            return [record.data() async for record in result]
+
+        started = time.perf_counter()
+        try:
+            if self.backend is not None:
+                records = self.backend.run(name, query, params or {})
+            else:
+                records = await self._run_managed(work, access_mode, query, params)
+        except Exception:
+            kg_telemetry.record(name, (time.perf_counter() - started) * 1000, error=True, params=params)
+            raise
+        self._record_query(name, query, params, (time.perf_counter() - started) * 1000, len(records), log, access_mode)
+        if invalidate_cache:
+            self._query_cache.invalidate()
+        return records
+
+    async def _run_managed(self, work, access_mode: str, query: str, params: Dict) -> List[Dict]:
+        driver = await self._driver()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                async with driver.session() as session:
+                    if access_mode == WRITE_ACCESS:
+                        records = await session.execute_write(work)
+                    else:
+                        records = await session.execute_read(work)
+                if attempt > 1:
+                    logger.info(f"Cypher query succeeded after {attempt} attempts.")
+                return records
+            except neo4j_exceptions.CypherSyntaxError as e:
+                logger.error(f"Cypher syntax error in query: {query} | PARAMS: {params} | ERROR: {e}")
+                raise
+            except neo4j_exceptions.ConstraintError as e:
+                logger.error(f"Constraint violation: {query} | PARAMS: {params} | ERROR: {e}")
+                raise
+            except (neo4j_exceptions.Neo4jError, neo4j_exceptions.DriverError) as e:
+                if e.is_retryable() and attempt <= QUERY_MAX_RETRIES:
+                    delay = QUERY_RETRY_BASE_DELAY * (2 ** (attempt - 1)) * random.uniform(0.8, 1.2)
+                    logger.warning(f"Neo4j retryable error (attempt {attempt}/{QUERY_MAX_RETRIES + 1}), retrying in {delay:.2f}s: {e}")
+                    await asyncio.sleep(delay)
+                    continue
+                logger.error(f"Neo4j error after {attempt} attempt(s): {query} | PARAMS: {params} | ERROR: {e}")
+                raise
+
+    def _record_query(self, name: str, query: str, params: Dict, latency_ms: float, rows: int, log: bool, access_mode: str) -> None:
+        kg_telemetry.record(name, latency_ms, rows, params=params)
+        if log and kg_telemetry.should_log(latency_ms):
+            slow = " (slow)" if kg_telemetry.is_slow(latency_ms) else ""
+            logger.info(f"\n[Cypher {name}] {latency_ms:.1f} ms, {rows} rows{slow}\n{query}\nWith Params: {params}")
+        if self.backend is None and kg_telemetry.should_capture_plan(name, latency_ms):
+            asyncio.get_running_loop().create_task(self._capture_plan(name, query, params, access_mode))
+
+    async def _capture_plan(self, name: str, query: str, params: Dict, access_mode: str) -> None:
+        mode = "PROFILE" if kg_telemetry.plan_mode == "PROFILE" and access_mode == READ_ACCESS else "EXPLAIN"
+        try:
+            driver = await self._driver()
+            async with driver.session(default_access_mode=access_mode) as session:
+                result = await session.run(f"{mode} {query}", params or {})
+                summary = await result.consume()
+            kg_telemetry.record_plan(name, summarize_plan(summary.profile if mode == "PROFILE" else summary.plan))
+        except Exception as e:
+            logger.debug(f"Could not capture {mode} plan for {name}: {e}")
+
+    async def cypher_stream(self, query: str, params: Dict = None, fetch_size: Optional[int] = None, log: bool = True,
+                            access_mode: Optional[str] = None, timeout: Optional[float] = None,
+                            name: Optional[str] = None) -> AsyncIterator[Dict]:
+        """Async KGInterface.cypher_stream: yields records as they arrive."""
+        name = query_name(query, name)
+        logger.debug(f"[Cypher Stream {name}]\n{query}\nWith Params: {params}")
+        if access_mode is None:
+            access_mode = WRITE_ACCESS if is_write_query(query) else READ_ACCESS
+        started = time.perf_counter()
+        rows = 0
+        try:
+            if self.backend is not None:
+                for record in self.backend.run(name, query, params or {}):
+                    rows += 1
+                    yield record
+            else:
+                driver = await self._driver()
+                async with driver.session(default_access_mode=access_mode, fetch_size=fetch_size or STREAM_FETCH_SIZE) as session:
+                    async with await session.begin_transaction(timeout=timeout or QUERY_TIMEOUT_SECONDS) as tx:
+                        result = await tx.run(query, params or {})
+                        async for record in result:
+                            rows += 1
+                            yield record.data()
+                        await tx.commit()
+        except (neo4j_exceptions.Neo4jError, neo4j_exceptions.DriverError):
+            kg_telemetry.record(name, (time.perf_counter() - started) * 1000, rows, error=True, params=params)
+            raise
+        self._record_query(name, query, params, (time.perf_counter() - started) * 1000, rows, log, access_mode)
+        if access_mode == WRITE_ACCESS:
+            self._query_cache.invalidate()
+
+    @async_cached_query
+    async def recommend_ndt_methods(self, material: str, defect: str, environment: str) -> List[str]:
+        records = await self.cypher(RECOMMEND_NDT_METHODS_QUERY, {
+            "material": material,
+            "defect": defect,
+            "environment": environment
+        }, name="recommend_ndt_methods")
+        return [r["method"] for r in records]
+
+    @async_cached_query
+    async def recommend_sensors(self, defect: str) -> List[str]:
+        return [r["sensor"] for r in await self.cypher(RECOMMEND_SENSORS_QUERY, {"defect": defect}, name="recommend_sensors")]
+
+    async def get_reasoning_subgraph(self, material: str, defect: str, environment: str) -> List[Dict]:
+        return await self.cypher(REASONING_SUBGRAPH_QUERY, {"material": material, "defect": defect, "environment": environment},
+                                name="reasoning_subgraph")
+
+    async def log_inspection_plan(self, plan_text: str, material: str, defect: str, environment: str) -> str:
+        plan_id = str(uuid.uuid4())
+        if write_behind_enabled():
+            return get_write_queue().enqueue_plan(plan_id, plan_text, material, defect, environment)
+        result = await self.cypher(LOG_INSPECTION_PLAN_QUERY, {
+            "plan_id": plan_id,
+            "plan_text": plan_text,
+            "material": material,
+            "defect": defect,
+            "environment": environment
+        }, invalidate_cache=False, access_mode=WRITE_ACCESS, name="log_inspection_plan")
+        if result and result[0].get("generatedPlanId"):
+            logger.info(f"InspectionPlan logged with ID: {result[0]['generatedPlanId']}")
+            return result[0]["generatedPlanId"]
+        logger.error("Failed to log inspection plan or retrieve its ID.")
+        return plan_id
+
+    @async_cached_query
+    async def get_materials(self) -> List[str]:
+        return [r["name"] for r in await self.cypher(MATERIALS_QUERY, name="materials")]
+
+    @async_cached_query
+    async def get_deterioration_types(self) -> List[str]:
+        return [r["name"] for r in await self.cypher(DETERIORATION_TYPES_QUERY, name="deterioration_types")]
+
+    @async_cached_query
+    async def get_environments(self) -> List[str]:
+        return [r["name"] for r in await self.cypher(ENVIRONMENTS_QUERY, name="environments")]
+
+    @async_cached_query
+    async def get_vocabulary(self) -> List[Dict]:
+        return await self.cypher(VOCABULARY_QUERY, name="vocabulary")
+
+    async def log_plan_feedback(self, plan_id: str, is_helpful: bool, feedback_text: str = None) -> None:
+        if not plan_id:
+            logger.error("Cannot log feedback without a valid plan_id.")
+            return
+        if write_behind_enabled():
+            get_write_queue().enqueue_feedback(plan_id, str(uuid.uuid4()), is_helpful, feedback_text)
+            return
+        try:
+            result = await self.cypher(LOG_PLAN_FEEDBACK_QUERY, {
+                "plan_id_param": plan_id,
+                "feedback_uuid_param": str(uuid.uuid4()),
+                "is_helpful": is_helpful,
+                "feedback_text": feedback_text
+            }, invalidate_cache=False, access_mode=WRITE_ACCESS, name="log_plan_feedback")
+            if result and result[0].get("feedback_timestamp"):
+                logger.info(f"Feedback logged for plan ID: {plan_id}. Helpful: {is_helpful}.")
+            else:
+                logger.warning(f"Feedback may not have been logged correctly for plan ID: {plan_id}. No confirmation timestamp returned.")
+        except Exception as e:
+            logger.error(f"Failed to log feedback for plan ID {plan_id}: {e}")
+
+    async def get_entities_details_for_rag(self, material_name: str = None, defect_name: str = None, method_names: list[str] = None) -> str:
+        """Same context text as KGInterface.get_entities_details_for_rag, in one round-trip."""
+        results = await self.cypher(RAG_CONTEXT_QUERY, {
+            "material_name": material_name,
+            "defect_name": defect_name,
+            "method_names": list(method_names or [])
+        }, name="rag_context")
+        return KGInterface._format_rag_context(results[0] if results else {}, material_name, defect_name, method_names)
+
+    async def get_initial_recommendations_structured(self, material: str, defect: str, environment: str) -> Dict:
+        recommended_methods, recommended_sensors = await asyncio.gather(
+            self.recommend_ndt_methods(material, defect, environment),
+            self.recommend_sensors(defect),
+        )
+        return {
+            "recommended_methods": recommended_methods,
+            "recommended_sensors": recommended_sensors
+        }
+
+    @async_cached_query
+    async def get_ndt_method_structured_details(self, method_name: str) -> Optional[Dict]:
+        results = await self.cypher(NDT_METHOD_DETAILS_QUERY, {"method_name": method_name}, name="ndt_method_details")
+        return KGInterface._clean_method_details(results)
+
+    async def get_ndt_methods_structured_details(self, method_names: List[str]) -> Dict[str, Optional[Dict]]:
+        """Fetches the details of several NDT methods concurrently, keyed by method name."""
+        details = await asyncio.gather(*(self.get_ndt_method_structured_details(name) for name in method_names))
+        return dict(zip(method_names, details))
+
+    @async_cached_query
+    async def get_material_structured_details(self, material_name: str) -> Optional[Dict]:
+        results = await self.cypher(MATERIAL_DETAILS_QUERY, {"material_name": material_name}, name="material_details")
+        return results[0] if results and results[0].get("name") is not None else None
+
+    @async_cached_query
+    async def get_defect_structured_details(self, defect_name: str) -> Optional[Dict]:
+        results_det, results_pc = await asyncio.gather(
+            self.cypher(DETERIORATION_DETAILS_QUERY, {"defect_name": defect_name}, name="deterioration_details"),
+            self.cypher(PHYSICAL_CHANGE_DETAILS_QUERY, {"defect_name": defect_name}, name="physical_change_details"),
+        )
+        if results_det and results_det[0].get("name") is not None:
+            return results_det[0]
+        if results_pc and results_pc[0].get("name") is not None:
+            return results_pc[0]
+        return None
+
+    async def get_recommendation_subgraph(self, material, defect, environment):
+        records = await self.cypher(RECOMMENDATION_SUBGRAPH_QUERY, {"material": material, "defect": defect, "environment": environment},
+                                    access_mode=READ_ACCESS, name="recommendation_subgraph")
+        return KGInterface._build_recommendation_subgraph(records)
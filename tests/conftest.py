@@ -0,0 +1,60 @@
+# tests/conftest.py
+"""Shared fixtures. Nothing here needs Ollama or Neo4j: the KG is an in-memory EmbeddedKGStore."""
+import os
+import sys
+from xml.sax.saxutils import escape, quoteattr
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.kg_cache import kg_query_cache
+from utils.kg_embedded import EmbeddedKGStore
+
+
+def build_store(material: str = "Concrete") -> EmbeddedKGStore:
+    """Material -> Cracking -> Ultrasonic Testing (Humid), with one sensor and one risk."""
+    store = EmbeddedKGStore()
+    m = store.add_node(["Material"], {"name": material, "description": f"{material} description"})
+    d = store.add_node(["Deterioration"], {"name": "Cracking", "detailedDescription": "Surface cracks"})
+    n = store.add_node(["NDTMethod"], {"name": "Ultrasonic Testing", "description": "UT", "costEstimate": "Medium"})
+    e = store.add_node(["Environment"], {"name": "Humid"})
+    s = store.add_node(["Sensor"], {"name": "Piezoelectric Transducer"})
+    r = store.add_node(["RiskType"], {"name": "Coupling loss", "riskDescription": "Poor contact",
+                                      "mitigationSuggestion": "Use couplant"})
+    store.add_edge(m, "HAS_DETERIORATION_MECHANISM", d)
+    store.add_edge(d, "DETECTED_BY", n)
+    store.add_edge(n, "REQUIRES_ENVIRONMENT", e)
+    store.add_edge(s, "RECOMMENDED_FOR", n)
+    store.add_edge(n, "hasPotentialRisk", r)
+    return store
+
+
+def write_graphml(store: EmbeddedKGStore, path, edges_first: bool = False):
+    """Dumps `store` as GraphML the way apoc.export.graphml.all writes it (labels=":Label")."""
+    keys = sorted({k for props in store._props for k in props})
+    nodes = [f'<node id="n{i}" labels={quoteattr(":" + ":".join(labels))}>'
+             + "".join(f'<data key="{k}">{escape(str(v))}</data>' for k, v in props.items() if v is not None)
+             + "</node>"
+             for i, (labels, props) in enumerate(zip(store._labels, store._props))]
+    edges = [f'<edge id="e{i}" source="n{a}" target="n{b}" label="{rel_type}"/>'
+             for i, (a, rel_type, b) in enumerate(store._edge_order)]
+    body = edges + nodes if edges_first else nodes + edges
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+                + "".join(f'<key id="{k}" for="node" attr.name="{k}" attr.type="string"/>\n' for k in keys)
+                + '<graph id="G" edgedefault="directed">\n' + "\n".join(body) + "\n</graph>\n</graphml>\n")
+    return path
+
+
+@pytest.fixture
+def store() -> EmbeddedKGStore:
+    return build_store()
+
+
+@pytest.fixture(autouse=True)
+def clear_query_cache():
+    kg_query_cache.invalidate()
+    yield
+    kg_query_cache.invalidate()
@@ -0,0 +1,120 @@
+# tests/test_cq_pipeline.py
+import asyncio
+import json
+
+import pytest
+
+from utils import cq_pipeline
+from utils.cq_pipeline import CQPipeline, cq_key
+
+CQS = ["Which NDT methods detect cracking?", "Which sensors does ultrasonic testing need?",
+       "Which environments limit GPR?"]
+
+
+class FakeAgent:
+    """Answers every CQ except those in `failing`, which come back as in-band LLM errors."""
+
+    def __init__(self, failing=(), calls=None):
+        self.failing = set(failing)
+        self.calls = calls if calls is not None else []
+
+    async def run(self, cq):
+        self.calls.append(cq)
+        await asyncio.sleep(0)
+        if cq in self.failing:
+            return "# ERROR: LLM call failed"
+        return f":Axiom{len(self.calls)} a owl:Class ."
+
+
+@pytest.fixture
+def cq_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(cq_pipeline, "warm_up", lambda targets: {})
+    monkeypatch.setattr(cq_pipeline, "warm_up_targets", lambda tasks: [])
+    path = tmp_path / "cqs.txt"
+    path.write_text("\n".join(CQS) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def run_pipeline(cq_file, tmp_path, monkeypatch, agent, **kwargs):
+    monkeypatch.setattr(cq_pipeline, "new_session_agent", lambda cls: agent)
+    pipeline = CQPipeline(cq_file, output_dir=str(tmp_path / "out"), retries=1, base_delay=0, **kwargs)
+    return pipeline, asyncio.run(pipeline.process_all())
+
+
+def checkpoint(pipeline):
+    return [json.loads(line) for line in pipeline.checkpoint_path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_rerun_only_processes_cqs_that_did_not_succeed(cq_file, tmp_path, monkeypatch):
+    first, stats = run_pipeline(cq_file, tmp_path, monkeypatch, FakeAgent(failing=[CQS[1]]))
+    assert (stats["completed"], stats["failed"], stats["skipped"]) == (2, 1, 0)
+    assert [entry["status"] for entry in sorted(checkpoint(first), key=lambda e: e["index"])] == ["ok", "failed", "ok"]
+
+    calls = []
+    second, stats = run_pipeline(cq_file, tmp_path, monkeypatch, FakeAgent(calls=calls))
+    assert calls == [CQS[1]]
+    assert (stats["completed"], stats["failed"], stats["skipped"]) == (1, 0, 2)
+    assert second.output_path == first.output_path
+    assert second._completed() == {cq_key(cq) for cq in CQS}
+    output = second.output_path.read_text(encoding="utf-8")
+    assert "# ERROR" not in output
+    assert [line for line in output.splitlines() if line.startswith("# CQ")] == \
+        [f"# CQ {i}: {cq}" for i, cq in enumerate(CQS, start=1)]
+
+    calls.clear()
+    _, stats = run_pipeline(cq_file, tmp_path, monkeypatch, FakeAgent(calls=calls))
+    assert calls == []
+    assert stats["skipped"] == 3
+
+
+def test_failed_cq_is_left_out_of_the_output(cq_file, tmp_path, monkeypatch):
+    pipeline, _ = run_pipeline(cq_file, tmp_path, monkeypatch, FakeAgent(failing=[CQS[1]]))
+    output = pipeline.output_path.read_text(encoding="utf-8")
+    assert "# ERROR" not in output
+    assert CQS[1] not in output
+    assert not pipeline.output_path.with_suffix(".ttl.tmp").exists()
+
+
+def test_output_follows_cq_order_whatever_order_cqs_finish_in(cq_file, tmp_path, monkeypatch):
+    class ReversedAgent(FakeAgent):
+        async def run(self, cq):
+            await asyncio.sleep(0.01 * (len(CQS) - CQS.index(cq)))
+            return f":{cq_key(cq)} a owl:Class ."
+
+    pipeline, _ = run_pipeline(cq_file, tmp_path, monkeypatch, ReversedAgent(), concurrency=3)
+    assert [entry["cq"] for entry in checkpoint(pipeline)] == CQS[::-1]
+    assert pipeline.output_path.read_text(encoding="utf-8") == "".join(
+        f"# CQ {i}: {cq}\n:{cq_key(cq)} a owl:Class .\n\n" for i, cq in enumerate(CQS, start=1))
+
+
+def test_line_cut_short_by_a_crash_is_ignored(cq_file, tmp_path, monkeypatch):
+    first, _ = run_pipeline(cq_file, tmp_path, monkeypatch, FakeAgent())
+    with open(first.checkpoint_path, "a", encoding="utf-8") as f:
+        f.write('{"key": "trunc')
+    calls = []
+    _, stats = run_pipeline(cq_file, tmp_path, monkeypatch, FakeAgent(calls=calls))
+    assert calls == []
+    assert stats["skipped"] == 3
+
+
+def test_failed_attempt_is_retried(cq_file, tmp_path, monkeypatch):
+    class FlakyAgent(FakeAgent):
+        async def run(self, cq):
+            if cq == CQS[0] and CQS[0] not in self.calls:
+                self.calls.append(cq)
+                raise ConnectionError("Ollama restarting")
+            return await super().run(cq)
+
+    pipeline, stats = run_pipeline(cq_file, tmp_path, monkeypatch, FlakyAgent())
+    assert (stats["completed"], stats["failed"]) == (3, 0)
+    attempts = {entry["cq"]: entry["attempts"] for entry in checkpoint(pipeline)}
+    assert attempts[CQS[0]] == 2
+
+
+def test_without_resume_every_cq_runs_again(cq_file, tmp_path, monkeypatch):
+    run_pipeline(cq_file, tmp_path, monkeypatch, FakeAgent())
+    calls = []
+    pipeline, stats = run_pipeline(cq_file, tmp_path, monkeypatch, FakeAgent(calls=calls), resume=False)
+    assert sorted(calls) == sorted(CQS)
+    assert stats["skipped"] == 0
+    assert pipeline.checkpoint_path.name != "ontology_axioms_cqs.checkpoint.jsonl"
@@ -0,0 +1,63 @@
+# tests/test_event_loop.py
+import asyncio
+
+import pytest
+
+from utils import event_loop
+from utils.event_loop import SessionLoop, on_loop_close
+from utils.neo4j_pool import close_async_drivers
+
+
+@pytest.fixture
+def closed_on():
+    """Registers a cleanup that records the loop it ran on."""
+    loops = []
+
+    async def cleanup():
+        loops.append(asyncio.get_running_loop())
+
+    on_loop_close(cleanup)
+    yield loops
+    event_loop._cleanups.remove(cleanup)
+
+
+def test_session_loop_is_reused_and_cleaned_up_on_close(closed_on):
+    session = SessionLoop()
+
+    async def current():
+        return asyncio.get_running_loop()
+
+    first, second = session.run(current()), session.run(current())
+    assert first is second is session.loop
+    session.close()
+    assert closed_on == [session.loop]
+    assert session.loop.is_closed()
+    session.close()  # idempotent
+    assert len(closed_on) == 1
+
+
+def test_run_cleans_up_even_when_the_coroutine_fails(closed_on):
+    async def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        event_loop.run(fail())
+    assert len(closed_on) == 1
+
+
+def test_async_neo4j_drivers_are_closed_with_their_loop():
+    assert close_async_drivers in event_loop._cleanups
+
+
+def test_ollama_sessions_are_closed_with_their_loop():
+    from utils import ollama_client
+
+    session = SessionLoop()
+
+    async def open_session():
+        return ollama_client.get_async_session()
+
+    client_session = session.run(open_session())
+    assert session.run(open_session()) is client_session  # reused across runs on the same loop
+    session.close()
+    assert client_session.closed
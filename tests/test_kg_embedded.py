@@ -0,0 +1,88 @@
+# tests/test_kg_embedded.py
+import asyncio
+
+import pytest
+
+from kg_interface import KGInterface
+from kg_interface_async import AsyncKGInterface
+from tests.conftest import build_store, write_graphml
+from utils.kg_cache import kg_query_cache
+from utils.kg_embedded import EmbeddedKGStore, UnsupportedQueryError
+
+SCENARIO = ("Concrete", "Cracking", "Humid")
+
+# (method, args) answered the same way by every backend and interface
+QUERIES = [
+    ("recommend_ndt_methods", SCENARIO),
+    ("recommend_ndt_methods", ("Concrete", "Cracking", "Arid")),
+    ("recommend_sensors", ("Cracking",)),
+    ("get_reasoning_subgraph", SCENARIO),
+    ("get_materials", ()),
+    ("get_deterioration_types", ()),
+    ("get_environments", ()),
+    ("get_vocabulary", ()),
+    ("get_entities_details_for_rag", ("Concrete", "Cracking", ["Ultrasonic Testing"])),
+    ("get_initial_recommendations_structured", SCENARIO),
+    ("get_ndt_method_structured_details", ("Ultrasonic Testing",)),
+    ("get_material_structured_details", ("Concrete",)),
+    ("get_defect_structured_details", ("Cracking",)),
+    ("get_recommendation_subgraph", SCENARIO),
+]
+
+
+@pytest.fixture
+def graph() -> EmbeddedKGStore:
+    """The shared test graph plus a second method (Dry only) and the AFFECTS/INSPECTED_BY view of it."""
+    store = build_store()
+    material = store._find("Material", "Concrete")[0]
+    cracking = store._find("Deterioration", "Cracking")[0]
+    ut = store._find("NDTMethod", "Ultrasonic Testing")[0]
+    humid = store._find("Environment", "Humid")[0]
+    sensor = store._find("Sensor", "Piezoelectric Transducer")[0]
+    gpr = store.add_node(["NDTMethod"], {"name": "Ground Penetrating Radar", "description": "GPR"})
+    store.add_edge(cracking, "DETECTED_BY", gpr)
+    store.add_edge(gpr, "REQUIRES_ENVIRONMENT", store.add_node(["Environment"], {"name": "Dry"}))
+    defect = store.add_node(["Defect"], {"name": "Cracking"})
+    store.add_edge(material, "AFFECTS", defect)
+    store.add_edge(defect, "INSPECTED_BY", ut)
+    store.add_edge(ut, "REQUIRES", sensor)
+    store.add_edge(ut, "USED_IN", humid)
+    return store
+
+
+def answers(kg):
+    results = []
+    for method, args in QUERIES:
+        kg_query_cache.invalidate()  # each answer comes from the backend, not from another interface's entry
+        result = getattr(kg, method)(*args)
+        results.append(asyncio.run(result) if asyncio.iscoroutine(result) else result)
+    return results
+
+
+def test_queries_return_the_expected_rows(graph):
+    kg = KGInterface(backend=graph)
+    assert kg.recommend_ndt_methods(*SCENARIO) == ["Ultrasonic Testing"]
+    assert kg.recommend_ndt_methods("Concrete", "Cracking", "Dry") == ["Ground Penetrating Radar"]
+    assert kg.get_environments() == ["Dry", "Humid"]
+    subgraph = kg.get_recommendation_subgraph(*SCENARIO)
+    assert {edge["label"] for edge in subgraph["edges"]} == {"AFFECTS", "INSPECTED_BY", "REQUIRES", "USED_IN"}
+
+
+def test_compiled_engine_matches_the_query_handlers(graph):
+    assert answers(KGInterface(backend=graph, use_compiled_engine=True)) == answers(KGInterface(backend=graph))
+
+
+def test_async_interface_matches_sync(graph):
+    assert answers(AsyncKGInterface(backend=graph)) == answers(KGInterface(backend=graph))
+
+
+@pytest.mark.parametrize("edges_first", [False, True])
+def test_graphml_snapshot_loads_the_same_graph(graph, tmp_path, edges_first):
+    path = write_graphml(graph, tmp_path / "kg.graphml", edges_first=edges_first)
+    loaded = EmbeddedKGStore.from_snapshot(str(path))
+    assert answers(KGInterface(backend=loaded)) == answers(KGInterface(backend=graph))
+
+
+def test_free_form_cypher_is_rejected(graph):
+    with pytest.raises(UnsupportedQueryError):
+        KGInterface(backend=graph).cypher("MATCH (n) RETURN count(n) AS c")
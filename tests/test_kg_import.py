@@ -0,0 +1,76 @@
+# tests/test_kg_import.py
+import re
+
+from neo4j import WRITE_ACCESS
+
+from tests.conftest import build_store, write_graphml
+from utils.kg_import import KGImporter, import_snapshot
+
+_NODE_MERGE_RE = re.compile(r"MERGE \(n:`(\w+)` \{`(\w+)`: row\.key\}\)")
+_EDGE_MATCH_RE = re.compile(r"MATCH \((?:a|b):`(\w+)`")
+_EDGE_MERGE_RE = re.compile(r"MERGE \(a\)-\[r:`(\w+)`\]->\(b\)")
+
+
+class MergeGraph:
+    """Applies the importer's UNWIND ... MERGE batches to dicts, with Neo4j's MERGE semantics."""
+
+    def __init__(self):
+        self.nodes = {}  # (label, key) -> props
+        self.edges = {}  # (source label, source key, type, target label, target key) -> props
+        self.batches = []  # (query name, rows)
+
+    def cypher(self, query, params=None, log=True, invalidate_cache=None, access_mode=None, name=None):
+        assert access_mode == WRITE_ACCESS
+        rows = params["rows"]
+        self.batches.append((name, len(rows)))
+        node = _NODE_MERGE_RE.search(query)
+        if node:
+            for row in rows:
+                self.nodes.setdefault((node.group(1), row["key"]), {}).update(row["props"])
+            return []
+        source_label, target_label = _EDGE_MATCH_RE.findall(query)
+        rel_type = _EDGE_MERGE_RE.search(query).group(1)
+        for row in rows:
+            # MATCH on both endpoints: a relationship to a node that isn't written yet is silently lost
+            if (source_label, row["source"]) in self.nodes and (target_label, row["target"]) in self.nodes:
+                key = (source_label, row["source"], rel_type, target_label, row["target"])
+                self.edges.setdefault(key, {}).update(row["props"])
+        return []
+
+
+def snapshot(tmp_path, edges_first=False):
+    store = build_store()
+    for i in range(5):
+        store.add_node(["Material"], {"name": f"Material {i}"})
+    store.add_node(["Material"], {"description": "no name, nothing to merge on"})
+    return str(write_graphml(store, tmp_path / "kg.graphml", edges_first=edges_first))
+
+
+def test_nodes_and_relationships_are_written_in_batches(tmp_path):
+    graph = MergeGraph()
+    stats = KGImporter(graph, batch_size=2).run(snapshot(tmp_path))
+    material_batches = [rows for name, rows in graph.batches if name == "import.nodes.Material"]
+    assert material_batches == [2, 2, 2]
+    assert max(rows for _, rows in graph.batches) <= 2
+    assert (stats["nodes"], stats["relationships"], stats["skipped_nodes"]) == (11, 5, 1)
+    assert len(graph.nodes) == 11
+    assert len(graph.edges) == 5
+
+
+def test_relationships_listed_before_their_nodes_are_kept(tmp_path):
+    graph = MergeGraph()
+    stats = KGImporter(graph, batch_size=2).run(snapshot(tmp_path, edges_first=True))
+    assert stats["skipped_relationships"] == 0
+    assert len(graph.edges) == 5
+    assert ("Deterioration", "Cracking", "DETECTED_BY", "NDTMethod", "Ultrasonic Testing") in graph.edges
+
+
+def test_reimport_is_idempotent(tmp_path):
+    path = snapshot(tmp_path)
+    graph = MergeGraph()
+    import_snapshot(graph, path, batch_size=3, with_schema=False)
+    nodes, edges = dict(graph.nodes), dict(graph.edges)
+    import_snapshot(graph, path, batch_size=3, with_schema=False)
+    assert graph.nodes == nodes
+    assert graph.edges == edges
+    assert graph.nodes[("NDTMethod", "Ultrasonic Testing")] == {"description": "UT", "costEstimate": "Medium"}
@@ -0,0 +1,100 @@
+# tests/test_kg_interface.py
+from neo4j import READ_ACCESS, WRITE_ACCESS
+
+from kg_interface import KGInterface, take_rows
+from tests.conftest import build_store
+
+
+def test_query_cache_is_scoped_per_backend():
+    concrete = KGInterface(backend=build_store("Concrete"))
+    steel = KGInterface(backend=build_store("Steel"))
+    assert concrete.get_materials() == ["Concrete"]
+    # Same method and arguments on another graph must not be answered from the first one's entry
+    assert steel.get_materials() == ["Steel"]
+    assert concrete.get_materials() == ["Concrete"]
+
+
+def test_same_backend_shares_cache_entries(store):
+    first, second = KGInterface(backend=store), KGInterface(backend=store)
+    hits = KGInterface.cache_stats()["hits"]
+    first.get_materials()
+    second.get_materials()
+    assert KGInterface.cache_stats()["hits"] == hits + 1
+
+
+class FakeTransaction:
+    def __init__(self, driver, records):
+        self.driver = driver
+        self.records = records
+
+    def run(self, query, params):
+        return iter(self.records)
+
+    def commit(self):
+        self.driver.committed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeDriver:
+    """Neo4j driver whose one transaction returns `rows` records and records whether it committed."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.committed = False
+
+    def session(self, **kwargs):
+        return self
+
+    def begin_transaction(self, timeout=None):
+        return FakeTransaction(self, [FakeRecord(i) for i in range(self.rows)])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeRecord:
+    def __init__(self, i):
+        self.i = i
+
+    def data(self):
+        return {"i": self.i}
+
+
+def streaming_kg(rows):
+    kg = KGInterface(backend=build_store())
+    kg.backend, kg.driver = None, FakeDriver(rows)
+    return kg
+
+
+def test_write_past_the_row_cap_is_drained_and_committed():
+    kg = streaming_kg(rows=10)
+    stream = kg.cypher_stream("UNWIND range(0, 9) AS i CREATE (:Tag {i: i}) RETURN i", access_mode=WRITE_ACCESS)
+    rows, seen = take_rows(stream, max_rows=3, drain=True)
+    assert rows == [{"i": 0}, {"i": 1}, {"i": 2}]
+    assert seen == 10
+    assert kg.driver.committed
+
+
+def test_read_past_the_row_cap_stops_early():
+    kg = streaming_kg(rows=10)
+    rows, seen = take_rows(kg.cypher_stream("MATCH (n) RETURN n", access_mode=READ_ACCESS), max_rows=3)
+    assert len(rows) == 3
+    assert seen == 4  # one past the cap shows the result was truncated
+    assert not kg.driver.committed
+
+
+def test_compiled_engine_is_scoped_per_backend():
+    concrete = KGInterface(backend=build_store("Concrete"), use_compiled_engine=True)
+    steel = KGInterface(backend=build_store("Steel"), use_compiled_engine=True)
+    assert concrete._compiled_graph() is not steel._compiled_graph()
+    assert concrete.recommend_ndt_methods("Concrete", "Cracking", "Humid") == ["Ultrasonic Testing"]
+    assert steel.recommend_ndt_methods("Concrete", "Cracking", "Humid") == []
+    assert steel.recommend_ndt_methods("Steel", "Cracking", "Humid") == ["Ultrasonic Testing"]
@@ -0,0 +1,36 @@
+# tests/test_kg_schema.py
+from utils.kg_schema import INDEXES, UNIQUE_CONSTRAINTS, ensure_schema
+
+
+class RecordingKG:
+    """Stands in for KGInterface: reports an existing schema and records the statements sent."""
+
+    def __init__(self, constraints=(), indexes=()):
+        self.constraints = list(constraints)
+        self.indexes = list(indexes)
+        self.statements = []
+
+    def cypher(self, query, params=None, log=True, invalidate_cache=None, name=None, **kwargs):
+        if name == "schema.show_constraints":
+            return self.constraints
+        if name == "schema.show_indexes":
+            return self.indexes
+        self.statements.append(query)
+        return []
+
+
+def test_creates_range_and_text_indexes_and_constraints():
+    kg = RecordingKG()
+    report = ensure_schema(kg)
+    assert report["created"] == report["missing"]
+    assert len(report["created"]) == len(UNIQUE_CONSTRAINTS) + len(INDEXES)
+    assert "CREATE TEXT INDEX material_name_text IF NOT EXISTS FOR (n:Material) ON (n.name)" in kg.statements
+    assert any(s.startswith("CREATE RANGE INDEX inspection_plan_timestamp") for s in kg.statements)
+
+
+def test_existing_objects_are_skipped_and_dry_run_creates_nothing():
+    kg = RecordingKG(indexes=[{"name": "anything", "type": "TEXT", "labelsOrTypes": ["Sensor"], "properties": ["name"]}])
+    report = ensure_schema(kg, dry_run=True)
+    assert "sensor_name_text" not in report["missing"]
+    assert "material_name_text" in report["missing"]
+    assert report["created"] == [] and kg.statements == []
@@ -0,0 +1,107 @@
+# tests/test_kg_write_queue.py
+import pytest
+from neo4j.exceptions import AuthError, ConstraintError, Forbidden, ServiceUnavailable
+
+from kg_interface import KGInterface
+from utils.kg_write_queue import PLAN_KIND, KGWriteQueue
+
+
+class DownKG:
+    """Every write fails alike with `error` (by default Neo4j unreachable)."""
+
+    def __init__(self, error=None):
+        self.error = error or ServiceUnavailable("connection refused")
+        self.calls = 0
+
+    def cypher(self, *args, **kwargs):
+        self.calls += 1
+        raise self.error
+
+
+@pytest.fixture
+def spool(tmp_path):
+    return str(tmp_path / "spool.sqlite")
+
+
+def make_queue(spool, kg, **kwargs):
+    # A long interval keeps the background flusher out of the way; the tests flush explicitly
+    return KGWriteQueue(spool, flush_interval=3600, kg=kg, **kwargs)
+
+
+def test_writes_spooled_while_neo4j_is_down_are_replayed(spool, store):
+    down = make_queue(spool, DownKG())
+    down.enqueue_plan("p1", "Plan text", "Concrete", "Cracking", "Humid")
+    down.enqueue_feedback("p1", "f1", True, "Useful")
+    with pytest.raises(ServiceUnavailable):
+        down.flush()
+    down.close()
+
+    queue = make_queue(spool, KGInterface(backend=store))
+    assert queue.pending() == 2
+    queue.flush()
+    assert queue.stats()["pending"] == 0
+    assert queue.stats()["dead_letter"] == 0
+    assert store._find_plan("p1") is not None
+    assert store._find_feedback("f1") is not None
+    queue.close()
+
+
+@pytest.mark.parametrize("error", [
+    ServiceUnavailable("connection refused"),
+    AuthError("The client is unauthorized due to authentication failure."),
+    Forbidden("no write access to the database"),
+], ids=lambda error: type(error).__name__)
+def test_failures_of_the_whole_spool_do_not_count_attempts(spool, error):
+    queue = make_queue(spool, DownKG(error), max_attempts=1)
+    queue.enqueue_plan("p1", "Plan text", "Concrete", "Cracking", "Humid")
+    queue.enqueue_plan("p2", "Plan text", "Steel", "Corrosion", "Marine")
+    for _ in range(3):
+        with pytest.raises(type(error)):
+            queue.flush()
+    assert queue.pending() == 2
+    assert queue.dead_letters() == 0
+    queue.close()
+
+
+def test_driver_creation_failure_keeps_the_spool(spool, monkeypatch):
+    queue = make_queue(spool, None, max_attempts=1)
+    queue.enqueue_plan("p1", "Plan text", "Concrete", "Cracking", "Humid")
+
+    def no_driver():
+        raise ValueError("Unsupported URI scheme")
+
+    monkeypatch.setattr(queue, "_get_kg", no_driver)
+    with pytest.raises(ValueError):
+        queue.flush()
+    assert queue.pending() == 1
+    assert queue.dead_letters() == 0
+    queue.close()
+
+
+def test_constraint_violation_counts_against_the_row(spool):
+    queue = make_queue(spool, DownKG(ConstraintError("already exists")), max_attempts=1)
+    queue.enqueue_plan("p1", "Plan text", "Concrete", "Cracking", "Humid")
+    assert queue.flush() == 0
+    assert queue.dead_letters() == 1
+    queue.close()
+
+
+def test_poison_row_is_isolated_and_dead_lettered(spool, store):
+    queue = make_queue(spool, KGInterface(backend=store), max_attempts=2)
+    queue.enqueue_plan("p1", "Plan text", "Concrete", "Cracking", "Humid")
+    queue.enqueue(PLAN_KIND, {"plan_id": "bad"})  # missing fields: rejected by the batch query
+    queue.enqueue_plan("p2", "Plan text", "Steel", "Corrosion", "Marine")
+    queue.enqueue_feedback("p2", "f2", False)
+
+    # The good plans are written around the bad one; feedback waits while a plan is being retried
+    assert queue.flush() == 2
+    assert store._find_plan("p1") is not None and store._find_plan("p2") is not None
+    assert store._find_feedback("f2") is None
+    assert queue.pending() == 2
+
+    # Second failed attempt: the row is dead-lettered and the queue drains
+    assert queue.flush() == 1
+    assert store._find_feedback("f2") is not None
+    assert queue.stats()["pending"] == 0
+    assert queue.stats()["dead_letter"] == 1
+    queue.close()
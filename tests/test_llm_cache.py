@@ -0,0 +1,98 @@
+# tests/test_llm_cache.py
+import asyncio
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from agents import base_agent
+from agents.base_agent import BaseAgent
+from utils.llm_cache import LLMResponseCache, make_cache_key
+from utils.memory_store import save_memory
+
+SCENARIO = "Concrete bridge deck, Cracking, Humid"
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    # Memory, logs and the cache all go to a scratch directory
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "logs").mkdir()
+    cache = LLMResponseCache(str(tmp_path / "llm_cache.sqlite"))
+    monkeypatch.setattr(base_agent, "get_llm_cache", lambda: cache)
+    return cache
+
+
+class RecordingLLM:
+    """Replies in order and records the messages of each request."""
+
+    def __init__(self, replies):
+        self.model = FakeListChatModel(responses=replies)
+        self.sent = []
+
+    async def agenerate(self, messages, **kwargs):
+        self.sent.append(messages[0])
+        return await self.model.agenerate(messages, **kwargs)
+
+
+class PlannerLike(BaseAgent):
+    def __init__(self, replies, cache_responses=True, **kwargs):
+        super().__init__("You are a planner.", model="test-model", cache_responses=cache_responses, **kwargs)
+        self.llm = RecordingLLM(replies)
+
+
+def test_key_covers_model_temperature_options_prompt_and_every_message():
+    messages = [SystemMessage(content="sys"), HumanMessage(content="q")]
+    key = make_cache_key("m", 0.1, "sys", messages, options={"num_predict": 256})
+    assert key == make_cache_key("m", 0.1, "sys", list(messages), options={"num_predict": 256})
+    assert key != make_cache_key("other", 0.1, "sys", messages, options={"num_predict": 256})
+    assert key != make_cache_key("m", 0.7, "sys", messages, options={"num_predict": 256})
+    assert key != make_cache_key("m", 0.1, "other", messages, options={"num_predict": 256})
+    assert key != make_cache_key("m", 0.1, "sys", messages[1:], options={"num_predict": 256})
+    assert key != make_cache_key("m", 0.1, "sys", messages, options={"num_predict": 64})
+
+
+def test_same_scenario_from_a_new_session_is_a_cache_hit(cache):
+    first = PlannerLike(["Plan A"])
+    assert asyncio.run(first(SCENARIO)) == "Plan A"
+    # The first call saved its intent to shared memory; a caching agent doesn't send it, so the prompt is unchanged
+    second = PlannerLike(["Plan B"])
+    assert asyncio.run(second(SCENARIO)) == "Plan A"
+    assert second.llm.sent == []
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_earlier_turns_are_part_of_the_key(cache):
+    agent = PlannerLike(["Plan A", "Plan B"])
+    asyncio.run(agent(SCENARIO))
+    # Asked again in the same conversation, the prompt now carries the first turn: a different prompt
+    assert asyncio.run(agent(SCENARIO)) == "Plan B"
+    assert cache.hits == 0
+
+
+def test_generation_options_are_part_of_the_key(cache):
+    asyncio.run(PlannerLike(["Short plan"], num_predict=16)(SCENARIO))
+    assert asyncio.run(PlannerLike(["Full plan"], num_predict=1024)(SCENARIO)) == "Full plan"
+    assert cache.hits == 0
+
+
+def test_agents_do_not_cache_unless_they_opt_in(cache):
+    save_memory("PlannerLike", key="user_intent", value="an earlier scenario")
+    agent = PlannerLike(["Forecast A", "Forecast B"], cache_responses=False)
+    asyncio.run(agent(SCENARIO))
+    assert asyncio.run(agent.fork()(SCENARIO)) == "Forecast B"
+    assert cache.stats()["entries"] == 0
+    # Without the cache the memory context is still sent
+    assert any("Previous intent: an earlier scenario" in m.content for m in agent.llm.sent[0])
+
+
+def test_deterministic_agents_opt_in():
+    from agents.critique_agent import CritiqueAgent
+    from agents.forecaster_agent import ForecasterAgent
+    from agents.ontology_agent import OntologyBuilderAgent
+    from agents.planner_agent import PlannerAgent
+    from agents.risk_assessment_agent import RiskAssessmentAgent
+
+    for agent_class in (PlannerAgent, OntologyBuilderAgent, RiskAssessmentAgent, CritiqueAgent):
+        assert agent_class().cache_responses, agent_class.__name__
+    assert not ForecasterAgent().cache_responses
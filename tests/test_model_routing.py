@@ -0,0 +1,37 @@
+# tests/test_model_routing.py
+import pytest
+
+from agents.base_agent import BaseAgent
+from utils import model_routing
+
+
+@pytest.fixture(autouse=True)
+def fresh_routes(monkeypatch):
+    monkeypatch.delenv("MODEL_ROUTING_PATH", raising=False)
+    model_routing.reload_routes()
+    yield
+    model_routing.reload_routes()
+
+
+def test_explicit_temperature_wins_over_the_route():
+    assert BaseAgent("sys", task="extraction", temperature=0.7).temperature == 0.7
+    # Zero is an explicit value too
+    assert BaseAgent("sys", task="critique", temperature=0.0).temperature == 0.0
+
+
+def test_route_temperature_applies_without_an_argument():
+    assert BaseAgent("sys", task="extraction").temperature == 0.0
+    assert BaseAgent("sys", task="critique").temperature == 0.1
+
+
+def test_default_temperature_when_neither_is_set():
+    assert BaseAgent("sys", task="forecast").temperature == 0.1
+
+
+def test_routing_file_overrides_builtin_route(tmp_path, monkeypatch):
+    path = tmp_path / "routes.json"
+    path.write_text('{"planning": {"temperature": 0.4}}')
+    monkeypatch.setenv("MODEL_ROUTING_PATH", str(path))
+    model_routing.reload_routes()
+    assert BaseAgent("sys", task="planning").temperature == 0.4
+    assert BaseAgent("sys", task="planning", temperature=0.2).temperature == 0.2
@@ -0,0 +1,99 @@
+# tests/test_ollama_client.py
+import asyncio
+import json
+import threading
+
+import pytest
+from aiohttp import web
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from utils.event_loop import SessionLoop
+from utils.ollama_client import OllamaChat, ollama_telemetry
+
+FINAL = {"done": True, "done_reason": "stop", "load_duration": 5_000_000, "prompt_eval_duration": 2_000_000,
+         "prompt_eval_count": 12, "eval_duration": 40_000_000, "eval_count": 4}
+
+
+@pytest.fixture
+def ollama():
+    """Fake Ollama /api/chat on a background thread; streams the reply "Hello world" and records each request."""
+    requests = []
+
+    async def chat(request):
+        body = await request.json()
+        requests.append(body)
+        if body["model"] == "missing":
+            return web.json_response({"error": "model not found"}, status=404)
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        for piece in ("Hello", " world"):
+            await response.write(json.dumps({"message": {"role": "assistant", "content": piece}, "done": False}).encode() + b"\n")
+        await response.write(json.dumps({"message": {"role": "assistant", "content": ""}, **FINAL}).encode() + b"\n")
+        return response
+
+    loop = asyncio.new_event_loop()
+    app = web.Application()
+    app.router.add_post("/api/chat", chat)
+    runner = web.AppRunner(app)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    loop.run_until_complete(site.start())
+    port = site._server.sockets[0].getsockname()[1]
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    ollama_telemetry.reset()
+    yield f"http://127.0.0.1:{port}", requests
+    asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+MESSAGES = [SystemMessage(content="Be brief."), HumanMessage(content="Hi")]
+
+
+def test_request_carries_messages_options_and_bound_format(ollama):
+    url, requests = ollama
+    llm = OllamaChat(base_url=url, model="m", temperature=0.2, num_predict=64, num_ctx=4096, keep_alive="10m")
+    llm.bind(format={"type": "object"}).invoke(MESSAGES, stop=["\nObservation"])
+    assert requests == [{
+        "model": "m",
+        "messages": [{"role": "system", "content": "Be brief."}, {"role": "user", "content": "Hi"}],
+        "stream": True,
+        "options": {"temperature": 0.2, "num_predict": 64, "num_ctx": 4096, "stop": ["\nObservation"]},
+        "format": {"type": "object"},
+        "keep_alive": "10m",
+    }]
+
+
+def test_generate_joins_the_stream_and_records_timings(ollama):
+    url, _ = ollama
+    generation = OllamaChat(base_url=url, model="m").generate([MESSAGES]).generations[0][0]
+    assert generation.text == "Hello world"
+    assert generation.generation_info["eval_count"] == 4
+    assert ollama_telemetry.snapshot()[0]["model"] == "m"
+    assert ollama_telemetry.snapshot()[0]["eval_ms"] == 40.0
+
+
+def test_async_stream_ends_with_the_done_metadata(ollama):
+    url, _ = ollama
+    llm = OllamaChat(base_url=url, model="m")
+    session = SessionLoop()
+
+    async def collect():
+        return [chunk async for chunk in llm.astream(MESSAGES)]
+
+    try:
+        chunks = session.run(collect())
+        result = session.run(llm.agenerate([MESSAGES], format="json"))
+    finally:
+        session.close()
+    assert "".join(chunk.content for chunk in chunks) == "Hello world"
+    assert chunks[-1].response_metadata["done"] is True
+    assert result.generations[0][0].text == "Hello world"
+
+
+def test_http_errors_raise(ollama):
+    url, _ = ollama
+    with pytest.raises(ValueError, match="ollama pull missing"):
+        OllamaChat(base_url=url, model="missing").invoke(MESSAGES)
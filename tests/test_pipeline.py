@@ -0,0 +1,177 @@
+# tests/test_pipeline.py
+import asyncio
+import time
+
+import pytest
+
+from agents.base_agent import BaseAgent
+from agents.tool_agent import ToolSelectorAgent
+from utils.agent_limits import TIMEOUT_MARKER, is_timeout
+from utils.pipeline import TIMED_OUT, Pipeline
+
+
+def run(pipeline, **inputs):
+    return asyncio.run(pipeline.run(**inputs))
+
+
+def test_stages_get_their_dependencies_results():
+    async def double(results):
+        return results["x"] * 2
+
+    pipeline = (Pipeline()
+                .add("double", double, deps=["x"])
+                .add("plus_one", lambda results: results["double"] + 1, deps=["double"]))
+    assert run(pipeline, x=4).results["plus_one"] == 9
+
+
+def test_independent_stages_run_concurrently():
+    async def sleep(results):
+        await asyncio.sleep(0.2)
+        return True
+
+    pipeline = Pipeline().add("a", sleep).add("b", sleep).add("c", lambda results: results["a"] and results["b"],
+                                                               deps=["a", "b"])
+    started = time.perf_counter()
+    result = run(pipeline)
+    assert result.results["c"] is True
+    assert time.perf_counter() - started < 0.35
+    assert [row["stage"] for row in result.timing_rows()][-1] == "c"
+
+
+def test_threaded_stage_does_not_block_the_loop():
+    def blocking(results):
+        time.sleep(0.2)
+        return "kg"
+
+    async def llm(results):
+        await asyncio.sleep(0.2)
+        return "llm"
+
+    started = time.perf_counter()
+    assert run(Pipeline().add("kg", blocking).add("llm", llm)).results == {"kg": "kg", "llm": "llm"}
+    assert time.perf_counter() - started < 0.35
+
+
+def test_on_done_runs_as_each_stage_finishes():
+    done = []
+    pipeline = (Pipeline()
+                .add("first", lambda results: 1, on_done=lambda value: done.append(("first", value)))
+                .add("second", lambda results: results["first"] + 1, deps=["first"],
+                     on_done=lambda value: done.append(("second", value))))
+    run(pipeline)
+    assert done == [("first", 1), ("second", 2)]
+
+
+def test_optional_stage_failure_yields_none():
+    def fail(results):
+        raise RuntimeError("KG down")
+
+    pipeline = Pipeline().add("risks", fail, optional=True).add("report", lambda results: results["risks"],
+                                                                deps=["risks"])
+    result = run(pipeline)
+    assert result.results["report"] is None
+    assert result.timings["risks"]["status"] == "failed: KG down"
+
+
+def test_required_stage_failure_fails_the_run():
+    def fail(results):
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        run(Pipeline().add("plan", fail).add("critique", lambda results: results["plan"], deps=["plan"]))
+
+
+@pytest.mark.parametrize("deps, error", [
+    ({"a": ["missing"]}, "unknown stage"),
+    ({"a": ["b"], "b": ["a"]}, "dependency cycle"),
+])
+def test_invalid_graphs_are_rejected(deps, error):
+    pipeline = Pipeline()
+    for name, stage_deps in deps.items():
+        pipeline.add(name, lambda results: None, deps=stage_deps)
+    with pytest.raises(ValueError, match=error):
+        run(pipeline)
+
+
+def test_slow_stage_times_out_and_later_stages_use_its_fallback():
+    async def slow(results):
+        await asyncio.sleep(5)
+        return "too late"
+
+    pipeline = (Pipeline(stage_timeout=0.1)
+                .add("forecast", slow, fallback="no forecast")
+                .add("report", lambda results: f"report with {results['forecast']}", deps=["forecast"]))
+    started = time.perf_counter()
+    result = run(pipeline)
+    assert time.perf_counter() - started < 1
+    assert result.results["report"] == "report with no forecast"
+    assert result.timings["forecast"]["status"] == TIMED_OUT
+    assert result.timings["report"]["status"] == "ok"
+
+
+def test_stage_timeout_overrides_the_pipeline_default():
+    async def slow(results):
+        await asyncio.sleep(0.2)
+        return "done"
+
+    result = run(Pipeline(stage_timeout=0.05).add("plan", slow, timeout=1))
+    assert result.results["plan"] == "done"
+
+
+def test_agent_deadline_reported_in_band_counts_as_timed_out():
+    async def agent(results):
+        return f"{TIMEOUT_MARKER} after 60s"
+
+    result = run(Pipeline().add("critique", agent))
+    assert result.timings["critique"]["status"] == TIMED_OUT
+
+
+def test_agent_call_past_its_deadline_answers_with_the_marker(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    class SlowLLM:
+        async def agenerate(self, messages, **kwargs):
+            await asyncio.sleep(5)
+
+    agent = BaseAgent("You are a planner.", model="test-model", timeout=0.1, cache_responses=False)
+    agent.llm = SlowLLM()
+    started = time.perf_counter()
+    reply = asyncio.run(agent("Concrete, Cracking, Humid"))
+    assert time.perf_counter() - started < 1
+    assert is_timeout(reply)
+    assert agent.turns == []  # a timed-out call is not remembered
+
+
+class FakeAsyncKG:
+    async def get_initial_recommendations_structured(self, material, defect, environment):
+        return {"recommended_methods": ["Ultrasonic Testing"], "recommended_sensors": ["Piezoelectric Transducer"]}
+
+    async def get_entities_details_for_rag(self, **kwargs):
+        return "Ultrasonic Testing: detects internal cracks."
+
+
+class ScriptedToolAgent(ToolSelectorAgent):
+    def __init__(self, reply):
+        self.async_kg = FakeAsyncKG()
+        self.reply = reply
+
+    async def __call__(self, context):
+        return self.reply
+
+
+@pytest.mark.parametrize("reply, timed_out", [
+    (f"{TIMEOUT_MARKER} after 60s", True),
+    ("# ERROR: LLM call failed: connection refused", False),
+])
+def test_tool_stage_keeps_the_timeout_marker_behind_its_fallback(monkeypatch, reply, timed_out):
+    monkeypatch.setenv("TOOL_SELECTOR_MODE", "kg")
+    agent = ScriptedToolAgent(reply)
+
+    async def tools(results):
+        return await agent.run_structured("Concrete", "Cracking", "Humid")
+
+    result = run(Pipeline().add("tools", tools))
+    summary = result.results["tools"]["summary_text"]
+    assert "justification unavailable" in summary
+    assert "connection refused" not in summary
+    assert result.timings["tools"]["status"] == (TIMED_OUT if timed_out else "ok")
@@ -0,0 +1,100 @@
+# tests/test_structured_output.py
+import asyncio
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import HumanMessage
+
+from agents.base_agent import BaseAgent
+from utils.structured_output import (ENTITY_SCHEMA, FINAL_ANSWER, SchemaViolation, ollama_format, parse_structured,
+                                     react_step_schema)
+
+ENTITY = '{"material": "Concrete", "defect": "Cracking", "environment": "Humid"}'
+
+
+def test_valid_reply_is_decoded():
+    assert parse_structured(ENTITY, ENTITY_SCHEMA)["defect"] == "Cracking"
+    # Some models fence the JSON even in JSON mode
+    assert parse_structured(f"```json\n{ENTITY}\n```", ENTITY_SCHEMA)["material"] == "Concrete"
+
+
+@pytest.mark.parametrize("reply, error", [
+    ("Material: Concrete", "not valid JSON"),
+    ('{"material": "Concrete", "defect": "Cracking"}', "'environment' is a required property"),
+    ('{"material": "", "defect": "Cracking", "environment": "Humid"}', "material:"),
+])
+def test_violations_are_reported(reply, error):
+    with pytest.raises(SchemaViolation) as violation:
+        parse_structured(reply, ENTITY_SCHEMA)
+    assert error in str(violation.value)
+    assert violation.value.text == reply
+
+
+def test_react_final_answer_requires_the_name_lists():
+    schema = react_step_schema(["kg_lookup"])
+    tool_call = '{"thought": "look it up", "action": "kg_lookup", "action_input": "Concrete"}'
+    assert parse_structured(tool_call, schema)["action"] == "kg_lookup"
+    with pytest.raises(SchemaViolation):
+        parse_structured(f'{{"thought": "done", "action": "{FINAL_ANSWER}", "action_input": ""}}', schema)
+    with pytest.raises(SchemaViolation):
+        parse_structured('{"thought": "?", "action": "web_search", "action_input": ""}', schema)
+
+
+def test_local_only_keywords_are_not_sent_to_ollama(monkeypatch):
+    monkeypatch.delenv("OLLAMA_FORMAT", raising=False)
+    sent = ollama_format(react_step_schema(["kg_lookup"]))
+    assert "if" not in sent and "then" not in sent
+    assert sent["properties"]["action"]["enum"] == ["kg_lookup", FINAL_ANSWER]
+    monkeypatch.setenv("OLLAMA_FORMAT", "json")
+    assert ollama_format(ENTITY_SCHEMA) == "json"
+
+
+class ScriptedLLM:
+    """Replies in order and records each request's messages and format."""
+
+    def __init__(self, replies):
+        self.model = FakeListChatModel(responses=replies)
+        self.requests = []
+
+    async def agenerate(self, messages, **kwargs):
+        self.requests.append((list(messages[0]), kwargs.get("format")))
+        return await self.model.agenerate(messages)
+
+
+@pytest.fixture
+def agent(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # interaction logs
+    return BaseAgent("Extract entities.", model="test-model", cache_responses=False)
+
+
+def test_structured_retries_only_on_violations(agent):
+    agent.llm = ScriptedLLM(['{"material": "Concrete"}', ENTITY])
+    data = asyncio.run(agent.structured([HumanMessage(content="Concrete deck, cracking, humid")], ENTITY_SCHEMA, retries=2))
+    assert data["environment"] == "Humid"
+    assert len(agent.llm.requests) == 2
+    retry_messages, fmt = agent.llm.requests[1]
+    assert fmt == ollama_format(ENTITY_SCHEMA)
+    # The retry shows the model its reply and what was wrong with it
+    assert retry_messages[-2].content == '{"material": "Concrete"}'
+    assert "'defect' is a required property" in retry_messages[-1].content
+
+
+def test_structured_raises_once_retries_run_out(agent):
+    agent.llm = ScriptedLLM(["not json", "still not json"])
+    with pytest.raises(SchemaViolation):
+        asyncio.run(agent.structured([HumanMessage(content="?")], ENTITY_SCHEMA, retries=1))
+    assert len(agent.llm.requests) == 2
+
+
+def test_structured_does_not_retry_llm_errors(agent):
+    class DownLLM:
+        calls = 0
+
+        async def agenerate(self, messages, **kwargs):
+            DownLLM.calls += 1
+            raise ConnectionError("Ollama is down")
+
+    agent.llm = DownLLM()
+    with pytest.raises(ConnectionError):
+        asyncio.run(agent.structured([HumanMessage(content="?")], ENTITY_SCHEMA, retries=3))
+    assert DownLLM.calls == 1
@@ -0,0 +1,40 @@
+# tests/test_write_detection.py
+import pytest
+
+from kg_interface import is_write_query
+
+WRITES = [
+    "CREATE (n:Material {name: $name})",
+    "MATCH (n) DETACH DELETE n",
+    "MATCH (n:Material {name: $name}) SET n.description = $d",
+    "MATCH (n) SET n += $props",
+    "MATCH (n) SET n:Archived",
+    "MATCH (n) REMOVE n.synonyms",
+    "UNWIND $rows AS row MERGE (m:Material {name: row.name})",
+    "CREATE CONSTRAINT material_name_unique IF NOT EXISTS FOR (n:Material) REQUIRE n.name IS UNIQUE",
+    "CREATE TEXT INDEX material_name_text IF NOT EXISTS FOR (n:Material) ON (n.name)",
+    "DROP INDEX material_name_text",
+    "MATCH (a), (b) FOREACH (x IN [1] | CREATE (a)-[:R]->(b))",
+]
+
+READS = [
+    "MATCH (n) RETURN n.offset AS set",
+    "MATCH (n) WHERE n.name = 'Remove' RETURN n",
+    'MATCH (n) WHERE n.note = "please create (something)" RETURN n',
+    "MATCH (n) RETURN n.set, n.delete, $merge",
+    "MATCH (n) RETURN n {.name, create: 1} AS delete ORDER BY delete",
+    "// MERGE (x) in a comment\nMATCH (n) RETURN n",
+    "/* SET n.x = 1 */ MATCH (n) RETURN count(n) AS created",
+    "MATCH (n) RETURN n.`set` AS value",
+    "SHOW INDEXES YIELD name, type, labelsOrTypes, properties",
+]
+
+
+@pytest.mark.parametrize("query", WRITES)
+def test_write_queries_are_detected(query):
+    assert is_write_query(query)
+
+
+@pytest.mark.parametrize("query", READS)
+def test_read_queries_with_keyword_lookalikes_stay_reads(query):
+    assert not is_write_query(query)
@@ -0,0 +1,41 @@
+# utils/agent_limits.py
+"""
+Per-agent deadlines and output-token caps.
+
+AGENT_TIMEOUT_SECONDS and AGENT_NUM_PREDICT set the defaults for every agent; AGENT_TIMEOUTS and
+AGENT_NUM_PREDICTS override them per agent class, e.g. "ToolSelectorAgent=240,PlannerAgent=60".
+A value of 0 disables the limit. A deadline cancels the pending LLM request (closing the HTTP
+stream, so Ollama stops generating), and the agent answers with TIMEOUT_MARKER instead of waiting.
+"""
+import os
+from typing import Callable, Dict, Optional
+
+TIMEOUT_MARKER = "# ERROR: LLM call timed out"
+
+
+def _overrides(env_name: str) -> Dict[str, str]:
+    overrides = {}
+    for item in os.getenv(env_name, "").split(","):
+        name, sep, value = item.partition("=")
+        if sep and name.strip():
+            overrides[name.strip()] = value.strip()
+    return overrides
+
+
+def _limit(agent_name: str, default_env: str, default: str, overrides_env: str, cast: Callable):
+    value = cast(_overrides(overrides_env).get(agent_name, os.getenv(default_env, default)))
+    return value if value > 0 else None
+
+
+def agent_timeout(agent_name: str) -> Optional[float]:
+    """Wall-clock seconds one call of `agent_name` may take (None: no deadline)."""
+    return _limit(agent_name, "AGENT_TIMEOUT_SECONDS", "120", "AGENT_TIMEOUTS", float)
+
+
+def agent_num_predict(agent_name: str) -> Optional[int]:
+    """Maximum tokens one reply of `agent_name` may generate (None: the model's default)."""
+    return _limit(agent_name, "AGENT_NUM_PREDICT", "1024", "AGENT_NUM_PREDICTS", int)
+
+
+def is_timeout(text: str) -> bool:
+    return TIMEOUT_MARKER in (text or "")
@@ -0,0 +1,75 @@
+# utils/context_window.py
+"""
+Token-budgeted conversation window for BaseAgent.
+
+The agents live in st.session_state, so their history would otherwise grow with every plan and
+every call would resend all of it. ContextWindow keeps the system prompt plus the most recent
+turns that fit the budget; turns that fall out can be folded into a short extractive summary
+(no extra LLM call). Token counts are approximate (about four characters per token), which is
+close enough for budgeting against the model's context size.
+"""
+import os
+from typing import List, Optional, Tuple
+
+from langchain.schema import BaseMessage, SystemMessage
+
+CHARS_PER_TOKEN = 4
+# Per-message overhead for role markers/separators in the chat template
+MESSAGE_OVERHEAD_TOKENS = 4
+SUMMARY_CHARS_PER_TURN = 160
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def count_message_tokens(messages: List[BaseMessage]) -> int:
+    return sum(estimate_tokens(m.content) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+def _excerpt(text: str, limit: int = SUMMARY_CHARS_PER_TURN) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+class ContextWindow:
+    def __init__(self, token_budget: Optional[int] = None, keep_turns: Optional[int] = None,
+                 summarize: Optional[bool] = None):
+        self.token_budget = token_budget or int(os.getenv("AGENT_CONTEXT_TOKEN_BUDGET", "4096"))
+        self.keep_turns = keep_turns if keep_turns is not None else int(os.getenv("AGENT_CONTEXT_KEEP_TURNS", "4"))
+        if summarize is None:
+            summarize = os.getenv("AGENT_CONTEXT_SUMMARIZE", "0").lower() in ("1", "true", "yes")
+        self.summarize = summarize
+        self.summary_lines: List[str] = []
+
+    def trim(self, turns: List[List[BaseMessage]]) -> List[List[BaseMessage]]:
+        """Keeps the last keep_turns turns, folding older ones into the summary when enabled."""
+        if len(turns) <= self.keep_turns:
+            return turns
+        dropped, kept = turns[:len(turns) - self.keep_turns], turns[len(turns) - self.keep_turns:]
+        if self.summarize:
+            for turn in dropped:
+                self.summary_lines.append(" → ".join(_excerpt(m.content) for m in turn))
+            # The summary itself stays bounded: only the most recent folded turns are kept
+            self.summary_lines = self.summary_lines[-self.keep_turns * 2:]
+        return kept
+
+    def build(self, system: SystemMessage, turns: List[List[BaseMessage]],
+              current: List[BaseMessage]) -> Tuple[List[BaseMessage], int]:
+        """
+        Returns (messages to send, approximate prompt tokens). The system prompt and the current
+        turn are always sent; earlier turns are added newest first while they fit the budget.
+        """
+        head = [system]
+        if self.summary_lines:
+            head.append(SystemMessage(content="Summary of earlier conversation:\n" + "\n".join(self.summary_lines)))
+        used = count_message_tokens(head) + count_message_tokens(current)
+        included: List[List[BaseMessage]] = []
+        for turn in reversed(turns[-self.keep_turns:] if self.keep_turns else []):
+            cost = count_message_tokens(turn)
+            if used + cost > self.token_budget:
+                break
+            included.insert(0, turn)
+            used += cost
+        messages = head + [m for turn in included for m in turn] + current
+        return messages, used
@@ -1,62 +1,185 @@
 import asyncio
 from agents.ontology_agent import OntologyBuilderAgent
+from agents.registry import new_session_agent
+from utils.ollama_client import warm_up, warm_up_targets
+from utils import event_loop
 from pathlib import Path
-from typing import List, Tuple
+from typing import Dict, List, Optional, Set
 import datetime
+import hashlib
+import json
+import math
+import os
+import random
 import time
 
+
+def cq_key(cq: str) -> str:
+    """Checkpoint key of a competency question (stable across reordering of the CQ file)."""
+    return hashlib.sha1(cq.encode("utf-8")).hexdigest()
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile; 0.0 for no values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
 class CQPipeline:
-    def __init__(self, cq_file: str, output_dir: str = "outputs/ontology/", retries: int = 2):
-        self.agent = OntologyBuilderAgent()
+    """
+    Generates ontology axioms for a file of competency questions (CQs).
+
+    Up to `concurrency` CQs are in flight at once, each on its own OntologyBuilderAgent (agents share
+    the LLM client through agents/registry.py but not conversation history). Failed attempts are
+    retried with exponential backoff. Each result is recorded in a JSONL checkpoint as soon as it
+    finishes (successful axioms are also appended to the .ttl output), so with `resume` a rerun skips
+    every CQ that already succeeded and a crash loses at most the CQs in flight. At the end of a run
+    the .ttl is rewritten from the checkpoint, in CQ order and without failed CQs.
+    """
+
+    def __init__(self, cq_file: str, output_dir: str = "outputs/ontology/", retries: int = 2, concurrency: int = 4,
+                 resume: bool = True, base_delay: float = 2.0, max_delay: float = 30.0):
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
         self.cq_list = self._load_cqs(cq_file)
-        self.generated_axioms: List[Tuple[str, str]] = []
         self.retries = retries
-        self.latencies = []
+        self.concurrency = max(1, concurrency)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # A resumable run writes to fixed, per-CQ-file paths; otherwise every run gets fresh timestamped files
+        run_name = Path(cq_file).stem if resume else datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.output_path = self.output_dir / f"ontology_axioms_{run_name}.ttl"
+        self.checkpoint_path = self.output_dir / f"ontology_axioms_{run_name}.checkpoint.jsonl"
+        self.latencies: List[float] = []
+        self.failed: List[str] = []
 
     def _load_cqs(self, file_path: str) -> List[str]:
         with open(file_path, "r", encoding="utf-8") as f:
             lines = [line.strip() for line in f.readlines() if line.strip()]
         return lines
 
-    async def process_all(self):
-        print(f"Processing {len(self.cq_list)} competency questions...")
-        for i, cq in enumerate(self.cq_list, start=1):
-            print(f"\nCQ {i}: {cq}")
+    def _succeeded(self) -> Dict[str, str]:
+        """Axioms of the CQs the checkpoint records as successful, by CQ key."""
+        axioms = {}
+        if not self.checkpoint_path.exists():
+            return axioms
+        with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # a line cut short by a crash
+                if entry.get("status") == "ok":
+                    axioms[entry["key"]] = entry.get("axiom", "")
+        return axioms
+
+    def _completed(self) -> Set[str]:
+        """Keys of the CQs the checkpoint records as successful."""
+        return set(self._succeeded())
+
+    def _record(self, index: int, cq: str, axiom: Optional[str], status: str, latency: float, attempts: int) -> None:
+        # Output first, then checkpoint: a CQ is only marked done once its axioms are on disk.
+        # Failed CQs only go to the checkpoint, so the .ttl never holds error blocks.
+        if axiom is not None:
+            with open(self.output_path, "a", encoding="utf-8") as f:
+                f.write(f"# CQ {index}: {cq}\n{axiom}\n\n")
+        with open(self.checkpoint_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"key": cq_key(cq), "index": index, "cq": cq, "status": status,
+                                "latency": round(latency, 3), "attempts": attempts, "axiom": axiom}) + "\n")
+
+    def _write_output(self) -> None:
+        """Rewrites the .ttl from the checkpoint in CQ order, dropping out-of-order appends from earlier runs."""
+        axioms = self._succeeded()
+        blocks = [f"# CQ {i}: {cq}\n{axioms[cq_key(cq)]}\n\n"
+                  for i, cq in enumerate(self.cq_list, start=1) if cq_key(cq) in axioms]
+        tmp_path = self.output_path.with_suffix(".ttl.tmp")
+        tmp_path.write_text("".join(blocks), encoding="utf-8")
+        os.replace(tmp_path, self.output_path)
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _process_one(self, index: int, cq: str, agents: asyncio.Queue) -> None:
+        # Taking an agent from the pool is the concurrency bound: at most `concurrency` CQs run at once
+        agent = await agents.get()
+        try:
+            start = time.perf_counter()
             attempt = 0
-            success = False
-            axiom = ""
-            start = time.time()
-            while not success and attempt <= self.retries:
+            while True:
+                attempt += 1
                 try:
-                    axiom = await self.agent.run(cq)
-                    success = True
+                    axiom = await agent.run(cq)
+                    # BaseAgent reports LLM failures in-band rather than raising
+                    if axiom.startswith("# ERROR"):
+                        raise RuntimeError(axiom)
+                    break
                 except Exception as e:
-                    attempt += 1
-                    print(f"❌ Attempt {attempt} failed: {str(e)}")
-                    await asyncio.sleep(2)
+                    print(f"❌ CQ {index} attempt {attempt} failed: {str(e)}")
+                    if attempt > self.retries:
+                        self.failed.append(cq)
+                        self._record(index, cq, None, "failed", time.perf_counter() - start, attempt)
+                        return
+                    await asyncio.sleep(self._backoff(attempt))
+            latency = time.perf_counter() - start
+            self.latencies.append(latency)
+            self._record(index, cq, axiom, "ok", latency, attempt)
+            print(f"✅ CQ {index} done in {latency:.2f}s")
+        finally:
+            agents.put_nowait(agent)
+
+    def stats(self, elapsed: float, skipped: int) -> Dict:
+        completed = len(self.latencies)
+        return {
+            "completed": completed,
+            "failed": len(self.failed),
+            "skipped": skipped,
+            "seconds": round(elapsed, 2),
+            "cqs_per_minute": round(completed / elapsed * 60, 2) if elapsed > 0 else 0.0,
+            "p50_latency": round(percentile(self.latencies, 50), 2),
+            "p95_latency": round(percentile(self.latencies, 95), 2),
+        }
 
-            if success:
-                self.latencies.append(time.time() - start)
-                self.generated_axioms.append((cq, axiom))
-                print(axiom)
-            else:
-                self.generated_axioms.append((cq, "# ERROR: Generation failed after retries."))
+    async def process_all(self) -> Dict:
+        done = self._completed()
+        pending = [(i, cq) for i, cq in enumerate(self.cq_list, start=1) if cq_key(cq) not in done]
+        skipped = len(self.cq_list) - len(pending)
+        print(f"Processing {len(pending)} competency questions ({skipped} already done, "
+              f"concurrency {self.concurrency})...")
 
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_path = self.output_dir / f"ontology_axioms_{timestamp}.ttl"
+        agents: asyncio.Queue = asyncio.Queue()
+        for _ in range(min(self.concurrency, len(pending)) or 1):
+            agents.put_nowait(new_session_agent(OntologyBuilderAgent))
 
-        with open(output_path, "w", encoding="utf-8") as f:
-            for cq, axiom in self.generated_axioms:
-                f.write(f"# CQ: {cq}\n{axiom}\n\n")
+        if pending:
+            # Load the model before the clock starts, so the first CQs don't all wait on the same cold load
+            await asyncio.to_thread(warm_up, warm_up_targets(["ontology"]))
+        started = time.perf_counter()
+        await asyncio.gather(*(self._process_one(i, cq, agents) for i, cq in pending))
+        stats = self.stats(time.perf_counter() - started, skipped)
+        self._write_output()
 
-        print(f"\n✅ Saved to: {output_path}")
-        avg_latency = sum(self.latencies) / len(self.latencies) if self.latencies else 0
-        print(f"⏱️ Avg Latency per CQ: {avg_latency:.2f}s")
+        print(f"\n✅ Saved to: {self.output_path} (checkpoint: {self.checkpoint_path})")
+        print(f"⏱️ {stats['completed']} CQs in {stats['seconds']}s ({stats['cqs_per_minute']} CQs/min), "
+              f"p50 {stats['p50_latency']}s, p95 {stats['p95_latency']}s, {stats['failed']} failed")
+        return stats
 
 # Run CLI
 if __name__ == "__main__":
-    input_file = "data/sample_cqs.txt"
-    pipeline = CQPipeline(cq_file=input_file)
-    asyncio.run(pipeline.process_all())
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate ontology axioms for a file of competency questions.")
+    parser.add_argument("cq_file", nargs="?", default="data/sample_cqs.txt", help="One competency question per line.")
+    parser.add_argument("--output-dir", default="outputs/ontology/")
+    parser.add_argument("--concurrency", type=int, default=4, help="CQs in flight at once.")
+    parser.add_argument("--retries", type=int, default=2, help="Retries per CQ after the first attempt.")
+    parser.add_argument("--no-resume", action="store_true", help="Start a fresh, timestamped output instead of resuming.")
+    args = parser.parse_args()
+
+    pipeline = CQPipeline(cq_file=args.cq_file, output_dir=args.output_dir, retries=args.retries,
+                          concurrency=args.concurrency, resume=not args.no_resume)
+    # Closes the loop's async resources (drivers, connection pools) before the loop goes away
+    event_loop.run(pipeline.process_all())
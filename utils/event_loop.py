@@ -0,0 +1,86 @@
+# utils/event_loop.py
+"""
+Event loops for the synchronous entry points (Streamlit sessions and CLIs).
+
+Async resources are tied to the loop they were created on (async Neo4j drivers in
+utils/neo4j_pool.py, aiohttp sessions in utils/ollama_client.py). A loop must therefore live
+as long as the resources are meant to be reused, and the resources must be closed on that loop
+before it goes away. Modules that keep per-loop resources register an async cleanup with
+on_loop_close(). SessionLoop (one per Streamlit session) and run() (for CLIs) run those
+cleanups before closing their loop.
+"""
+import asyncio
+import atexit
+import logging
+import threading
+import weakref
+from typing import Awaitable, Callable, List
+
+logger = logging.getLogger(__name__)
+
+_cleanups: List[Callable[[], Awaitable]] = []
+_open_loops: "weakref.WeakSet[SessionLoop]" = weakref.WeakSet()
+
+
+def on_loop_close(cleanup: Callable[[], Awaitable]) -> None:
+    """Registers an async cleanup that closes the running loop's resources before the loop is closed."""
+    if cleanup not in _cleanups:
+        _cleanups.append(cleanup)
+
+
+async def run_loop_cleanups() -> None:
+    for cleanup in list(_cleanups):
+        try:
+            await cleanup()
+        except Exception as e:
+            logger.warning(f"Event loop cleanup {getattr(cleanup, '__qualname__', cleanup)} failed: {e}")
+
+
+class SessionLoop:
+    """A long-lived event loop (e.g. one per Streamlit session), closed together with its resources."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._lock = threading.Lock()
+        _open_loops.add(self)
+
+    def run(self, coro):
+        """Runs `coro` to completion on this loop (from synchronous code)."""
+        asyncio.set_event_loop(self.loop)
+        return self.loop.run_until_complete(coro)
+
+    def close(self) -> None:
+        """Runs the registered cleanups on the loop, then closes it. Safe to call more than once."""
+        with self._lock:
+            if self.loop.is_closed():
+                return
+            try:
+                self.loop.run_until_complete(run_loop_cleanups())
+            except Exception as e:
+                logger.warning(f"Could not clean up event loop resources: {e}")
+            finally:
+                self.loop.close()
+
+    def __del__(self):
+        # The session is gone. Close on a fresh thread: the collector may run inside another running loop.
+        if not self.loop.is_closed():
+            try:
+                threading.Thread(target=self.close, name="session-loop-close", daemon=True).start()
+            except RuntimeError:
+                pass  # interpreter shutdown; _close_open_loops has run or the process is exiting
+
+
+def run(coro):
+    """asyncio.run() that also closes the loop's registered resources; use it in CLI entry points."""
+    async def main():
+        try:
+            return await coro
+        finally:
+            await run_loop_cleanups()
+    return asyncio.run(main())
+
+
+@atexit.register
+def _close_open_loops() -> None:
+    for session_loop in list(_open_loops):
+        session_loop.close()
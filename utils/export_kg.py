@@ -1,8 +1,7 @@
 # utils/export_kg.py
 
 from rdflib import Graph, Namespace, RDF, RDFS, OWL, URIRef, Literal
-from neo4j import GraphDatabase
-import os
+from utils.neo4j_pool import get_driver
 
 # Namespaces for ontology (schema) and instances
 NDT = Namespace("http://example.org/ndt#")
@@ -11,11 +10,8 @@ EX = Namespace("http://example.org/instance#")
 def export_kg_to_owl(output_file="kg_export.ttl"):
     print("[INFO] Starting KG export...")
 
-    # Setup Neo4j connection
-    uri = os.getenv("NEO4J_URI", "bolt://localhost:7687")
-    user = os.getenv("NEO4J_USER", "neo4j")
-    password = os.getenv("NEO4J_PASSWORD", "eklil@2017")
-    driver = GraphDatabase.driver(uri, auth=(user, password))
+    # Shared Neo4j driver (connection settings come from the NEO4J_* environment variables)
+    driver = get_driver()
 
     g = Graph()
     g.bind("ndt", NDT)
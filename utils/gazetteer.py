@@ -0,0 +1,183 @@
+# utils/gazetteer.py
+"""
+Local material/defect/environment extraction from the KG vocabulary.
+
+The names of every Material, Deterioration, DeteriorationMechanism, PhysicalChange and
+Environment node (plus their `synonyms` property and simple inflections such as
+"cracks"/"cracked" for "Cracking") are compiled into one Aho-Corasick automaton. Text is
+normalized (case, punctuation, whitespace) and scanned once; only whole-word, leftmost-longest
+matches count. ToolSelectorAgent uses the result directly when each slot resolves to a single
+entity and asks the LLM only when something is missing or ambiguous.
+"""
+import re
+from collections import Counter, defaultdict, deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# KG label -> extraction slot, in tie-break priority order within a slot
+LABEL_SLOTS: Dict[str, str] = {
+    "Material": "material",
+    "Deterioration": "defect",
+    "DeteriorationMechanism": "defect",
+    "PhysicalChange": "defect",
+    "Environment": "environment",
+}
+LABEL_PRIORITY = {label: rank for rank, label in enumerate(LABEL_SLOTS)}
+SLOTS = ("material", "defect", "environment")
+
+# Common wordings the KG doesn't carry as synonyms; only used for names present in the vocabulary
+EXTRA_SYNONYMS: Dict[str, Tuple[str, ...]] = {
+    "Corrosion": ("rust", "rusting", "rusted", "corroded", "corroding"),
+    "Humid": ("humidity", "moist", "moisture-laden"),
+    "Marine": ("seawater", "sea water", "coastal", "offshore"),
+    "High Temperature": ("high temperatures", "elevated temperature", "hot"),
+}
+
+MIN_TERM_LENGTH = 3
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(text: str) -> str:
+    """Lowercase, punctuation to spaces, single spaces, padded so every word is delimited by spaces."""
+    return f" {_NON_WORD.sub(' ', text.lower()).strip()} "
+
+
+def inflections(term: str) -> List[str]:
+    """Simple English variants of a (normalized, unpadded) term: plural, and -ing/-ed/-s forms of -ing names."""
+    words = term.split(" ")
+    last = words[-1]
+    variants = {last, last + "s", last + "es"}
+    if last.endswith("ing") and len(last) > 5:
+        stem = last[:-3]
+        # "spalling" -> spall/spalls/spalled, "scaling" -> scale/scales/scaled
+        variants |= {stem, stem + "s", stem + "ed", stem + "e", stem + "es"}
+    return [" ".join(words[:-1] + [variant]) for variant in sorted(variants)]
+
+
+class AhoCorasick:
+    """Multi-pattern matcher: finds every occurrence of every pattern in one pass over the text."""
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[str, object]]] = [[]]
+        self._built = False
+
+    def add(self, pattern: str, value) -> None:
+        node = 0
+        for char in pattern:
+            nxt = self._goto[node].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append((pattern, value))
+        self._built = False
+
+    def build(self) -> None:
+        queue = deque(self._goto[0].values())
+        for child in queue:
+            self._fail[child] = 0
+        # Breadth-first, so a node's failure link is final before its children's are computed
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+        self._built = True
+
+    def iter(self, text: str) -> Iterable[Tuple[int, int, object]]:
+        """Yields (start, end, value) for every match, end exclusive."""
+        if not self._built:
+            self.build()
+        node = 0
+        for i, char in enumerate(text):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for pattern, value in self._out[node]:
+                yield i + 1 - len(pattern), i + 1, value
+
+
+class Extraction:
+    def __init__(self, entities: Dict[str, Optional[str]], candidates: Dict[str, List[str]], ambiguous: List[str]):
+        self.entities = entities
+        # slot -> every distinct entity mentioned, most frequent first
+        self.candidates = candidates
+        # slots where two entities were mentioned equally often
+        self.ambiguous = ambiguous
+
+    @property
+    def missing(self) -> List[str]:
+        return [slot for slot in SLOTS if self.entities.get(slot) is None]
+
+    @property
+    def resolved(self) -> bool:
+        """True when every slot has exactly one best entity, i.e. no LLM call is needed."""
+        return not self.missing and not self.ambiguous
+
+    def __repr__(self) -> str:
+        return f"Extraction({self.entities}, ambiguous={self.ambiguous})"
+
+
+class Gazetteer:
+    def __init__(self, vocabulary: Iterable[Dict]):
+        """`vocabulary`: rows with label, name and synonyms, as returned by KGInterface.get_vocabulary()."""
+        self._automaton = AhoCorasick()
+        self.terms = 0
+        seen = set()
+        for row in vocabulary:
+            label, name = row.get("label"), row.get("name")
+            if label not in LABEL_SLOTS or not name:
+                continue
+            entity = (LABEL_SLOTS[label], LABEL_PRIORITY[label], name)
+            synonyms = row.get("synonyms") or []
+            if isinstance(synonyms, str):
+                synonyms = [synonyms]
+            surface_forms = [name, *synonyms, *EXTRA_SYNONYMS.get(name, ())]
+            for form in surface_forms:
+                base = normalize(str(form)).strip()
+                for term in inflections(base) if base else ():
+                    if len(term) < MIN_TERM_LENGTH or (term, entity) in seen:
+                        continue
+                    seen.add((term, entity))
+                    # Padding with spaces makes the automaton match whole words only
+                    self._automaton.add(f" {term} ", entity)
+                    self.terms += 1
+        self._automaton.build()
+
+    def _matches(self, text: str) -> List[Tuple[int, int, tuple]]:
+        """Leftmost-longest, non-overlapping matches ("Alkali Silica Reaction" wins over "Reaction")."""
+        matches = sorted(self._automaton.iter(normalize(text)), key=lambda m: (m[0], -(m[1] - m[0])))
+        kept, span = [], (-1, -1)
+        for start, stop, entity in matches:
+            # Matches share their delimiting spaces, so a match may start on the previous one's last char.
+            # The same words can name several entities (Deterioration and PhysicalChange "cracking"); keep each.
+            if start >= span[1] - 1 or (start, stop) == span:
+                kept.append((start, stop, entity))
+                span = (start, stop)
+        return kept
+
+    def extract(self, text: str) -> Extraction:
+        counts: Dict[str, Counter] = defaultdict(Counter)
+        priority: Dict[Tuple[str, str], int] = {}
+        for _, _, (slot, rank, name) in self._matches(text):
+            counts[slot][name] += 1
+            priority[(slot, name)] = min(rank, priority.get((slot, name), rank))
+        entities: Dict[str, Optional[str]] = {}
+        candidates: Dict[str, List[str]] = {}
+        ambiguous = []
+        for slot in SLOTS:
+            ranked = sorted(counts[slot].items(), key=lambda kv: (-kv[1], priority[(slot, kv[0])], kv[0]))
+            candidates[slot] = [name for name, _ in ranked]
+            entities[slot] = ranked[0][0] if ranked else None
+            if len(ranked) > 1 and ranked[0][1] == ranked[1][1] and \
+                    priority[(slot, ranked[0][0])] == priority[(slot, ranked[1][0])]:
+                ambiguous.append(slot)
+        return Extraction(entities, candidates, ambiguous)
@@ -0,0 +1,196 @@
+# utils/graph_engine.py
+"""
+In-process engine for the fixed recommendation traversals of KGInterface.
+
+The reference subgraph used by recommend_ndt_methods / recommend_sensors is loaded once into
+integer-indexed CSR adjacency arrays (one per relationship, plus a name <-> id interning table
+per label) and answered without a round-trip to Neo4j. The snapshot is rebuilt whenever the
+graph version changes (see utils/kg_cache.py) or after max_age_seconds, so writes made by
+other processes are picked up too.
+"""
+import os
+import time
+import logging
+import threading
+import weakref
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.kg_cache import get_graph_version
+
+logger = logging.getLogger(__name__)
+
+# name -> (source label, relationship type, target label), matching the Cypher in KGInterface
+EDGE_SPECS: Dict[str, Tuple[str, str, str]] = {
+    "material_deterioration": ("Material", "HAS_DETERIORATION_MECHANISM", "Deterioration"),
+    "material_mechanism": ("Material", "HAS_DETERIORATION_MECHANISM", "DeteriorationMechanism"),
+    "deterioration_method": ("Deterioration", "DETECTED_BY", "NDTMethod"),
+    "mechanism_change": ("DeteriorationMechanism", "CAUSES_PHYSICAL_CHANGE", "PhysicalChange"),
+    "change_method": ("PhysicalChange", "DETECTED_BY", "NDTMethod"),
+    "method_environment": ("NDTMethod", "REQUIRES_ENVIRONMENT", "Environment"),
+    "sensor_method": ("Sensor", "RECOMMENDED_FOR", "NDTMethod"),
+}
+
+
+class CSRAdjacency:
+    """Compressed sparse row adjacency: neighbours of i are targets[offsets[i]:offsets[i + 1]], sorted."""
+    __slots__ = ("offsets", "targets")
+
+    def __init__(self, n_sources: int, edges: Iterable[Tuple[int, int]]):
+        rows: List[List[int]] = [[] for _ in range(n_sources)]
+        for source, target in set(edges):
+            rows[source].append(target)
+        self.offsets = array("l", [0])
+        self.targets = array("l")
+        for row in rows:
+            self.targets.extend(sorted(row))
+            self.offsets.append(len(self.targets))
+
+    def neighbors(self, i: int) -> array:
+        if i is None or i >= len(self.offsets) - 1:
+            return array("l")
+        return self.targets[self.offsets[i]:self.offsets[i + 1]]
+
+    def has_edge(self, i: int, j: int) -> bool:
+        if i is None or j is None or i >= len(self.offsets) - 1:
+            return False
+        start, end = self.offsets[i], self.offsets[i + 1]
+        k = bisect_left(self.targets, j, start, end)
+        return k < end and self.targets[k] == j
+
+
+class _Snapshot:
+    """Immutable compiled view of the reference graph; swapped as a whole on refresh."""
+
+    def __init__(self, edge_rows: Dict[str, List[Dict]], version: int):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.names: Dict[str, List[str]] = {}
+        self.ids: Dict[str, Dict[str, int]] = {}
+
+        interned: Dict[str, List[Tuple[int, int]]] = {}
+        for spec_name, (source_label, _, target_label) in EDGE_SPECS.items():
+            interned[spec_name] = [
+                (self._intern(source_label, row["source"]), self._intern(target_label, row["target"]))
+                for row in edge_rows.get(spec_name, [])
+            ]
+
+        self.adjacency: Dict[str, CSRAdjacency] = {}
+        for spec_name, (source_label, _, target_label) in EDGE_SPECS.items():
+            self.adjacency[spec_name] = CSRAdjacency(len(self.names.get(source_label, [])), interned[spec_name])
+        # Sensor -[:RECOMMENDED_FOR]-> NDTMethod is traversed backwards
+        self.adjacency["method_sensor"] = CSRAdjacency(
+            len(self.names.get("NDTMethod", [])),
+            ((method, sensor) for sensor, method in interned["sensor_method"]),
+        )
+
+    def _intern(self, label: str, name: str) -> int:
+        ids = self.ids.setdefault(label, {})
+        node_id = ids.get(name)
+        if node_id is None:
+            names = self.names.setdefault(label, [])
+            node_id = ids[name] = len(names)
+            names.append(name)
+        return node_id
+
+    def id_of(self, label: str, name: str) -> Optional[int]:
+        return self.ids.get(label, {}).get(name)
+
+    def name_of(self, label: str, node_id: int) -> str:
+        return self.names[label][node_id]
+
+
+class CompiledRecommendationGraph:
+    def __init__(self, max_age_seconds: float = 300.0):
+        self.max_age_seconds = max_age_seconds
+        self._snapshot: Optional[_Snapshot] = None
+        self._lock = threading.Lock()
+
+    def is_stale(self) -> bool:
+        snapshot = self._snapshot
+        return (
+            snapshot is None
+            or snapshot.version != get_graph_version()
+            or time.monotonic() - snapshot.loaded_at > self.max_age_seconds
+        )
+
+    def refresh(self, kg, force: bool = False) -> None:
+        """(Re)loads the reference subgraph through `kg.cypher` if it is stale."""
+        with self._lock:
+            if not force and not self.is_stale():
+                return
+            version = get_graph_version()
+            edge_rows = {}
+            for spec_name, (source_label, rel_type, target_label) in EDGE_SPECS.items():
+                query = f"""
+                MATCH (a:{source_label})-[:{rel_type}]->(b:{target_label})
+                WHERE a.name IS NOT NULL AND b.name IS NOT NULL
+                RETURN DISTINCT a.name AS source, b.name AS target
+                """
+                edge_rows[spec_name] = kg.cypher(query, log=False, name=f"engine.load.{spec_name}")
+            self._snapshot = _Snapshot(edge_rows, version)
+            logger.info(
+                f"Compiled recommendation graph loaded (graph version {version}, "
+                f"{sum(len(rows) for rows in edge_rows.values())} edges)."
+            )
+
+    def recommend_ndt_methods(self, material: str, defect: str, environment: str) -> List[str]:
+        s = self._snapshot
+        material_id = s.id_of("Material", material)
+        environment_id = s.id_of("Environment", environment)
+        if material_id is None or environment_id is None:
+            return []
+
+        method_ids = []
+        # High-level path: Material -> Deterioration -> NDTMethod -> Environment
+        deterioration_id = s.id_of("Deterioration", defect)
+        if s.adjacency["material_deterioration"].has_edge(material_id, deterioration_id):
+            method_ids.extend(s.adjacency["deterioration_method"].neighbors(deterioration_id))
+        # Mechanism-based path: Material -> DeteriorationMechanism -> PhysicalChange -> NDTMethod -> Environment
+        mechanism_id = s.id_of("DeteriorationMechanism", defect)
+        if s.adjacency["material_mechanism"].has_edge(material_id, mechanism_id):
+            for change_id in s.adjacency["mechanism_change"].neighbors(mechanism_id):
+                method_ids.extend(s.adjacency["change_method"].neighbors(change_id))
+
+        methods = []
+        for method_id in dict.fromkeys(method_ids):
+            if s.adjacency["method_environment"].has_edge(method_id, environment_id):
+                methods.append(s.name_of("NDTMethod", method_id))
+        return methods
+
+    def recommend_sensors(self, defect: str) -> List[str]:
+        s = self._snapshot
+        method_ids = []
+        # Path A: Deterioration -> NDTMethod
+        method_ids.extend(s.adjacency["deterioration_method"].neighbors(s.id_of("Deterioration", defect)))
+        # Path B: DeteriorationMechanism -> PhysicalChange -> NDTMethod
+        for change_id in s.adjacency["mechanism_change"].neighbors(s.id_of("DeteriorationMechanism", defect)):
+            method_ids.extend(s.adjacency["change_method"].neighbors(change_id))
+
+        sensor_ids = []
+        for method_id in dict.fromkeys(method_ids):
+            sensor_ids.extend(s.adjacency["method_sensor"].neighbors(method_id))
+        return [s.name_of("Sensor", sensor_id) for sensor_id in dict.fromkeys(sensor_ids)]
+
+
+# One engine per graph (as for the query cache, see kg_interface.cache_scope): Neo4j engines by
+# scope, in-process backends by the backend object, so an engine goes away with its store
+_engines: Dict[str, CompiledRecommendationGraph] = {}
+_backend_engines: "weakref.WeakKeyDictionary[object, CompiledRecommendationGraph]" = weakref.WeakKeyDictionary()
+_engine_lock = threading.Lock()
+
+
+def get_compiled_graph(kg) -> CompiledRecommendationGraph:
+    """Returns the engine of the graph behind `kg`, loading or refreshing it through `kg` when stale."""
+    backend = getattr(kg, "backend", None)
+    engines, key = (_backend_engines, backend) if backend is not None else (_engines, kg.cache_scope)
+    with _engine_lock:
+        engine = engines.get(key)
+        if engine is None:
+            engine = engines[key] = CompiledRecommendationGraph(
+                max_age_seconds=float(os.getenv("KG_ENGINE_MAX_AGE_SECONDS", "300"))
+            )
+    if engine.is_stale():
+        engine.refresh(kg)
+    return engine
@@ -0,0 +1,113 @@
+# utils/kg_cache.py
+"""
+In-process read-through cache for KG lookups.
+
+The reference graph (materials, defects, methods, sensors...) almost never changes, so
+vocabulary and recommendation queries are served from memory. Entries expire after a TTL,
+the least recently used ones are evicted once the cache is full, and every write to the
+graph bumps a process-wide graph version, which invalidates all cached entries at once.
+"""
+import os
+import copy
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+class KGQueryCache:
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 300.0, enabled: bool = True):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._entries: "OrderedDict[Hashable, Tuple[int, float, Any]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def version(self) -> int:
+        """Current graph version. Changes every time the graph is written."""
+        return self._version
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """Returns (hit, value). Expired or stale-version entries count as misses."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                version, expires_at, value = entry
+                if version == self._version and expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, copy.deepcopy(value)
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key: Hashable, value: Any, version: int = None) -> None:
+        """
+        Stores a value loaded at `version`. Values loaded before the latest write are
+        dropped instead of being cached under the new version.
+        """
+        with self._lock:
+            if version is not None and version != self._version:
+                return
+            self._entries[key] = (self._version, time.monotonic() + self.ttl_seconds, copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        if not self.enabled:
+            return loader()
+        hit, value = self.get(key)
+        if hit:
+            return value
+        version = self._version
+        value = loader()
+        self.set(key, value, version=version)
+        return value
+
+    def invalidate(self) -> None:
+        """Bumps the graph version and drops every cached entry."""
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "graph_version": self._version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+# Shared by every KGInterface in the process (the driver is shared too, see utils/neo4j_pool.py)
+kg_query_cache = KGQueryCache(
+    max_entries=int(os.getenv("KG_CACHE_MAX_ENTRIES", "1024")),
+    ttl_seconds=float(os.getenv("KG_CACHE_TTL_SECONDS", "300")),
+    enabled=os.getenv("KG_CACHE_ENABLED", "1").lower() not in ("0", "false", "no"),
+)
+
+
+def get_graph_version() -> int:
+    return kg_query_cache.version
+
+
+def bump_graph_version() -> None:
+    """Call after writing to the graph outside of KGInterface.cypher (e.g. KGAugmentor)."""
+    kg_query_cache.invalidate()
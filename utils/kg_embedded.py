@@ -0,0 +1,368 @@
+# utils/kg_embedded.py
+"""
+In-process KG backend for running KGInterface without Neo4j.
+
+The graph is loaded from a snapshot (kg_export.ttl, an OWL/RDF file or a GraphML dump, see
+utils/kg_snapshot.py) into adjacency maps, and each named KGInterface query is answered by a
+Python function returning the same records as its Cypher. Only named queries are supported;
+free-form Cypher raises UnsupportedQueryError, so app/main.py disables the controls that send it
+(the Advanced Query box, the demo seed, the OWL export) in this mode.
+
+Select it with KG_BACKEND=embedded and KG_SNAPSHOT_PATH, or pass an EmbeddedKGStore as the
+`backend` of KGInterface / AsyncKGInterface. Writes (plans, feedback) are kept in memory.
+"""
+import os
+import uuid
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional
+
+from utils.graph_engine import EDGE_SPECS
+from utils.kg_snapshot import SnapshotNode, iter_snapshot
+
+logger = logging.getLogger(__name__)
+
+
+class UnsupportedQueryError(NotImplementedError):
+    """Raised for queries the embedded backend has no implementation for."""
+
+
+def embedded_backend_enabled() -> bool:
+    return os.getenv("KG_BACKEND", "neo4j").lower() == "embedded"
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class EmbeddedKGStore:
+    def __init__(self):
+        self._labels: List[tuple] = []
+        self._props: List[Dict] = []
+        self._out: List[Dict[str, List[int]]] = []
+        self._in: List[Dict[str, List[int]]] = []
+        self._by_name: Dict[tuple, List[int]] = defaultdict(list)
+        self._by_label: Dict[str, List[int]] = defaultdict(list)
+        self._edge_order: List[tuple] = []
+        self._lock = threading.RLock()
+        self._handlers: Dict[str, Callable[[Dict], List[Dict]]] = {
+            "recommend_ndt_methods": self._recommend_ndt_methods,
+            "recommend_sensors": self._recommend_sensors,
+            "reasoning_subgraph": self._reasoning_subgraph,
+            "rag_context": self._rag_context,
+            "ndt_method_details": self._ndt_method_details,
+            "material_details": self._material_details,
+            "deterioration_details": lambda p: self._name_and_description("Deterioration", p["defect_name"]),
+            "physical_change_details": lambda p: self._name_and_description("PhysicalChange", p["defect_name"]),
+            "recommendation_subgraph": self._recommendation_subgraph,
+            "materials": lambda p: self._names("Material"),
+            "deterioration_types": lambda p: self._names("Deterioration"),
+            "environments": lambda p: self._names("Environment"),
+            "vocabulary": self._vocabulary,
+            "log_inspection_plan": self._log_inspection_plan,
+            "log_plan_feedback": self._log_plan_feedback,
+            "write_queue.plans": self._write_plans,
+            "write_queue.feedback": self._write_feedback,
+            "sidebar.label_counts": self._label_counts,
+            "explorer.label_counts": self._label_counts,
+            "explorer.sample_relationships": self._sample_relationships,
+            "schema.show_constraints": lambda p: [],
+            "schema.show_indexes": lambda p: [],
+        }
+
+    # --- loading ---
+
+    @classmethod
+    def from_snapshot(cls, path: str, fmt: Optional[str] = None) -> "EmbeddedKGStore":
+        store = cls()
+        ids: Dict[str, int] = {}
+        edges = []
+        for record in iter_snapshot(path, fmt):
+            if isinstance(record, SnapshotNode):
+                ids[record.id] = store.add_node(record.labels, record.props)
+            else:
+                edges.append(record)
+        for edge in edges:
+            if edge.source in ids and edge.target in ids and edge.type:
+                store.add_edge(ids[edge.source], edge.type, ids[edge.target])
+        logger.info(f"Embedded KG loaded from {path}: {len(store._props)} nodes, {len(store._edge_order)} relationships.")
+        return store
+
+    def add_node(self, labels: Iterable[str], props: Dict) -> int:
+        with self._lock:
+            node = len(self._props)
+            self._labels.append(tuple(labels))
+            self._props.append(dict(props))
+            self._out.append(defaultdict(list))
+            self._in.append(defaultdict(list))
+            for label in self._labels[node]:
+                self._by_label[label].append(node)
+                if props.get("name") is not None:
+                    self._by_name[(label, props["name"])].append(node)
+            return node
+
+    def add_edge(self, source: int, rel_type: str, target: int) -> None:
+        with self._lock:
+            self._out[source][rel_type].append(target)
+            self._in[target][rel_type].append(source)
+            self._edge_order.append((source, rel_type, target))
+
+    # --- backend protocol used by KGInterface.cypher ---
+
+    def run(self, name: str, query: str, params: Dict) -> List[Dict]:
+        with self._lock:
+            if name.startswith("engine.load."):
+                return self._edge_list(name[len("engine.load."):])
+            if name.startswith("schema.create."):
+                return []  # nothing to index in memory
+            handler = self._handlers.get(name)
+            if handler is None:
+                raise UnsupportedQueryError(f"The embedded KG backend does not implement query '{name}'.")
+            return handler(params)
+
+    # --- helpers ---
+
+    def _find(self, label: str, name) -> List[int]:
+        return self._by_name.get((label, name), [])
+
+    def _neighbors(self, node: int, rel_type: str, label: Optional[str] = None, name=None) -> List[int]:
+        result = []
+        for target in self._out[node].get(rel_type, ()):
+            if label is not None and label not in self._labels[target]:
+                continue
+            if name is not None and self._props[target].get("name") != name:
+                continue
+            result.append(target)
+        return result
+
+    def _sources(self, node: int, rel_type: str, label: str) -> List[int]:
+        return [s for s in self._in[node].get(rel_type, ()) if label in self._labels[s]]
+
+    def _name(self, node: Optional[int]):
+        return None if node is None else self._props[node].get("name")
+
+    def _first_label(self, node: Optional[int]):
+        return self._labels[node][0] if node is not None and self._labels[node] else None
+
+    @staticmethod
+    def _distinct(values: Iterable) -> List:
+        seen = set()
+        result = []
+        for value in values:
+            key = tuple(value.items()) if isinstance(value, dict) else value
+            if key not in seen:
+                seen.add(key)
+                result.append(value)
+        return result
+
+    # --- read queries (see the *_QUERY constants in kg_interface.py) ---
+
+    def _methods_for(self, changes: Iterable[int], environment: str) -> Iterable[int]:
+        for change in changes:
+            for method in self._neighbors(change, "DETECTED_BY", "NDTMethod"):
+                if self._neighbors(method, "REQUIRES_ENVIRONMENT", "Environment", environment):
+                    yield method
+
+    def _recommend_ndt_methods(self, p: Dict) -> List[Dict]:
+        methods = []
+        for m in self._find("Material", p["material"]):
+            deteriorations = self._neighbors(m, "HAS_DETERIORATION_MECHANISM", "Deterioration", p["defect"])
+            methods.extend(self._methods_for(deteriorations, p["environment"]))
+            for dm in self._neighbors(m, "HAS_DETERIORATION_MECHANISM", "DeteriorationMechanism", p["defect"]):
+                changes = self._neighbors(dm, "CAUSES_PHYSICAL_CHANGE", "PhysicalChange")
+                methods.extend(self._methods_for(changes, p["environment"]))
+        return [{"method": name} for name in self._distinct(self._name(n) for n in methods)]
+
+    def _recommend_sensors(self, p: Dict) -> List[Dict]:
+        methods = []
+        for d in self._find("Deterioration", p["defect"]):
+            methods.extend(self._neighbors(d, "DETECTED_BY", "NDTMethod"))
+        for dm in self._find("DeteriorationMechanism", p["defect"]):
+            for change in self._neighbors(dm, "CAUSES_PHYSICAL_CHANGE", "PhysicalChange"):
+                methods.extend(self._neighbors(change, "DETECTED_BY", "NDTMethod"))
+        sensors = (self._name(s) for n in methods for s in self._sources(n, "RECOMMENDED_FOR", "Sensor"))
+        return [{"sensor": name} for name in self._distinct(sensors)]
+
+    def _reasoning_subgraph(self, p: Dict) -> List[Dict]:
+        pairs = [(m, d) for m in self._find("Material", p["material"])
+                 for d in self._neighbors(m, "HAS_DETERIORATION_MECHANISM", name=p["defect"])] or [(None, None)]
+        rows = []
+        for m, d in pairs:
+            method_envs = [] if d is None else [
+                (n, e) for n in self._neighbors(d, "DETECTED_BY", "NDTMethod")
+                for e in self._neighbors(n, "REQUIRES_ENVIRONMENT", "Environment", p["environment"])
+            ]
+            for n, e in method_envs or [(None, None)]:
+                sensors = [] if n is None else self._sources(n, "RECOMMENDED_FOR", "Sensor")
+                for s in sensors or [None]:
+                    rows.append({"material": self._name(m), "defect": self._name(d), "method": self._name(n),
+                                 "env": self._name(e), "sensor": self._name(s)})
+        return rows
+
+    def _risks(self, method: int) -> List[Dict]:
+        return [{
+            "riskName": self._props[r].get("name"),
+            "riskDescription": self._props[r].get("riskDescription"),
+            "mitigationSuggestion": self._props[r].get("mitigationSuggestion"),
+        } for r in self._neighbors(method, "hasPotentialRisk", "RiskType")]
+
+    def _first_prop(self, label: str, name, prop: str):
+        return next((self._props[n][prop] for n in self._find(label, name) if self._props[n].get(prop) is not None), None)
+
+    def _rag_context(self, p: Dict) -> List[Dict]:
+        materials = self._find("Material", p.get("material_name"))
+        material = None
+        if materials:
+            props = self._props[materials[0]]
+            material = {"description": props.get("description"), "commonApplications": props.get("commonApplications")}
+        methods = []
+        for method_name in p.get("method_names") or []:
+            found = self._find("NDTMethod", method_name)
+            if not found:
+                continue
+            props = self._props[found[0]]
+            method = {key: props.get(key) for key in ("name", "description", "costEstimate", "methodCategory",
+                                                      "detectionCapabilities", "applicableMaterialsNote", "methodLimitations")}
+            method["risks"] = self._risks(found[0])
+            methods.append(method)
+        return [{
+            "material": material,
+            "deterioration_description": self._first_prop("Deterioration", p.get("defect_name"), "detailedDescription"),
+            "physical_change_description": self._first_prop("PhysicalChange", p.get("defect_name"), "detailedDescription"),
+            "methods": methods,
+        }]
+
+    def _ndt_method_details(self, p: Dict) -> List[Dict]:
+        found = self._find("NDTMethod", p["method_name"])
+        if not found:
+            return []
+        props = self._props[found[0]]
+        row = {key: props.get(key) for key in ("name", "description", "costEstimate", "methodCategory",
+                                               "detectionCapabilities", "applicableMaterialsNote", "methodLimitations")}
+        row["potential_risks"] = self._risks(found[0])
+        return [row]
+
+    def _material_details(self, p: Dict) -> List[Dict]:
+        found = self._find("Material", p["material_name"])
+        if not found:
+            return []
+        props = self._props[found[0]]
+        return [{"name": props.get("name"), "description": props.get("description"),
+                 "commonApplications": props.get("commonApplications")}]
+
+    def _name_and_description(self, label: str, name) -> List[Dict]:
+        found = self._find(label, name)
+        if not found:
+            return []
+        props = self._props[found[0]]
+        return [{"name": props.get("name"), "detailedDescription": props.get("detailedDescription")}]
+
+    def _recommendation_subgraph(self, p: Dict) -> List[Dict]:
+        rows = []
+        for m in self._find("Material", p["material"]):
+            for d in self._neighbors(m, "AFFECTS", "Defect", p["defect"]):
+                method_sensors = [(n, s) for n in self._neighbors(d, "INSPECTED_BY", "NDTMethod")
+                                  for s in self._neighbors(n, "REQUIRES", "Sensor")] or [(None, None)]
+                for n, s in method_sensors:
+                    envs = [] if n is None else self._neighbors(n, "USED_IN", "Environment", p["environment"])
+                    for e in envs or [None]:
+                        rows.append({
+                            "material": self._name(m), "defect": self._name(d), "method": self._name(n),
+                            "sensor": self._name(s), "environment": self._name(e),
+                            "m_label": self._first_label(m), "d_label": self._first_label(d),
+                            "n_label": self._first_label(n), "s_label": self._first_label(s),
+                            "e_label": self._first_label(e),
+                        })
+        return self._distinct(rows)
+
+    def _names(self, label: str) -> List[Dict]:
+        names = {self._props[n].get("name") for n in self._by_label.get(label, ())}
+        return [{"name": name} for name in sorted(n for n in names if n is not None)]
+
+    def _vocabulary(self, p: Dict) -> List[Dict]:
+        rows = []
+        for label in ("Material", "Deterioration", "DeteriorationMechanism", "PhysicalChange", "Environment"):
+            for n in self._by_label.get(label, ()):
+                props = self._props[n]
+                if props.get("name") is not None:
+                    rows.append({"label": label, "name": props["name"], "synonyms": props.get("synonyms") or []})
+        return rows
+
+    def _label_counts(self, p: Dict) -> List[Dict]:
+        counts: Dict = defaultdict(int)
+        for labels in self._labels:
+            counts[labels[0] if labels else None] += 1
+        return [{"label": label, "count": count} for label, count in sorted(counts.items(), key=lambda kv: -kv[1])]
+
+    def _sample_relationships(self, p: Dict) -> List[Dict]:
+        return [{"from": self._first_label(a), "relation": rel_type, "to": self._first_label(b),
+                 "from_name": self._name(a), "to_name": self._name(b)}
+                for a, rel_type, b in self._edge_order[:10]]
+
+    def _edge_list(self, spec_name: str) -> List[Dict]:
+        source_label, rel_type, target_label = EDGE_SPECS[spec_name]
+        rows = []
+        for a in self._by_label.get(source_label, ()):
+            for b in self._neighbors(a, rel_type, target_label):
+                if self._name(a) is not None and self._name(b) is not None:
+                    rows.append({"source": self._name(a), "target": self._name(b)})
+        return self._distinct(rows)
+
+    # --- writes ---
+
+    def _find_plan(self, plan_id: str) -> Optional[int]:
+        return next((n for n in self._by_label.get("InspectionPlan", ()) if self._props[n].get("planID") == plan_id), None)
+
+    def _find_feedback(self, feedback_uuid: str) -> Optional[int]:
+        return next((n for n in self._by_label.get("Feedback", ()) if self._props[n].get("uuid") == feedback_uuid), None)
+
+    def _log_inspection_plan(self, p: Dict) -> List[Dict]:
+        self._write_plans({"rows": [dict(p, timestamp=_now())]})
+        return [{"generatedPlanId": p["plan_id"]}]
+
+    def _log_plan_feedback(self, p: Dict) -> List[Dict]:
+        row = {"plan_id": p["plan_id_param"], "uuid": p["feedback_uuid_param"], "is_helpful": p["is_helpful"],
+               "feedback_text": p.get("feedback_text"), "timestamp": _now()}
+        if not self._write_feedback({"rows": [row]})[0]["written"]:
+            return []
+        return [{"feedback_node_uuid": row["uuid"], "feedback_timestamp": row["timestamp"]}]
+
+    def _write_plans(self, p: Dict) -> List[Dict]:
+        for row in p["rows"]:
+            if self._find_plan(row["plan_id"]) is None:
+                self.add_node(("InspectionPlan",), {
+                    "planID": row["plan_id"], "text": row["plan_text"], "material": row["material"],
+                    "defect": row["defect"], "environment": row["environment"], "timestamp": row["timestamp"],
+                })
+        return [{"written": len(p["rows"])}]
+
+    def _write_feedback(self, p: Dict) -> List[Dict]:
+        written = 0
+        for row in p["rows"]:
+            plan = self._find_plan(row["plan_id"])
+            if plan is None:
+                continue
+            written += 1
+            if self._find_feedback(row["uuid"]) is None:
+                feedback = self.add_node(("Feedback",), {
+                    "uuid": row["uuid"] or str(uuid.uuid4()), "is_helpful": row["is_helpful"],
+                    "comment": row.get("feedback_text"), "timestamp": row["timestamp"],
+                })
+                self.add_edge(feedback, "REFERS_TO_PLAN", plan)
+        return [{"written": written}]
+
+
+_store: Optional[EmbeddedKGStore] = None
+_store_lock = threading.Lock()
+
+
+def get_embedded_store() -> EmbeddedKGStore:
+    """Returns the process-wide embedded store, loading KG_SNAPSHOT_PATH on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = EmbeddedKGStore.from_snapshot(os.getenv("KG_SNAPSHOT_PATH", "kg_export.ttl"),
+                                                   os.getenv("KG_SNAPSHOT_FORMAT") or None)
+    return _store
@@ -1,13 +1,16 @@
 # utils/kg_enrichment.py
-from neo4j import GraphDatabase
 import uuid
+from utils.neo4j_pool import get_driver
+from utils.kg_cache import bump_graph_version
 
 class KGAugmentor:
-    def __init__(self, uri="bolt://localhost:7687", user="neo4j", password="eklil@2017"):
-        self.driver = GraphDatabase.driver(uri, auth=(user, password))
+    def __init__(self, uri=None, user=None, password=None):
+        # Falls back to the NEO4J_* environment settings and reuses the shared driver.
+        self.driver = get_driver(uri, user, password)
 
     def close(self):
-        self.driver.close()
+        # The driver is shared process-wide (see utils/neo4j_pool.py); just drop our reference.
+        self.driver = None
 
     def propose_fact(self, material, defect, method, confidence=0.8, source="LLM inference"):
         """
@@ -55,4 +58,6 @@ class KGAugmentor:
                 source=source,
                 confidence=confidence
             )
-            return True
+        # New reference facts change what KGInterface lookups return
+        bump_graph_version()
+        return True
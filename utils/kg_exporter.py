@@ -89,9 +89,9 @@ def export_kg_to_owl(kg_interface: 'KGInterface', output_file: str = "ndt_kg_exp
         # ProposedFact might also be exported if desired
     }
 
-    # Process nodes
+    # Process nodes (streamed, so memory stays flat however many plans/feedback nodes exist)
     for label, defn in node_definitions.items():
-        nodes_data = kg_interface.cypher(f"MATCH (n:{label}) RETURN n")
+        nodes_data = kg_interface.cypher_stream(f"MATCH (n:{label}) RETURN n", name=f"export.nodes.{label}")
         for record in nodes_data:
             node = record['n']
             node_key_value = node.get(defn["key"])
@@ -148,7 +148,7 @@ def export_kg_to_owl(kg_interface: 'KGInterface', output_file: str = "ndt_kg_exp
         MATCH (a:{start_label})-[r:{rel_type}]->(b:{end_label})
         RETURN a.`{start_key_name}` AS start_node_key, b.`{end_key_name}` AS end_node_key
         """
-        relations_data = kg_interface.cypher(query)
+        relations_data = kg_interface.cypher_stream(query, name=f"export.rels.{rel_type}")
         for rel in relations_data:
             start_node_key_val = rel.get('start_node_key')
             end_node_key_val = rel.get('end_node_key')
@@ -194,7 +194,7 @@ if __name__ == '__main__':
                 if "DETECTED_BY" in key: self.rels_data[key] = self.rels_data.get(key, [])
                 # ... and so on for other relationship types
 
-        def cypher(self, query: str, params: dict = None, log: bool = True):
+        def cypher(self, query: str, params: dict = None, log: bool = True, name: str = None):
             print(f"Mock Cypher: {query} with {params}")
             if query.startswith("MATCH (n:"):
                 label = query.split(":")[1].split(")")[0].strip()
@@ -205,6 +205,9 @@ if __name__ == '__main__':
                     return data
             return []
 
+        def cypher_stream(self, query: str, params: dict = None, fetch_size: int = None, log: bool = True, name: str = None):
+            yield from self.cypher(query, params, log)
+
     # Create a mock KGInterface
     mock_kg = MockKGInterface()
     print("Running exporter with mock KGInterface...")
@@ -0,0 +1,208 @@
+# utils/kg_import.py
+"""
+Bulk import / restore of a KG snapshot (Turtle, RDF/XML or GraphML) into Neo4j.
+
+Snapshot records (utils/kg_snapshot.py) are grouped by label and relationship type and
+written in batched, idempotent UNWIND ... MERGE transactions, so re-running an import or
+resuming after a failure never duplicates nodes or relationships. Nodes are merged on their
+key property (planID, uuid, factId or name, see utils/kg_schema.py), and the schema is
+ensured first so each MERGE is an index lookup.
+
+Usage:
+    python -m utils.kg_import kg_export.ttl
+    python -m utils.kg_import data/kg_dump.graphml --batch-size 5000
+    python -m utils.kg_import ndt_kg.owl --format xml --no-schema
+"""
+import time
+import logging
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from neo4j import WRITE_ACCESS
+
+from utils.kg_cache import bump_graph_version
+from utils.kg_schema import UNIQUE_CONSTRAINTS, ensure_schema
+from utils.kg_snapshot import SnapshotNode, is_identifier, iter_snapshot
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+
+# label -> property nodes of that label are merged on; every other label uses "name"
+KEY_PROPERTIES: Dict[str, str] = {label: prop for _, label, prop in UNIQUE_CONSTRAINTS}
+
+
+def key_property(label: str) -> str:
+    return KEY_PROPERTIES.get(label, "name")
+
+
+def _neo4j_value(value):
+    """Neo4j properties must be primitives (or lists of them); anything else is stored as text."""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_neo4j_value(v) for v in value]
+    return str(value)
+
+
+class KGImporter:
+    def __init__(self, kg, batch_size: int = DEFAULT_BATCH_SIZE, progress_every: float = 5.0):
+        self.kg = kg
+        self.batch_size = batch_size
+        self.progress_every = progress_every
+        # snapshot node id -> (label, key property, key value), to resolve relationship endpoints
+        self._keys: Dict[str, Tuple[str, str, object]] = {}
+        self._node_batches: Dict[Tuple[str, ...], List[Dict]] = defaultdict(list)
+        self._edge_batches: Dict[Tuple, List[Dict]] = defaultdict(list)
+        self._deferred_edges = []
+        self.stats = {"nodes": 0, "relationships": 0, "skipped_nodes": 0, "skipped_relationships": 0}
+        self._started = 0.0
+        self._last_report = 0.0
+
+    # --- Cypher ---
+
+    @staticmethod
+    def _node_query(labels: Tuple[str, ...]) -> str:
+        label = labels[0]
+        extra = "".join(f":`{l}`" for l in labels[1:])
+        set_labels = f"\n        SET n{extra}" if extra else ""
+        return f"""
+        UNWIND $rows AS row
+        MERGE (n:`{label}` {{`{key_property(label)}`: row.key}})
+        SET n += row.props{set_labels}
+        """
+
+    @staticmethod
+    def _edge_query(source_label: str, rel_type: str, target_label: str) -> str:
+        return f"""
+        UNWIND $rows AS row
+        MATCH (a:`{source_label}` {{`{key_property(source_label)}`: row.source}})
+        MATCH (b:`{target_label}` {{`{key_property(target_label)}`: row.target}})
+        MERGE (a)-[r:`{rel_type}`]->(b)
+        SET r += row.props
+        """
+
+    # --- batching ---
+
+    def _flush_nodes(self, labels: Tuple[str, ...]) -> None:
+        rows = self._node_batches.pop(labels, None)
+        if rows:
+            self.kg.cypher(self._node_query(labels), {"rows": rows}, log=False, invalidate_cache=False,
+                           access_mode=WRITE_ACCESS, name=f"import.nodes.{labels[0]}")
+            self.stats["nodes"] += len(rows)
+            self._report()
+
+    def _flush_edges(self, group: Tuple) -> None:
+        rows = self._edge_batches.pop(group, None)
+        if rows:
+            self.kg.cypher(self._edge_query(*group), {"rows": rows}, log=False, invalidate_cache=False,
+                           access_mode=WRITE_ACCESS, name=f"import.rels.{group[1]}")
+            self.stats["relationships"] += len(rows)
+            self._report()
+
+    def _flush_all_nodes(self) -> None:
+        for labels in list(self._node_batches):
+            self._flush_nodes(labels)
+
+    def _report(self, force: bool = False) -> None:
+        now = time.perf_counter()
+        if not force and now - self._last_report < self.progress_every:
+            return
+        self._last_report = now
+        elapsed = max(now - self._started, 1e-9)
+        logger.info(
+            f"Imported {self.stats['nodes']} nodes ({self.stats['nodes'] / elapsed:.0f}/s), "
+            f"{self.stats['relationships']} relationships ({self.stats['relationships'] / elapsed:.0f}/s) "
+            f"in {elapsed:.1f}s."
+        )
+
+    # --- records ---
+
+    def add_node(self, node: SnapshotNode) -> None:
+        labels = tuple(l for l in node.labels if is_identifier(l))
+        if not labels:
+            # Without a label there is no key to MERGE on (e.g. untyped resources in an OWL file)
+            self.stats["skipped_nodes"] += 1
+            return
+        key_prop = key_property(labels[0])
+        key = node.props.get(key_prop)
+        if key is None:
+            self.stats["skipped_nodes"] += 1
+            return
+        self._keys[node.id] = (labels[0], key_prop, key)
+        props = {k: _neo4j_value(v) for k, v in node.props.items() if k != key_prop and v is not None}
+        self._node_batches[labels].append({"key": _neo4j_value(key), "props": props})
+        if len(self._node_batches[labels]) >= self.batch_size:
+            self._flush_nodes(labels)
+
+    def add_edge(self, edge, final: bool = False) -> None:
+        if not is_identifier(edge.type or ""):
+            self.stats["skipped_relationships"] += 1
+            return
+        source, target = self._keys.get(edge.source), self._keys.get(edge.target)
+        if source is None or target is None:
+            if final:
+                self.stats["skipped_relationships"] += 1
+            else:
+                # Endpoint not seen yet (GraphML may list edges before nodes); retried at the end
+                self._deferred_edges.append(edge)
+            return
+        group = (source[0], edge.type, target[0])
+        self._edge_batches[group].append({
+            "source": _neo4j_value(source[2]),
+            "target": _neo4j_value(target[2]),
+            "props": {k: _neo4j_value(v) for k, v in edge.props.items() if v is not None},
+        })
+        if len(self._edge_batches[group]) >= self.batch_size:
+            # Endpoints must exist before the relationships that MATCH them
+            self._flush_all_nodes()
+            self._flush_edges(group)
+
+    def run(self, path: str, fmt: Optional[str] = None) -> Dict[str, int]:
+        self._started = self._last_report = time.perf_counter()
+        for record in iter_snapshot(path, fmt):
+            if isinstance(record, SnapshotNode):
+                self.add_node(record)
+            else:
+                self.add_edge(record)
+        self._flush_all_nodes()
+        deferred, self._deferred_edges = self._deferred_edges, []
+        for edge in deferred:
+            self.add_edge(edge, final=True)
+        for group in list(self._edge_batches):
+            self._flush_edges(group)
+        # Batches were written with invalidate_cache=False; invalidate once for the whole import
+        bump_graph_version()
+        self._report(force=True)
+        self.stats["seconds"] = round(time.perf_counter() - self._started, 2)
+        return self.stats
+
+
+def import_snapshot(kg, path: str, fmt: Optional[str] = None, batch_size: int = DEFAULT_BATCH_SIZE,
+                    with_schema: bool = True) -> Dict[str, int]:
+    """Loads a snapshot into the graph behind `kg` and returns node/relationship counts."""
+    if with_schema:
+        ensure_schema(kg)
+    return KGImporter(kg, batch_size=batch_size).run(path, fmt)
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    from pathlib import Path
+
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+    from kg_interface import KGInterface
+
+    parser = argparse.ArgumentParser(description="Import a Turtle/RDF/GraphML KG snapshot into Neo4j.")
+    parser.add_argument("path", help="Snapshot file (.ttl, .owl/.rdf, .nt or .graphml).")
+    parser.add_argument("--format", dest="fmt", default=None, help="turtle, xml, nt or graphml (default: from extension).")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Rows per UNWIND transaction.")
+    parser.add_argument("--no-schema", action="store_true", help="Skip creating constraints/indexes before loading.")
+    args = parser.parse_args()
+
+    result = import_snapshot(KGInterface(), args.path, args.fmt, args.batch_size, with_schema=not args.no_schema)
+    rate = result["nodes"] / result["seconds"] if result["seconds"] else 0.0
+    print(f"Nodes: {result['nodes']} ({rate:.0f}/s), relationships: {result['relationships']}, "
+          f"skipped: {result['skipped_nodes']} nodes / {result['skipped_relationships']} relationships, "
+          f"{result['seconds']}s")
@@ -0,0 +1,141 @@
+# utils/kg_schema.py
+"""
+Idempotent schema migration for the NDT knowledge graph.
+
+Every lookup in KGInterface matches on a key property ({name: $x}, planID, uuid, factId).
+Without constraints/indexes those lookups are label scans that slow down as plans and
+feedback accumulate. ensure_schema() creates whatever is missing and reports what it did.
+
+Usage:
+    python -m utils.kg_schema            # create missing constraints and indexes
+    python -m utils.kg_schema --dry-run  # only report what is missing
+"""
+import logging
+import threading
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (constraint name, label, key property) -- uniqueness constraints also back the lookup with a range index
+UNIQUE_CONSTRAINTS: List[Tuple[str, str, str]] = [
+    ("material_name_unique", "Material", "name"),
+    ("deterioration_name_unique", "Deterioration", "name"),
+    ("deterioration_mechanism_name_unique", "DeteriorationMechanism", "name"),
+    ("physical_change_name_unique", "PhysicalChange", "name"),
+    ("ndt_method_name_unique", "NDTMethod", "name"),
+    ("environment_name_unique", "Environment", "name"),
+    ("sensor_name_unique", "Sensor", "name"),
+    ("risk_type_name_unique", "RiskType", "name"),
+    ("inspection_plan_id_unique", "InspectionPlan", "planID"),
+    ("feedback_uuid_unique", "Feedback", "uuid"),
+    ("proposed_fact_id_unique", "ProposedFact", "factId"),
+]
+
+# (index name, index type, label, properties) for non-key lookups and ordering
+INDEXES: List[Tuple[str, str, str, Tuple[str, ...]]] = [
+    ("inspection_plan_scenario", "RANGE", "InspectionPlan", ("material", "defect", "environment")),
+    ("inspection_plan_timestamp", "RANGE", "InspectionPlan", ("timestamp",)),
+    ("feedback_timestamp", "RANGE", "Feedback", ("timestamp",)),
+    ("proposed_fact_status", "RANGE", "ProposedFact", ("status",)),
+    # Equality on name is served by the uniqueness constraints above; TEXT indexes serve substring
+    # matches on entity names (CONTAINS / ENDS WITH, e.g. from the Advanced Query box or name search)
+    ("material_name_text", "TEXT", "Material", ("name",)),
+    ("deterioration_name_text", "TEXT", "Deterioration", ("name",)),
+    ("deterioration_mechanism_name_text", "TEXT", "DeteriorationMechanism", ("name",)),
+    ("physical_change_name_text", "TEXT", "PhysicalChange", ("name",)),
+    ("ndt_method_name_text", "TEXT", "NDTMethod", ("name",)),
+    ("environment_name_text", "TEXT", "Environment", ("name",)),
+    ("sensor_name_text", "TEXT", "Sensor", ("name",)),
+]
+
+
+def _existing_schema(kg) -> Tuple[set, set]:
+    """Returns the names and (label, properties) signatures of existing uniqueness constraints and indexes."""
+    constraints = set()
+    for row in kg.cypher("SHOW CONSTRAINTS YIELD name, type, labelsOrTypes, properties", log=False,
+                        name="schema.show_constraints"):
+        if row.get("type") in ("UNIQUENESS", "NODE_PROPERTY_UNIQUENESS", "NODE_KEY") and row.get("labelsOrTypes"):
+            constraints.add((row["labelsOrTypes"][0], tuple(row.get("properties") or ())))
+            constraints.add(row["name"])
+    indexes = set()
+    for row in kg.cypher("SHOW INDEXES YIELD name, type, labelsOrTypes, properties", log=False,
+                        name="schema.show_indexes"):
+        if row.get("labelsOrTypes"):
+            indexes.add((row.get("type"), row["labelsOrTypes"][0], tuple(row.get("properties") or ())))
+        indexes.add(row["name"])
+    return constraints, indexes
+
+
+def ensure_schema(kg, dry_run: bool = False) -> Dict[str, List[str]]:
+    """
+    Creates missing uniqueness constraints and indexes through `kg.cypher`.
+    Returns {"missing": [...], "created": [...], "failed": [...]} with schema object names.
+    """
+    existing_constraints, existing_indexes = _existing_schema(kg)
+    report = {"missing": [], "created": [], "failed": []}
+
+    statements = []
+    for name, label, prop in UNIQUE_CONSTRAINTS:
+        if name in existing_constraints or (label, (prop,)) in existing_constraints:
+            continue
+        statements.append((name, f"CREATE CONSTRAINT {name} IF NOT EXISTS FOR (n:{label}) REQUIRE n.{prop} IS UNIQUE"))
+    for name, index_type, label, props in INDEXES:
+        if name in existing_indexes or (index_type, label, props) in existing_indexes:
+            continue
+        prop_list = ", ".join(f"n.{p}" for p in props)
+        statements.append((name, f"CREATE {index_type} INDEX {name} IF NOT EXISTS FOR (n:{label}) ON ({prop_list})"))
+
+    for name, statement in statements:
+        report["missing"].append(name)
+        if dry_run:
+            continue
+        try:
+            # Schema changes do not affect cached lookups
+            kg.cypher(statement, log=False, invalidate_cache=False, name=f"schema.create.{name}")
+            report["created"].append(name)
+        except Exception as e:
+            # Typically a uniqueness constraint over data that already contains duplicates
+            logger.error(f"Could not create schema object {name}: {e}")
+            report["failed"].append(name)
+
+    if report["missing"]:
+        logger.info(f"KG schema: missing={report['missing']} created={report['created']} failed={report['failed']}")
+    else:
+        logger.info("KG schema: all constraints and indexes present.")
+    return report
+
+
+_schema_checked = False
+_schema_lock = threading.Lock()
+
+
+def ensure_schema_once(kg) -> None:
+    """Runs ensure_schema at most once per process (used at app startup)."""
+    global _schema_checked
+    with _schema_lock:
+        if _schema_checked:
+            return
+        try:
+            ensure_schema(kg)
+        except Exception as e:
+            logger.warning(f"KG schema check skipped: {e}")
+        _schema_checked = True
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    from pathlib import Path
+
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+    from kg_interface import KGInterface
+
+    parser = argparse.ArgumentParser(description="Create missing Neo4j constraints and indexes for the NDT KG.")
+    parser.add_argument("--dry-run", action="store_true", help="Only report missing schema objects.")
+    args = parser.parse_args()
+
+    result = ensure_schema(KGInterface(), dry_run=args.dry_run)
+    print(f"Missing: {', '.join(result['missing']) or 'none'}")
+    if not args.dry_run:
+        print(f"Created: {', '.join(result['created']) or 'none'}")
+        print(f"Failed:  {', '.join(result['failed']) or 'none'}")
@@ -0,0 +1,177 @@
+# utils/kg_snapshot.py
+"""
+Readers for KG snapshots: the Turtle/RDF written by utils/export_kg.py and utils/kg_exporter.py
+(kg_export.ttl, ndt_kg.owl, ...) and GraphML dumps such as apoc.export.graphml.all output.
+
+Both yield the same stream of SnapshotNode / SnapshotEdge records, so the embedded backend
+(utils/kg_embedded.py) and the bulk importer (utils/kg_import.py) share one parser per format.
+Node ids are only meaningful inside one snapshot; edges refer to them.
+"""
+import os
+import re
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterator, NamedTuple, Optional, Tuple, Union
+
+NDT_NS = "http://example.org/ndt#"
+
+# kg_exporter.py writes camelCase object properties; map them back to the relationship types
+# the queries use. hasPotentialRisk is stored under that name in Neo4j, so it stays as is.
+RDF_RELATIONSHIP_TYPES = {
+    "hasDeteriorationMechanism": "HAS_DETERIORATION_MECHANISM",
+    "causesPhysicalChange": "CAUSES_PHYSICAL_CHANGE",
+    "detectedBy": "DETECTED_BY",
+    "recommendedFor": "RECOMMENDED_FOR",
+    "requiresEnvironment": "REQUIRES_ENVIRONMENT",
+    "hasPotentialRisk": "hasPotentialRisk",
+    "refersToPlan": "REFERS_TO_PLAN",
+}
+
+# kg_exporter.py renames a few node properties on export: (label, RDF property) -> Neo4j property
+RDF_PROPERTY_NAMES = {
+    ("InspectionPlan", "factId"): "planID",
+    ("InspectionPlan", "planText"): "text",
+    ("InspectionPlan", "materialName"): "material",
+    ("InspectionPlan", "defectName"): "defect",
+    ("InspectionPlan", "environmentName"): "environment",
+    ("Feedback", "factId"): "uuid",
+}
+
+# Labels and relationship types are spliced into Cypher by the importer, so only plain identifiers are accepted
+IDENTIFIER_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+_GRAPHML_NS = "{http://graphml.graphdrawing.org/xmlns}"
+_GRAPHML_TYPES = {"int": int, "long": int, "float": float, "double": float, "string": str}
+
+
+class SnapshotNode(NamedTuple):
+    id: str
+    labels: Tuple[str, ...]
+    props: Dict
+
+
+class SnapshotEdge(NamedTuple):
+    source: str
+    type: str
+    target: str
+    props: Dict
+
+
+def is_identifier(value: str) -> bool:
+    return bool(value) and bool(IDENTIFIER_RE.match(value))
+
+
+def detect_format(path: str) -> str:
+    """Guesses the snapshot format from the file extension ("graphml" or an rdflib format name)."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".graphml":
+        return "graphml"
+    if ext in (".owl", ".rdf", ".xml"):
+        return "xml"
+    if ext == ".nt":
+        return "nt"
+    return "turtle"
+
+
+def iter_snapshot(path: str, fmt: Optional[str] = None) -> Iterator[Union[SnapshotNode, SnapshotEdge]]:
+    fmt = fmt or detect_format(path)
+    if fmt == "graphml":
+        return iter_graphml(path)
+    return iter_rdf(path, fmt)
+
+
+def _local_name(uri) -> str:
+    uri = str(uri)
+    return re.split(r"[#/]", uri)[-1]
+
+
+def iter_rdf(path: str, fmt: str = "turtle") -> Iterator[Union[SnapshotNode, SnapshotEdge]]:
+    """
+    Yields every node (typed individuals and other resources used as subjects or objects)
+    followed by every edge. rdflib parses the whole document first; the records are then
+    produced one subject at a time.
+    """
+    from rdflib import Graph, Literal, RDF, RDFS, URIRef
+    from rdflib.namespace import OWL
+
+    graph = Graph()
+    graph.parse(path, format=fmt)
+
+    resources = set()
+    for s, p, o in graph:
+        if isinstance(s, URIRef):
+            resources.add(s)
+        if isinstance(o, URIRef) and p != RDF.type:
+            resources.add(o)
+
+    edges = []
+    for subject in sorted(resources, key=str):
+        labels = tuple(sorted(
+            _local_name(cls) for cls in graph.objects(subject, RDF.type)
+            if cls != OWL.NamedIndividual and str(cls).startswith(NDT_NS)
+        ))
+        props: Dict = {}
+        for predicate, obj in graph.predicate_objects(subject):
+            if predicate == RDF.type:
+                continue
+            if isinstance(obj, Literal):
+                if predicate == RDFS.label or str(predicate) == NDT_NS + "name":
+                    props.setdefault("name", str(obj))
+                    continue
+                key = _local_name(predicate)
+                for label in labels:
+                    key = RDF_PROPERTY_NAMES.get((label, key), key)
+                value = obj.toPython()
+                props[key] = value.isoformat() if hasattr(value, "isoformat") else value
+            elif isinstance(obj, URIRef):
+                rel_type = _local_name(predicate)
+                edges.append(SnapshotEdge(str(subject), RDF_RELATIONSHIP_TYPES.get(rel_type, rel_type), str(obj), {}))
+        if "name" not in props and not labels:
+            # Untyped resource (e.g. ex:Cracking in ndt_kg.owl): fall back to its IRI
+            props["name"] = _local_name(subject).replace("_", " ")
+        yield SnapshotNode(str(subject), labels, props)
+
+    yield from edges
+
+
+def _graphml_value(text: Optional[str], attr_type: str):
+    if text is None:
+        return None
+    if attr_type == "boolean":
+        return text.strip().lower() == "true"
+    try:
+        return _GRAPHML_TYPES.get(attr_type, str)(text)
+    except ValueError:
+        return text
+
+
+def _split_labels(value: Optional[str]) -> Tuple[str, ...]:
+    return tuple(label for label in (value or "").split(":") if label)
+
+
+def iter_graphml(path: str) -> Iterator[Union[SnapshotNode, SnapshotEdge]]:
+    """
+    Streams a GraphML file with iterparse, clearing each element once it has been read, so
+    memory stays flat for large dumps. Labels are taken from the `labels` attribute/data key
+    (":Material" as written by APOC) and relationship types from `label`/`type`.
+    """
+    keys: Dict[str, Tuple[str, str]] = {}
+    for _, elem in ET.iterparse(path, events=("end",)):
+        tag = elem.tag.replace(_GRAPHML_NS, "")
+        if tag == "key":
+            keys[elem.get("id")] = (elem.get("attr.name") or elem.get("id"), elem.get("attr.type", "string"))
+        elif tag in ("node", "edge"):
+            data = {}
+            for child in elem:
+                if child.tag.replace(_GRAPHML_NS, "") != "data":
+                    continue
+                attr_name, attr_type = keys.get(child.get("key"), (child.get("key"), "string"))
+                data[attr_name] = _graphml_value(child.text, attr_type)
+            if tag == "node":
+                labels = _split_labels(elem.get("labels") or data.pop("labels", None))
+                data.pop("labels", None)
+                yield SnapshotNode(elem.get("id"), labels, data)
+            else:
+                rel_type = elem.get("label") or data.pop("label", None) or data.pop("type", None)
+                data.pop("label", None)
+                yield SnapshotEdge(elem.get("source"), rel_type, elem.get("target"), data)
+            elem.clear()
@@ -0,0 +1,164 @@
+# utils/kg_telemetry.py
+"""
+Per-query latency telemetry for KGInterface.
+
+Every query is tagged with a stable name (explicit, or "adhoc:<hash>" of its normalised text)
+and its latency, row count and errors are aggregated into a fixed-bucket histogram per name.
+Query text is only logged for slow queries or a small random sample, and the execution plan
+of slow queries can optionally be captured (EXPLAIN, or PROFILE for reads) at most once per
+name per capture interval.
+"""
+import os
+import re
+import time
+import random
+import hashlib
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float("inf"))
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def query_name(query: str, name: Optional[str] = None) -> str:
+    """Returns `name`, or a stable "adhoc:<hash>" name derived from the normalised query text."""
+    if name:
+        return name
+    normalised = _WHITESPACE_RE.sub(" ", query).strip()
+    return "adhoc:" + hashlib.sha1(normalised.encode("utf-8")).hexdigest()[:10]
+
+
+def summarize_plan(plan: Optional[Dict], depth: int = 0) -> str:
+    """Renders a Neo4j plan/profile dict as an indented operator tree."""
+    if not plan:
+        return ""
+    operator = plan.get("operatorType", "?")
+    details = []
+    for key in ("rows", "dbHits"):
+        if plan.get(key) is not None:
+            details.append(f"{key}={plan[key]}")
+    estimated = (plan.get("args") or plan.get("arguments") or {}).get("EstimatedRows")
+    if estimated is not None:
+        details.append(f"estRows={estimated:.0f}" if isinstance(estimated, (int, float)) else f"estRows={estimated}")
+    line = "  " * depth + operator + (f" ({', '.join(details)})" if details else "")
+    children = [summarize_plan(child, depth + 1) for child in plan.get("children") or []]
+    return "\n".join([line] + children)
+
+
+class _QueryStats:
+    __slots__ = ("count", "errors", "rows", "total_ms", "max_ms", "buckets", "slow_samples", "plan", "plan_captured_at")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.rows = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS_MS)
+        self.slow_samples = deque(maxlen=5)
+        self.plan = None
+        self.plan_captured_at = 0.0
+
+    def percentile(self, q: float) -> float:
+        """Approximates the q-quantile latency by the upper bound of the bucket it falls in."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(LATENCY_BUCKETS_MS, self.buckets):
+            seen += n
+            if seen >= target:
+                return bound if bound != float("inf") else self.max_ms
+        return self.max_ms
+
+
+class KGQueryTelemetry:
+    def __init__(self, slow_query_ms: float = 250.0, log_sample_rate: float = 0.01,
+                 capture_plans: bool = False, plan_mode: str = "EXPLAIN", plan_capture_interval: float = 300.0):
+        self.slow_query_ms = slow_query_ms
+        self.log_sample_rate = log_sample_rate
+        self.capture_plans = capture_plans
+        self.plan_mode = plan_mode.upper()
+        self.plan_capture_interval = plan_capture_interval
+        self._stats: Dict[str, _QueryStats] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, latency_ms: float, rows: int = 0, error: bool = False, params: Dict = None) -> None:
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = _QueryStats()
+            stats.count += 1
+            stats.rows += rows
+            stats.total_ms += latency_ms
+            stats.max_ms = max(stats.max_ms, latency_ms)
+            if error:
+                stats.errors += 1
+            for i, bound in enumerate(LATENCY_BUCKETS_MS):
+                if latency_ms <= bound:
+                    stats.buckets[i] += 1
+                    break
+            if latency_ms >= self.slow_query_ms:
+                stats.slow_samples.append({"latency_ms": round(latency_ms, 1), "rows": rows, "params": repr(params)[:300]})
+
+    def is_slow(self, latency_ms: float) -> bool:
+        return latency_ms >= self.slow_query_ms
+
+    def should_log(self, latency_ms: float) -> bool:
+        """Full query text is logged for slow queries and a random sample of the rest."""
+        return self.is_slow(latency_ms) or random.random() < self.log_sample_rate
+
+    def should_capture_plan(self, name: str, latency_ms: float) -> bool:
+        """True at most once per name per capture interval, and only for slow queries."""
+        if not self.capture_plans or not self.is_slow(latency_ms):
+            return False
+        with self._lock:
+            stats = self._stats.get(name)
+            now = time.monotonic()
+            if stats is None or now - stats.plan_captured_at < self.plan_capture_interval:
+                return False
+            stats.plan_captured_at = now
+            return True
+
+    def record_plan(self, name: str, plan_text: str) -> None:
+        with self._lock:
+            if name in self._stats:
+                self._stats[name].plan = plan_text
+
+    def snapshot(self) -> List[Dict]:
+        """One row per query name, slowest total time first."""
+        with self._lock:
+            rows = []
+            for name, s in self._stats.items():
+                rows.append({
+                    "query": name,
+                    "count": s.count,
+                    "errors": s.errors,
+                    "total_ms": round(s.total_ms, 1),
+                    "avg_ms": round(s.total_ms / s.count, 2) if s.count else 0.0,
+                    "p50_ms": s.percentile(0.50),
+                    "p95_ms": s.percentile(0.95),
+                    "p99_ms": s.percentile(0.99),
+                    "max_ms": round(s.max_ms, 1),
+                    "avg_rows": round(s.rows / s.count, 1) if s.count else 0.0,
+                    "slow_samples": list(s.slow_samples),
+                    "plan": s.plan,
+                })
+            return sorted(rows, key=lambda r: r["total_ms"], reverse=True)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+# Shared by every KGInterface/AsyncKGInterface in the process
+kg_telemetry = KGQueryTelemetry(
+    slow_query_ms=float(os.getenv("KG_SLOW_QUERY_MS", "250")),
+    log_sample_rate=float(os.getenv("KG_QUERY_LOG_SAMPLE_RATE", "0.01")),
+    capture_plans=os.getenv("KG_CAPTURE_SLOW_QUERY_PLANS", "0").lower() in ("1", "true", "yes"),
+    plan_mode=os.getenv("KG_QUERY_PLAN_MODE", "EXPLAIN"),
+    plan_capture_interval=float(os.getenv("KG_QUERY_PLAN_CAPTURE_INTERVAL", "300")),
+)
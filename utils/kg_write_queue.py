@@ -0,0 +1,338 @@
+# utils/kg_write_queue.py
+"""
+Write-behind queue for InspectionPlan and Feedback nodes.
+
+log_inspection_plan/log_plan_feedback used to CREATE one node per call on the request path.
+With the queue enabled they only append a row to a local SQLite spool and return; a
+background thread drains the spool into Neo4j in batched UNWIND transactions whenever
+KG_WRITE_BATCH_SIZE rows are pending or every KG_WRITE_FLUSH_INTERVAL seconds. Rows stay
+in the spool until their batch commits, so writes made while Neo4j is unavailable (or
+before a restart) are replayed later. The batch queries MERGE on planID / uuid, which
+makes replaying a batch that already committed harmless.
+
+A batch Neo4j rejects because of its rows (a constraint violation, a bad property value) is
+retried row by row, so one bad row cannot hold back the rest of the spool. The bad row is
+retried on later flushes and, after KG_WRITE_MAX_ATTEMPTS failed attempts, moved to the spool's
+dead_letter table with its last error. Errors that would fail every row alike (connection,
+authentication, permissions, configuration) never count against a row.
+"""
+import os
+import json
+import time
+import atexit
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from neo4j import WRITE_ACCESS, exceptions as neo4j_exceptions
+
+logger = logging.getLogger(__name__)
+
+LOG_DIR = "logs"
+
+# Plans are flushed before feedback so feedback always finds the plan it refers to
+PLAN_KIND = "plan"
+FEEDBACK_KIND = "feedback"
+
+BATCH_CREATE_PLANS_QUERY = """
+    UNWIND $rows AS row
+    MERGE (ip:InspectionPlan {planID: row.plan_id})
+    ON CREATE SET ip.text = row.plan_text,
+                  ip.material = row.material,
+                  ip.defect = row.defect,
+                  ip.environment = row.environment,
+                  ip.timestamp = datetime(row.timestamp)
+    RETURN count(ip) AS written
+"""
+
+BATCH_CREATE_FEEDBACK_QUERY = """
+    UNWIND $rows AS row
+    MATCH (ip:InspectionPlan {planID: row.plan_id})
+    MERGE (f:Feedback {uuid: row.uuid})
+    ON CREATE SET f.is_helpful = row.is_helpful,
+                  f.comment = row.feedback_text,
+                  f.timestamp = datetime(row.timestamp)
+    MERGE (f)-[:REFERS_TO_PLAN]->(ip)
+    RETURN count(f) AS written
+"""
+
+_BATCH_QUERIES = {
+    PLAN_KIND: (BATCH_CREATE_PLANS_QUERY, "write_queue.plans"),
+    FEEDBACK_KIND: (BATCH_CREATE_FEEDBACK_QUERY, "write_queue.feedback"),
+}
+
+
+def write_behind_enabled() -> bool:
+    return os.getenv("KG_WRITE_BEHIND", "1").lower() in ("1", "true", "yes")
+
+
+def _is_row_error(error: Exception) -> bool:
+    """
+    Whether `error` was caused by the rows written (a constraint violation, a bad property value, a
+    malformed payload). Anything else (Neo4j unreachable or busy, authentication, permissions,
+    configuration) would fail every row alike, so it fails the whole flush and the spool is kept.
+    """
+    if isinstance(error, neo4j_exceptions.CypherSyntaxError):
+        return False  # the batch queries are ours: no row can fix them
+    if isinstance(error, (neo4j_exceptions.ConstraintError, neo4j_exceptions.CypherTypeError)):
+        return True
+    if isinstance(error, neo4j_exceptions.Neo4jError):
+        return (error.code or "").startswith(("Neo.ClientError.Statement.", "Neo.ClientError.Schema."))
+    if isinstance(error, (neo4j_exceptions.DriverError, OSError, NotImplementedError)):
+        return False
+    return isinstance(error, (ValueError, TypeError, KeyError))
+
+
+def utc_timestamp() -> str:
+    """Client-side creation time, stored with the row so a delayed flush keeps the real time."""
+    return datetime.now(timezone.utc).isoformat()
+
+
+class KGWriteQueue:
+    def __init__(self, spool_path: str, batch_size: int = 100, flush_interval: float = 1.0,
+                 max_backoff: float = 60.0, max_attempts: int = 5, kg=None):
+        self.spool_path = spool_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self._kg = kg
+        spool_dir = os.path.dirname(spool_path)
+        if spool_dir:
+            os.makedirs(spool_dir, exist_ok=True)
+        # One connection shared by the callers and the flusher thread, serialised by _db_lock
+        self._db = sqlite3.connect(spool_path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pending ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " kind TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " enqueued_at REAL NOT NULL)"
+        )
+        # Rows Neo4j rejected max_attempts times; kept for inspection, never replayed
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS dead_letter ("
+            " id INTEGER PRIMARY KEY,"
+            " kind TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL,"
+            " enqueued_at REAL NOT NULL,"
+            " failed_at REAL NOT NULL,"
+            " error TEXT)"
+        )
+        self._db_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._failures = 0
+        self._written = 0
+        self._thread = threading.Thread(target=self._run, name="kg-write-queue", daemon=True)
+        self._thread.start()
+        pending = self.pending()
+        if pending:
+            logger.info(f"Replaying {pending} spooled KG write(s) from {spool_path}.")
+            self._wakeup.set()
+
+    def enqueue(self, kind: str, payload: Dict) -> None:
+        if kind not in _BATCH_QUERIES:
+            raise ValueError(f"Unknown write kind: {kind}")
+        with self._db_lock:
+            self._db.execute(
+                "INSERT INTO pending (kind, payload, enqueued_at) VALUES (?, ?, ?)",
+                (kind, json.dumps(payload), time.time()),
+            )
+        if self.pending() >= self.batch_size:
+            self._wakeup.set()
+
+    def enqueue_plan(self, plan_id: str, plan_text: str, material: str, defect: str, environment: str) -> str:
+        self.enqueue(PLAN_KIND, {
+            "plan_id": plan_id,
+            "plan_text": plan_text,
+            "material": material,
+            "defect": defect,
+            "environment": environment,
+            "timestamp": utc_timestamp(),
+        })
+        return plan_id
+
+    def enqueue_feedback(self, plan_id: str, feedback_uuid: str, is_helpful: bool, feedback_text: Optional[str] = None) -> None:
+        self.enqueue(FEEDBACK_KIND, {
+            "plan_id": plan_id,
+            "uuid": feedback_uuid,
+            "is_helpful": is_helpful,
+            "feedback_text": feedback_text,
+            "timestamp": utc_timestamp(),
+        })
+
+    def pending(self) -> int:
+        with self._db_lock:
+            return self._db.execute("SELECT count(*) FROM pending").fetchone()[0]
+
+    def dead_letters(self) -> int:
+        with self._db_lock:
+            return self._db.execute("SELECT count(*) FROM dead_letter").fetchone()[0]
+
+    def stats(self) -> Dict:
+        return {"pending": self.pending(), "written": self._written, "consecutive_failures": self._failures,
+                "dead_letter": self.dead_letters()}
+
+    def _get_kg(self):
+        if self._kg is None:
+            from kg_interface import KGInterface  # imported lazily: kg_interface imports this module
+            self._kg = KGInterface()
+        return self._kg
+
+    def _take(self, kind: str, skip: List[int]) -> List:
+        placeholders = ",".join("?" * len(skip))
+        with self._db_lock:
+            return self._db.execute(
+                f"SELECT id, payload FROM pending WHERE kind = ? AND id NOT IN ({placeholders}) ORDER BY id LIMIT ?",
+                (kind, *skip, self.batch_size),
+            ).fetchall()
+
+    def _write(self, kg, kind: str, rows: List) -> int:
+        """Writes `rows` in one transaction and removes them from the spool."""
+        query, name = _BATCH_QUERIES[kind]
+        ids = [row_id for row_id, _ in rows]
+        payloads = [json.loads(payload) for _, payload in rows]
+        result = kg.cypher(query, {"rows": payloads}, log=False, invalidate_cache=False,
+                                       access_mode=WRITE_ACCESS, name=name)
+        placeholders = ",".join("?" * len(ids))
+        with self._db_lock:
+            self._db.execute(f"DELETE FROM pending WHERE id IN ({placeholders})", ids)
+        matched = result[0]["written"] if result else 0
+        if kind == FEEDBACK_KIND and matched < len(ids):
+            logger.warning(f"{len(ids) - matched} feedback row(s) referred to unknown inspection plans and were dropped.")
+        return len(ids)
+
+    def _reject(self, row_id: int, error: Exception) -> bool:
+        """Counts a failed attempt on a row; after max_attempts the row moves to the dead_letter table. True if it stays pending."""
+        with self._db_lock:
+            self._db.execute("UPDATE pending SET attempts = attempts + 1 WHERE id = ?", (row_id,))
+            kind, attempts = self._db.execute("SELECT kind, attempts FROM pending WHERE id = ?", (row_id,)).fetchone()
+            if attempts < self.max_attempts:
+                logger.warning(f"Spooled KG {kind} write {row_id} failed (attempt {attempts}/{self.max_attempts}): {error}")
+                return True
+            self._db.execute("BEGIN")
+            self._db.execute(
+                "INSERT INTO dead_letter (id, kind, payload, attempts, enqueued_at, failed_at, error)"
+                " SELECT id, kind, payload, attempts, enqueued_at, ?, ? FROM pending WHERE id = ?",
+                (time.time(), str(error), row_id),
+            )
+            self._db.execute("DELETE FROM pending WHERE id = ?", (row_id,))
+            self._db.execute("COMMIT")
+        logger.error(f"Spooled KG {kind} write {row_id} failed {attempts} times and was moved to the dead_letter "
+                     f"table of {self.spool_path}: {error}")
+        return False
+
+    def flush(self) -> int:
+        """
+        Writes every pending row in batches, plans first. Returns the number of rows written.
+        Raises if the write fails for every row alike (Neo4j unreachable, authentication,
+        permissions, configuration; see _is_row_error); the rows stay spooled for the next flush.
+        A batch rejected because of its rows is written row by row and the failing rows are
+        counted (see _reject).
+        """
+        written = 0
+        with self._flush_lock:
+            if not self.pending():
+                return 0
+            # Outside the per-row handling: failing to connect is never a row's fault
+            kg = self._get_kg()
+            try:
+                for kind in (PLAN_KIND, FEEDBACK_KIND):
+                    rejected: List[int] = []
+                    while True:
+                        rows = self._take(kind, rejected)
+                        if not rows:
+                            break
+                        if len(rows) > 1:
+                            try:
+                                written += self._write(kg, kind, rows)
+                                continue
+                            except Exception as e:
+                                if not _is_row_error(e):
+                                    raise
+                        # A single bad row fails its whole batch: write the rows one by one to isolate it
+                        for row in rows:
+                            try:
+                                written += self._write(kg, kind, [row])
+                            except Exception as e:
+                                if not _is_row_error(e):
+                                    raise
+                                if self._reject(row[0], e):
+                                    rejected.append(row[0])
+                    if rejected:
+                        # Feedback waits until the rejected plans are written or dead-lettered, so it
+                        # isn't dropped for a plan that a later flush may still write
+                        break
+            finally:
+                self._written += written
+        return written
+
+    def _run(self) -> None:
+        delay = self.flush_interval
+        while not self._stopped.is_set():
+            self._wakeup.wait(delay)
+            self._wakeup.clear()
+            if self._stopped.is_set():
+                break
+            try:
+                written = self.flush()
+                if written:
+                    logger.info(f"Flushed {written} spooled KG write(s).")
+                self._failures = 0
+                delay = self.flush_interval
+            except Exception as e:
+                # Neo4j down or the driver could not be created: keep the rows and back off
+                self._failures += 1
+                delay = min(self.flush_interval * (2 ** self._failures), self.max_backoff)
+                logger.warning(f"KG write flush failed ({self.pending()} pending), retrying in {delay:.1f}s: {e}")
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Stops the flusher and makes one last flush attempt; unwritten rows stay in the spool."""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._wakeup.set()
+        self._thread.join(timeout)
+        try:
+            self.flush()
+        except Exception as e:
+            logger.warning(f"Final KG write flush failed, {self.pending()} write(s) kept in {self.spool_path}: {e}")
+        with self._db_lock:
+            self._db.close()
+
+
+_queue: Optional[KGWriteQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_write_queue() -> KGWriteQueue:
+    """Returns the process-wide write queue, creating it (and replaying its spool) on first use."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = KGWriteQueue(
+                spool_path=os.getenv("KG_WRITE_SPOOL_PATH", os.path.join(LOG_DIR, "kg_write_spool.sqlite")),
+                batch_size=int(os.getenv("KG_WRITE_BATCH_SIZE", "100")),
+                flush_interval=float(os.getenv("KG_WRITE_FLUSH_INTERVAL", "1.0")),
+                max_attempts=int(os.getenv("KG_WRITE_MAX_ATTEMPTS", "5")),
+            )
+    return _queue
+
+
+def close_write_queue() -> None:
+    global _queue
+    with _queue_lock:
+        queue, _queue = _queue, None
+    if queue is not None:
+        queue.close()
+
+
+# Registered after utils.neo4j_pool's close_all_drivers, so it runs before the drivers close
+atexit.register(close_write_queue)
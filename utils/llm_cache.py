@@ -0,0 +1,145 @@
+# utils/llm_cache.py
+"""
+Disk-backed, content-addressed cache of LLM responses for BaseAgent.
+
+The key is a SHA-256 over the model, temperature, generation options (num_predict, num_ctx), a
+hash of the system prompt and the exact message list sent, so a hit can only return what the
+same prompt and settings produced before. Entries
+live in a SQLite file, expire after a TTL and are evicted least-recently-used once the
+stored responses exceed a size budget.
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+LOG_DIR = "logs"
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def make_cache_key(model: str, temperature: float, system_prompt: str, messages: List,
+                   options: Optional[Dict] = None) -> str:
+    payload = {
+        "model": model,
+        "temperature": temperature,
+        "options": options or {},
+        "system_prompt": _sha256(system_prompt or ""),
+        "messages": [(getattr(m, "type", type(m).__name__), m.content) for m in messages],
+    }
+    return _sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False))
+
+
+class LLMResponseCache:
+    def __init__(self, path: str, ttl_seconds: float = 7 * 24 * 3600, max_bytes: int = 64 * 1024 * 1024,
+                 enabled: bool = True):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = None
+        if enabled:
+            cache_dir = os.path.dirname(path)
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " model TEXT,"
+                " response TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                if row is not None:
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, response: str, model: str = None) -> None:
+        if not self.enabled:
+            return
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created_at, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, size, now, now),
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        """Drops expired entries, then least-recently-used ones until the size budget is met."""
+        self._db.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        freed = 0
+        victims = []
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY last_access"):
+            victims.append((key,))
+            freed += size
+            if total - freed <= self.max_bytes:
+                break
+        self._db.executemany("DELETE FROM responses WHERE key = ?", victims)
+
+    def clear(self) -> None:
+        if self.enabled:
+            with self._lock:
+                self._db.execute("DELETE FROM responses")
+
+    def stats(self) -> Dict:
+        entries, total = 0, 0
+        if self.enabled:
+            with self._lock:
+                entries, total = self._db.execute("SELECT count(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"enabled": self.enabled, "hits": self.hits, "misses": self.misses, "entries": entries, "bytes": total}
+
+
+_cache: Optional[LLMResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMResponseCache:
+    """Returns the process-wide response cache configured from the LLM_CACHE_* environment variables."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMResponseCache(
+                path=os.getenv("LLM_CACHE_PATH", os.path.join(LOG_DIR, "llm_cache.sqlite")),
+                ttl_seconds=float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600))),
+                max_bytes=int(float(os.getenv("LLM_CACHE_MAX_MB", "64")) * 1024 * 1024),
+                enabled=os.getenv("LLM_CACHE_ENABLED", "1").lower() in ("1", "true", "yes"),
+            )
+    return _cache
+
+
+def cache_bypassed(agent_name: str) -> bool:
+    """Agents listed in LLM_CACHE_BYPASS (comma separated class names) always call the model."""
+    bypass = {name.strip() for name in os.getenv("LLM_CACHE_BYPASS", "").split(",") if name.strip()}
+    return agent_name in bypass
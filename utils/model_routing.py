@@ -0,0 +1,96 @@
+# utils/model_routing.py
+"""
+Which Ollama model (and which generation parameters) serves each agent task.
+
+Every LLM call belongs to a task: planning, react, tool_selection, extraction, critique,
+risk, forecast or ontology. A task's route is the "default" route overlaid with the task's own
+entry, so a deployment only lists what differs. Settings are applied in increasing priority:
+
+1. The built-in ROUTES below.
+2. A JSON file named by MODEL_ROUTING_PATH, e.g.
+       {"default": {"model": "mistral", "num_ctx": 8192},
+        "extraction": {"model": "qwen2.5:1.5b", "num_predict": 128}}
+3. OLLAMA_MODEL for the default model, OLLAMA_MODEL_<TASK> (e.g. OLLAMA_MODEL_EXTRACTION)
+   for a single task, and OLLAMA_KEEP_ALIVE for how long the default route's model stays loaded.
+
+Route keys: model, temperature, num_ctx, num_predict, keep_alive. An agent's explicit model,
+temperature or num_predict argument takes precedence over its route. Keys left unset fall back to
+the agent's defaults (temperature 0.1, AGENT_NUM_PREDICT) or to the Ollama server's defaults.
+"""
+import os
+import json
+import logging
+import threading
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "mistral"
+# Ollama unloads an idle model after 5 minutes by default; keep ours resident between requests
+DEFAULT_KEEP_ALIVE = "30m"
+ROUTE_KEYS = ("model", "temperature", "num_ctx", "num_predict", "keep_alive")
+
+ROUTES: Dict[str, Dict] = {
+    "default": {"model": DEFAULT_MODEL, "keep_alive": DEFAULT_KEEP_ALIVE},
+    # Plans, risks and axioms should come out the same for the same input; critique stays fairly consistent
+    "planning": {"temperature": 0.0},
+    "risk": {"temperature": 0.0},
+    "ontology": {"temperature": 0.0},
+    "critique": {"temperature": 0.1},
+    # A JSON object with three short fields: deterministic and a small output budget
+    "extraction": {"temperature": 0.0, "num_predict": 128},
+}
+
+_routes: Optional[Dict[str, Dict]] = None
+_lock = threading.Lock()
+
+
+def _load_routes() -> Dict[str, Dict]:
+    routes = {task: dict(route) for task, route in ROUTES.items()}
+    path = os.getenv("MODEL_ROUTING_PATH")
+    if path:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                overrides = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error(f"Could not read model routing config {path}: {e}; using the built-in routes.")
+            overrides = {}
+        for task, route in overrides.items():
+            unknown = set(route) - set(ROUTE_KEYS)
+            if unknown:
+                logger.warning(f"Model route '{task}' in {path} has unknown keys: {', '.join(sorted(unknown))}")
+            routes.setdefault(task, {}).update({k: v for k, v in route.items() if k in ROUTE_KEYS})
+    if os.getenv("OLLAMA_MODEL"):
+        routes["default"]["model"] = os.getenv("OLLAMA_MODEL")
+    if os.getenv("OLLAMA_KEEP_ALIVE"):
+        routes["default"]["keep_alive"] = os.getenv("OLLAMA_KEEP_ALIVE")
+    for name, value in os.environ.items():
+        if name.startswith("OLLAMA_MODEL_") and value:
+            routes.setdefault(name[len("OLLAMA_MODEL_"):].lower(), {})["model"] = value
+    return routes
+
+
+def get_route(task: str) -> Dict:
+    """Effective settings for `task`: the default route overlaid with the task's own entry."""
+    global _routes
+    with _lock:
+        if _routes is None:
+            _routes = _load_routes()
+        route = dict(_routes["default"])
+        route.update(_routes.get(task, {}))
+    return route
+
+
+def configured_routes() -> Dict[str, Dict]:
+    """Effective route of "default" and of every task with its own entry (the rest use the default)."""
+    get_route("default")  # loads the routes on first use
+    with _lock:
+        tasks = list(_routes)
+    return {task: get_route(task) for task in tasks}
+
+
+def reload_routes() -> None:
+    """Re-reads the routing config and environment; agents built afterwards use the new routes."""
+    global _routes
+    with _lock:
+        _routes = None
@@ -0,0 +1,129 @@
+# utils/neo4j_pool.py
+"""
+Process-wide registry of Neo4j drivers.
+
+A neo4j Driver already owns a thread-safe connection pool, so the whole process only
+needs one per (uri, user). Every KGInterface, KGAugmentor and exporter asks this module
+for its driver instead of opening (and verifying) a fresh one on each Streamlit rerun.
+"""
+import os
+import atexit
+import asyncio
+import logging
+import threading
+import weakref
+from typing import Dict, Optional, Tuple
+
+from neo4j import AsyncGraphDatabase, GraphDatabase
+
+from utils.event_loop import on_loop_close
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_URI = "bolt://localhost:7687"
+DEFAULT_USER = "neo4j"
+DEFAULT_PASSWORD = "eklil@2017"
+
+_drivers: Dict[Tuple[str, str, str], object] = {}
+_lock = threading.Lock()
+# Async drivers are tied to the event loop they were created on, so they are kept per loop
+_async_drivers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[str, str, str], object]]" = weakref.WeakKeyDictionary()
+
+
+def get_connection_settings() -> Tuple[str, str, str]:
+    """Returns (uri, user, password) from the NEO4J_* environment variables."""
+    return (
+        os.getenv("NEO4J_URI", DEFAULT_URI),
+        os.getenv("NEO4J_USER", DEFAULT_USER),
+        os.getenv("NEO4J_PASSWORD", DEFAULT_PASSWORD),
+    )
+
+
+def _pool_config() -> Dict:
+    """Driver pool settings, overridable per deployment through the environment."""
+    return {
+        "max_connection_pool_size": int(os.getenv("NEO4J_MAX_POOL_SIZE", "50")),
+        "max_connection_lifetime": float(os.getenv("NEO4J_MAX_CONNECTION_LIFETIME", "3600")),
+        "connection_acquisition_timeout": float(os.getenv("NEO4J_CONNECTION_ACQUISITION_TIMEOUT", "60")),
+        # Managed transactions are retried by KGInterface.cypher with its own bounded backoff;
+        # don't let the driver add a second (up to 30 s) retry loop underneath it.
+        "max_transaction_retry_time": 0.0,
+    }
+
+
+def get_driver(uri: Optional[str] = None, user: Optional[str] = None, password: Optional[str] = None):
+    """
+    Returns the shared driver for the given credentials, creating it on first use.
+    Connectivity is verified once, when the driver is created, not on every call.
+    """
+    env_uri, env_user, env_password = get_connection_settings()
+    key = (uri or env_uri, user or env_user, password or env_password)
+
+    with _lock:
+        driver = _drivers.get(key)
+        if driver is None:
+            driver = GraphDatabase.driver(key[0], auth=(key[1], key[2]), **_pool_config())
+            try:
+                driver.verify_connectivity()
+            except Exception:
+                driver.close()
+                raise
+            _drivers[key] = driver
+            logger.info(f"Created shared Neo4j driver for {key[0]} (user: {key[1]}).")
+    return driver
+
+
+async def get_async_driver(uri: Optional[str] = None, user: Optional[str] = None, password: Optional[str] = None):
+    """
+    Async counterpart of get_driver: returns the shared AsyncDriver for the running event loop,
+    creating and verifying it on first use.
+    """
+    env_uri, env_user, env_password = get_connection_settings()
+    key = (uri or env_uri, user or env_user, password or env_password)
+    loop = asyncio.get_running_loop()
+
+    with _lock:
+        loop_drivers = _async_drivers.setdefault(loop, {})
+        driver = loop_drivers.get(key)
+        created = driver is None
+        if created:
+            driver = AsyncGraphDatabase.driver(key[0], auth=(key[1], key[2]), **_pool_config())
+            loop_drivers[key] = driver
+    if created:
+        try:
+            await driver.verify_connectivity()
+        except Exception:
+            with _lock:
+                loop_drivers.pop(key, None)
+            await driver.close()
+            raise
+        logger.info(f"Created shared async Neo4j driver for {key[0]} (user: {key[1]}).")
+    return driver
+
+
+async def close_async_drivers() -> None:
+    """Closes the async drivers that belong to the running event loop."""
+    with _lock:
+        loop_drivers = _async_drivers.pop(asyncio.get_running_loop(), {})
+    for driver in loop_drivers.values():
+        try:
+            await driver.close()
+        except Exception as e:
+            logger.warning(f"Error while closing async Neo4j driver: {e}")
+
+
+def close_all_drivers() -> None:
+    """Closes every shared driver. Safe to call more than once."""
+    with _lock:
+        drivers = list(_drivers.values())
+        _drivers.clear()
+    for driver in drivers:
+        try:
+            driver.close()
+        except Exception as e:
+            logger.warning(f"Error while closing Neo4j driver: {e}")
+
+
+atexit.register(close_all_drivers)
+# Async drivers are closed on their own loop before it is closed (utils/event_loop.py)
+on_loop_close(close_async_drivers)
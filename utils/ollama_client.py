@@ -0,0 +1,364 @@
+# utils/ollama_client.py
+"""
+Shared Ollama client layer.
+
+OllamaChat is a small LangChain chat model that calls Ollama's /api/chat itself, so it owns the
+HTTP layer instead of overriding ChatOllama internals. Requests go over pooled connections: one
+requests.Session per process and one aiohttp.ClientSession per event loop, shared by every agent.
+It reads the timing fields of Ollama's final stream message, so each call reports how long the
+model took to load versus to evaluate the prompt and generate (see OllamaTelemetry).
+
+warm_up() preloads the models named by the routes in utils/model_routing.py, with the route's
+num_ctx (Ollama reloads a model whose context size changes) and keep_alive, so the first real
+request doesn't pay the cold load and the model stays resident between requests.
+"""
+import os
+import json
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple, Union
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, ChatMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from utils.event_loop import on_loop_close
+from utils.model_routing import configured_routes, get_route
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = "http://localhost:11434"
+
+# Ollama reports durations in nanoseconds
+_TIMING_FIELDS = {
+    "load_duration": "load_ms",
+    "prompt_eval_duration": "prompt_eval_ms",
+    "eval_duration": "eval_ms",
+    "total_duration": "total_ms",
+}
+
+# LangChain message type -> Ollama chat role
+_ROLES = {"system": "system", "human": "user", "ai": "assistant", "tool": "tool"}
+
+
+def base_url() -> str:
+    return os.getenv("OLLAMA_BASE_URL", DEFAULT_BASE_URL).rstrip("/")
+
+
+def _pool_size() -> int:
+    return int(os.getenv("OLLAMA_POOL_SIZE", "16"))
+
+
+def call_timings(info: Optional[Dict]) -> Dict:
+    """Load/prompt-eval/eval times (ms) and token counts from the final message of an Ollama stream."""
+    if not info:
+        return {}
+    timings = {name: round(info[field] / 1e6, 1) for field, name in _TIMING_FIELDS.items() if info.get(field)}
+    for field in ("prompt_eval_count", "eval_count"):
+        if info.get(field) is not None:
+            timings[field] = info[field]
+    if info.get("eval_count") and info.get("eval_duration"):
+        timings["tokens_per_s"] = round(info["eval_count"] / (info["eval_duration"] / 1e9), 1)
+    return timings
+
+
+class _ModelStats:
+    __slots__ = ("calls", "cold_loads", "load_ms", "max_load_ms", "prompt_eval_ms", "eval_ms", "eval_tokens")
+
+    def __init__(self):
+        self.calls = 0
+        self.cold_loads = 0
+        self.load_ms = 0.0
+        self.max_load_ms = 0.0
+        self.prompt_eval_ms = 0.0
+        self.eval_ms = 0.0
+        self.eval_tokens = 0
+
+
+class OllamaTelemetry:
+    """Per-model split of Ollama call time into model load, prompt evaluation and generation."""
+
+    def __init__(self, cold_load_ms: float = 1000.0):
+        # A load slower than this means the model wasn't resident
+        self.cold_load_ms = cold_load_ms
+        self._stats: Dict[str, _ModelStats] = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, timings: Dict) -> None:
+        load_ms = timings.get("load_ms", 0.0)
+        cold = load_ms >= self.cold_load_ms
+        with self._lock:
+            stats = self._stats.get(model)
+            if stats is None:
+                stats = self._stats[model] = _ModelStats()
+            stats.calls += 1
+            stats.cold_loads += int(cold)
+            stats.load_ms += load_ms
+            stats.max_load_ms = max(stats.max_load_ms, load_ms)
+            stats.prompt_eval_ms += timings.get("prompt_eval_ms", 0.0)
+            stats.eval_ms += timings.get("eval_ms", 0.0)
+            stats.eval_tokens += timings.get("eval_count", 0)
+        message = (f"Ollama {model}: load {load_ms:.0f} ms, prompt eval {timings.get('prompt_eval_ms', 0.0):.0f} ms "
+                   f"({timings.get('prompt_eval_count', 0)} tok), eval {timings.get('eval_ms', 0.0):.0f} ms "
+                   f"({timings.get('eval_count', 0)} tok)")
+        if cold:
+            logger.warning(message + " (cold load)")
+        else:
+            logger.info(message)
+
+    def snapshot(self) -> List[Dict]:
+        """One row per model, most load time first."""
+        with self._lock:
+            rows = []
+            for model, s in self._stats.items():
+                rows.append({
+                    "model": model,
+                    "calls": s.calls,
+                    "cold_loads": s.cold_loads,
+                    "load_ms": round(s.load_ms, 1),
+                    "max_load_ms": round(s.max_load_ms, 1),
+                    "prompt_eval_ms": round(s.prompt_eval_ms, 1),
+                    "eval_ms": round(s.eval_ms, 1),
+                    "avg_eval_ms": round(s.eval_ms / s.calls, 1) if s.calls else 0.0,
+                    "tokens_per_s": round(s.eval_tokens / (s.eval_ms / 1000), 1) if s.eval_ms else 0.0,
+                })
+            return sorted(rows, key=lambda r: r["load_ms"], reverse=True)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+# Shared by every OllamaChat in the process
+ollama_telemetry = OllamaTelemetry(cold_load_ms=float(os.getenv("OLLAMA_COLD_LOAD_MS", "1000")))
+
+_session: Optional[requests.Session] = None
+# aiohttp sessions are tied to the event loop they were created on, so they are kept per loop
+_async_sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aiohttp.ClientSession]" = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Process-wide requests.Session; its connection pool is shared by every synchronous Ollama call."""
+    global _session
+    with _lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=_pool_size())
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+    return _session
+
+
+def get_async_session() -> aiohttp.ClientSession:
+    """The aiohttp.ClientSession of the running event loop, created on first use."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        session = _async_sessions.get(loop)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=_pool_size()))
+            _async_sessions[loop] = session
+    return session
+
+
+async def close_async_session() -> None:
+    """Closes the running event loop's session; runs automatically before a SessionLoop or event_loop.run() loop closes."""
+    with _lock:
+        session = _async_sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
+
+
+on_loop_close(close_async_session)
+
+
+def _role(message: BaseMessage) -> str:
+    if isinstance(message, ChatMessage):
+        return message.role
+    return _ROLES.get(message.type, message.type)
+
+
+def _content(message: BaseMessage) -> str:
+    if isinstance(message.content, str):
+        return message.content
+    # Multi-part content: only the text parts are sent
+    return "".join(part if isinstance(part, str) else part.get("text", "") for part in message.content)
+
+
+class OllamaChat(BaseChatModel):
+    """
+    Chat model over Ollama's /api/chat, sent through the shared connection pools and recording
+    per-call timings in ollama_telemetry. Per-call `format`, `keep_alive` and `options` can be
+    passed as keyword arguments or bound (llm.bind(format=schema)).
+    """
+
+    model: str
+    base_url: str = DEFAULT_BASE_URL
+    temperature: Optional[float] = None
+    num_predict: Optional[int] = None
+    num_ctx: Optional[int] = None
+    keep_alive: Optional[Union[int, str]] = None
+    # "json" or a JSON schema
+    format: Optional[Union[str, Dict]] = None
+    stop: Optional[List[str]] = None
+    # Seconds per request; None waits indefinitely
+    timeout: Optional[float] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "ollama-chat"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model": self.model, "temperature": self.temperature, "num_predict": self.num_predict,
+                "num_ctx": self.num_ctx, "keep_alive": self.keep_alive, "format": self.format}
+
+    def _payload(self, messages: List[BaseMessage], stop: Optional[List[str]], stream: bool, **kwargs: Any) -> Dict:
+        options = {name: value for name, value in (("temperature", self.temperature), ("num_predict", self.num_predict),
+                                                   ("num_ctx", self.num_ctx)) if value is not None}
+        stop = stop if stop is not None else self.stop
+        if stop:
+            options["stop"] = stop
+        options.update(kwargs.get("options") or {})
+        payload = {
+            "model": self.model,
+            "messages": [{"role": _role(m), "content": _content(m)} for m in messages],
+            "stream": stream,
+            "options": options,
+        }
+        fmt = kwargs.get("format", self.format)
+        if fmt:
+            payload["format"] = fmt
+        keep_alive = kwargs.get("keep_alive", self.keep_alive)
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+        return payload
+
+    def _check_status(self, status: int, detail: str) -> None:
+        if status == 404:
+            raise ValueError(f"Ollama call failed with status code 404. Maybe the model is not found "
+                             f"and you should pull it with `ollama pull {self.model}`.")
+        if status != 200:
+            raise ValueError(f"Ollama call failed with status code {status}. Details: {detail}")
+
+    def _chunk(self, line: Union[str, bytes]) -> Optional[ChatGenerationChunk]:
+        """One streamed message; the final one ("done": true) carries the call's metadata and timings."""
+        if not line.strip():
+            return None
+        data = json.loads(line)
+        if "error" in data:
+            raise ValueError(f"Ollama call failed: {data['error']}")
+        content = data.pop("message", {}).get("content", "")
+        info = None
+        if data.get("done"):
+            info = data
+            timings = call_timings(info)
+            if timings:
+                ollama_telemetry.record(self.model, timings)
+        return ChatGenerationChunk(message=AIMessageChunk(content=content), generation_info=info)
+
+    @staticmethod
+    def _result(chunks: List[ChatGenerationChunk]) -> ChatResult:
+        if not chunks:
+            raise ValueError("Ollama returned an empty response.")
+        final = chunks[0]
+        for chunk in chunks[1:]:
+            final += chunk
+        message = AIMessage(content=final.message.content, response_metadata=final.generation_info or {})
+        return ChatResult(generations=[ChatGeneration(message=message, generation_info=final.generation_info)])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        with get_session().post(f"{self.base_url}/api/chat", json=self._payload(messages, stop, True, **kwargs),
+                                stream=True, timeout=self.timeout) as response:
+            response.encoding = "utf-8"
+            self._check_status(response.status_code, response.text if response.status_code != 200 else "")
+            for line in response.iter_lines(decode_unicode=True):
+                chunk = self._chunk(line)
+                if chunk is None:
+                    continue
+                if run_manager and chunk.text:
+                    run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        timeout = aiohttp.ClientTimeout(total=self.timeout) if self.timeout else None
+        async with get_async_session().post(f"{self.base_url}/api/chat",
+                                            json=self._payload(messages, stop, True, **kwargs),
+                                            timeout=timeout) as response:
+            self._check_status(response.status, await response.text() if response.status != 200 else "")
+            async for line in response.content:
+                chunk = self._chunk(line)
+                if chunk is None:
+                    continue
+                if run_manager and chunk.text:
+                    await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        return self._result(list(self._stream(messages, stop, run_manager, **kwargs)))
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        return self._result([chunk async for chunk in self._astream(messages, stop, run_manager, **kwargs)])
+
+
+def warm_up_targets(tasks: Optional[List[str]] = None) -> List[Tuple[str, Optional[int], Any]]:
+    """Distinct (model, num_ctx, keep_alive) over the routes of `tasks` (default: every configured route)."""
+    routes = [get_route(task) for task in tasks] if tasks is not None else configured_routes().values()
+    targets = []
+    for route in routes:
+        target = (route["model"], route.get("num_ctx"), route.get("keep_alive"))
+        if target not in targets:
+            targets.append(target)
+    return targets
+
+
+def warm_up(targets: Optional[List[Tuple[str, Optional[int], Any]]] = None) -> Dict[str, Optional[float]]:
+    """
+    Loads each target model into Ollama (an empty prompt loads without generating) and keeps it
+    resident for its keep_alive. Returns model -> load seconds, or None where loading failed.
+    """
+    results = {}
+    for model, num_ctx, keep_alive in targets if targets is not None else warm_up_targets():
+        request = {"model": model, "prompt": "", "stream": False}
+        if num_ctx:
+            request["options"] = {"num_ctx": num_ctx}
+        if keep_alive is not None:
+            request["keep_alive"] = keep_alive
+        started = time.perf_counter()
+        try:
+            response = get_session().post(f"{base_url()}/api/generate", json=request,
+                                          timeout=float(os.getenv("OLLAMA_WARMUP_TIMEOUT", "300")))
+            response.raise_for_status()
+        except requests.RequestException as e:
+            logger.warning(f"Could not preload Ollama model {model}: {e}")
+            results[model] = None
+            continue
+        results[model] = round(time.perf_counter() - started, 2)
+        logger.info(f"Preloaded Ollama model {model} in {results[model]}s (keep_alive {keep_alive}).")
+    return results
+
+
+_warm_up_started = False
+
+
+def warm_up_once() -> bool:
+    """Starts warm_up() in a background thread, once per process. Returns True if it started it."""
+    global _warm_up_started
+    with _lock:
+        if _warm_up_started:
+            return False
+        _warm_up_started = True
+    threading.Thread(target=warm_up, name="ollama-warm-up", daemon=True).start()
+    return True
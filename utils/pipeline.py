@@ -0,0 +1,151 @@
+# utils/pipeline.py
+"""
+Small DAG orchestrator for the agent stages of the planner tabs.
+
+Each stage declares the stages it depends on and receives their results; stages whose
+dependencies are satisfied run concurrently on the event loop. Coroutine functions are
+awaited directly, plain functions (the synchronous KGInterface lookups) run in a worker
+thread so they don't block the loop. `on_done` callbacks run on the loop thread, i.e. the
+Streamlit script thread, so they can render each stage's output as soon as it is ready.
+
+A stage that exceeds its timeout is cancelled, recorded as "timed out" and yields its fallback
+value, so the stages after it still run. Cancelling a threaded stage only stops waiting for it;
+the thread itself finishes in the background.
+"""
+import time
+import asyncio
+import inspect
+import logging
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from utils.agent_limits import is_timeout
+
+logger = logging.getLogger(__name__)
+
+
+TIMED_OUT = "timed out"
+
+
+def _reports_timeout(value: Any) -> bool:
+    """Agents answer a missed deadline in-band (utils/agent_limits.py); such stages count as timed out too."""
+    if isinstance(value, str):
+        return is_timeout(value)
+    if isinstance(value, dict):
+        return any(is_timeout(v) for v in value.values() if isinstance(v, str))
+    return False
+
+
+class Stage:
+    __slots__ = ("name", "func", "deps", "on_done", "optional", "timeout", "fallback")
+
+    def __init__(self, name: str, func: Callable[[Dict[str, Any]], Any], deps: Iterable[str] = (),
+                 on_done: Optional[Callable[[Any], None]] = None, optional: bool = False,
+                 timeout: Optional[float] = None, fallback: Any = None):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.on_done = on_done
+        # An optional stage that fails yields None instead of failing the whole run
+        self.optional = optional
+        # Seconds before the stage is cancelled and `fallback` used as its result (None: the pipeline default)
+        self.timeout = timeout
+        self.fallback = fallback
+
+
+class PipelineRun:
+    def __init__(self, results: Dict[str, Any], timings: Dict[str, Dict[str, Any]], total_seconds: float):
+        self.results = results
+        self.timings = timings
+        self.total_seconds = total_seconds
+
+    def timing_rows(self) -> List[Dict[str, Any]]:
+        """One row per stage in start order, for display."""
+        return [dict(stage=name, **timing) for name, timing in sorted(self.timings.items(), key=lambda kv: kv[1]["start"])]
+
+
+class Pipeline:
+    def __init__(self, name: str = "pipeline", stage_timeout: Optional[float] = None):
+        self.name = name
+        # Default deadline for stages that don't set their own (None: wait indefinitely)
+        self.stage_timeout = stage_timeout
+        self.stages: Dict[str, Stage] = {}
+
+    def add(self, name: str, func: Callable[[Dict[str, Any]], Any], deps: Iterable[str] = (),
+            on_done: Optional[Callable[[Any], None]] = None, optional: bool = False,
+            timeout: Optional[float] = None, fallback: Any = None) -> "Pipeline":
+        if name in self.stages:
+            raise ValueError(f"Duplicate pipeline stage: {name}")
+        self.stages[name] = Stage(name, func, deps, on_done, optional, timeout, fallback)
+        return self
+
+    def _validate(self, inputs: Dict[str, Any]) -> None:
+        for stage in self.stages.values():
+            for dep in stage.deps:
+                if dep not in self.stages and dep not in inputs:
+                    raise ValueError(f"Stage '{stage.name}' depends on unknown stage '{dep}'")
+        visiting, done = set(), set()
+
+        def visit(name: str) -> None:
+            if name in done or name not in self.stages:
+                return
+            if name in visiting:
+                raise ValueError(f"Pipeline '{self.name}' has a dependency cycle through '{name}'")
+            visiting.add(name)
+            for dep in self.stages[name].deps:
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+
+        for name in self.stages:
+            visit(name)
+
+    async def run(self, **inputs) -> PipelineRun:
+        """Runs every stage once its dependencies finished; `inputs` are available to all stages by name."""
+        self._validate(inputs)
+        results: Dict[str, Any] = dict(inputs)
+        timings: Dict[str, Dict[str, Any]] = {}
+        started = time.perf_counter()
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_stage(stage: Stage) -> None:
+            await asyncio.gather(*(tasks[dep] for dep in stage.deps if dep in tasks))
+            stage_start = time.perf_counter()
+            status = "ok"
+            timeout = stage.timeout if stage.timeout is not None else self.stage_timeout
+            try:
+                if inspect.iscoroutinefunction(stage.func):
+                    call = stage.func(results)
+                else:
+                    call = asyncio.to_thread(stage.func, results)
+                value = await asyncio.wait_for(call, timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"[{self.name}] stage '{stage.name}' timed out after {timeout:g}s; using its fallback.")
+                value, status = stage.fallback, TIMED_OUT
+            except Exception as e:
+                if not stage.optional:
+                    timings[stage.name] = {"start": round(stage_start - started, 3),
+                                           "seconds": round(time.perf_counter() - stage_start, 3), "status": "failed"}
+                    raise
+                logger.warning(f"[{self.name}] optional stage '{stage.name}' failed: {e}")
+                value, status = None, f"failed: {e}"
+            if status == "ok" and _reports_timeout(value):
+                logger.warning(f"[{self.name}] stage '{stage.name}' hit its agent deadline.")
+                status = TIMED_OUT
+            results[stage.name] = value
+            timings[stage.name] = {"start": round(stage_start - started, 3),
+                                   "seconds": round(time.perf_counter() - stage_start, 3), "status": status}
+            if stage.on_done is not None:
+                stage.on_done(value)
+
+        for stage in self.stages.values():
+            tasks[stage.name] = asyncio.ensure_future(run_stage(stage))
+        try:
+            await asyncio.gather(*tasks.values())
+        except Exception:
+            for task in tasks.values():
+                task.cancel()
+            raise
+        total = time.perf_counter() - started
+        logger.info(f"[{self.name}] finished in {total:.2f}s: " +
+                    ", ".join(f"{name}={t['seconds']:.2f}s" for name, t in timings.items()))
+        return PipelineRun(results, timings, total)
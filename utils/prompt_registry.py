@@ -0,0 +1,165 @@
+# utils/prompt_registry.py
+"""
+In-memory registry of the prompt templates in prompts/.
+
+All prompt files are read and validated once (preload at app start) and served from memory
+afterwards. With hot reload on, a lookup re-checks the file's mtime at most every
+PROMPT_RELOAD_INTERVAL seconds and picks up edits without a restart; an edit that fails
+validation is rejected and the previous text stays in use.
+
+The ReAct template used by ToolSelectorAgent ships as prompts/react.txt (the text of the
+hwchase17/react hub prompt), so building the agent never touches the network. Its SHA-256 is
+pinned below; a modified copy is still used, but logged, so local changes are deliberate.
+"""
+import os
+import time
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PROMPT_DIR = Path(__file__).resolve().parents[1] / "prompts"
+
+REACT_PROMPT_NAME = "react"
+# JSON variant of the ReAct template: each step is a JSON object constrained by a schema (see utils/structured_output.py)
+REACT_JSON_PROMPT_NAME = "react_json"
+# sha256 of prompts/react.txt as shipped (identical to hwchase17/react on LangChain Hub)
+REACT_PROMPT_SHA256 = "67cda2dbd2ed2036d2d34a70ac9b8ba8b10ebc74805f01524782d13155b2766a"
+
+# Placeholders a prompt must contain to be usable by the code that formats it
+REQUIRED_PLACEHOLDERS: Dict[str, tuple] = {
+    REACT_PROMPT_NAME: ("{tools}", "{tool_names}", "{input}", "{agent_scratchpad}"),
+    REACT_JSON_PROMPT_NAME: ("{tools}", "{tool_names}", "{input}", "{agent_scratchpad}"),
+}
+
+
+def sha256_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class PromptRegistry:
+    def __init__(self, prompt_dir: Path = PROMPT_DIR, hot_reload: bool = True, reload_interval: float = 2.0):
+        self.prompt_dir = Path(prompt_dir)
+        self.hot_reload = hot_reload
+        self.reload_interval = reload_interval
+        # name -> {"text", "mtime", "sha256", "checked"}
+        self._prompts: Dict[str, Dict] = {}
+        # Names that failed the last preload
+        self.failed: List[str] = []
+        self._lock = threading.Lock()
+
+    def path(self, name: str) -> Path:
+        return self.prompt_dir / f"{name}.txt"
+
+    @staticmethod
+    def validate(name: str, text: str) -> List[str]:
+        """Returns the problems with a prompt's text (empty list if it is usable)."""
+        problems = []
+        if not text.strip():
+            problems.append(f"{name}: prompt is empty")
+        for placeholder in REQUIRED_PLACEHOLDERS.get(name, ()):
+            if placeholder not in text:
+                problems.append(f"{name}: missing placeholder {placeholder}")
+        return problems
+
+    def _load(self, name: str) -> Optional[Dict]:
+        """Reads and validates one prompt file; None if it is missing or invalid."""
+        path = self.path(name)
+        try:
+            mtime = path.stat().st_mtime
+            text = path.read_text(encoding="utf-8")
+        except (FileNotFoundError, UnicodeDecodeError) as e:
+            logger.error(f"Could not read prompt '{name}' from {path}: {e}")
+            return None
+        problems = self.validate(name, text)
+        if problems:
+            logger.error(f"Rejected prompt {path}: {'; '.join(problems)}")
+            return None
+        entry = {"text": text, "mtime": mtime, "sha256": sha256_text(text), "checked": time.monotonic()}
+        if name == REACT_PROMPT_NAME and entry["sha256"] != REACT_PROMPT_SHA256:
+            logger.warning(f"{path} differs from the shipped ReAct template (sha256 {entry['sha256'][:12]}…); using it as is.")
+        return entry
+
+    def preload(self) -> List[str]:
+        """Loads every prompts/*.txt; returns the names that failed to load or validate."""
+        failed = []
+        for path in sorted(self.prompt_dir.glob("*.txt")):
+            entry = self._load(path.stem)
+            if entry is None:
+                failed.append(path.stem)
+                continue
+            with self._lock:
+                self._prompts[path.stem] = entry
+        self.failed = failed
+        logger.info(f"Loaded {len(self._prompts)} prompt templates from {self.prompt_dir}.")
+        return failed
+
+    def _maybe_reload(self, name: str, entry: Dict) -> Dict:
+        now = time.monotonic()
+        if not self.hot_reload or now - entry["checked"] < self.reload_interval:
+            return entry
+        entry["checked"] = now
+        try:
+            mtime = self.path(name).stat().st_mtime
+        except FileNotFoundError:
+            # Keep serving the last good text if the file disappears
+            return entry
+        if mtime == entry["mtime"]:
+            return entry
+        reloaded = self._load(name)
+        if reloaded is None:
+            # Don't retry the broken file until it changes again
+            entry["mtime"] = mtime
+            return entry
+        logger.info(f"Reloaded prompt '{name}' from {self.path(name)}.")
+        with self._lock:
+            self._prompts[name] = reloaded
+        return reloaded
+
+    def get(self, name: str, default: Optional[str] = None) -> str:
+        """Text of prompts/<name>.txt; `default` if it is missing or invalid (KeyError without a default)."""
+        with self._lock:
+            entry = self._prompts.get(name)
+        if entry is None:
+            entry = self._load(name)
+            if entry is None:
+                if default is None:
+                    raise KeyError(f"Prompt '{name}' not found in {self.prompt_dir}")
+                logger.warning(f"Prompt '{name}' unavailable; using the built-in default.")
+                return default
+            with self._lock:
+                self._prompts[name] = entry
+        return self._maybe_reload(name, entry)["text"]
+
+    def stats(self) -> List[Dict]:
+        with self._lock:
+            return [{"name": name, "sha256": entry["sha256"][:12], "chars": len(entry["text"])}
+                    for name, entry in sorted(self._prompts.items())]
+
+
+_registry: Optional[PromptRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_prompt_registry() -> PromptRegistry:
+    """
+    Process-wide registry configured from PROMPT_DIR, PROMPT_HOT_RELOAD and PROMPT_RELOAD_INTERVAL.
+    All prompts are preloaded when it is first created.
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = PromptRegistry(
+                prompt_dir=Path(os.getenv("PROMPT_DIR", str(PROMPT_DIR))),
+                hot_reload=os.getenv("PROMPT_HOT_RELOAD", "1").lower() in ("1", "true", "yes"),
+                reload_interval=float(os.getenv("PROMPT_RELOAD_INTERVAL", "2.0")),
+            )
+            _registry.preload()
+    return _registry
+
+
+def get_prompt(name: str, default: Optional[str] = None) -> str:
+    return get_prompt_registry().get(name, default)
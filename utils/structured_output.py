@@ -0,0 +1,109 @@
+# utils/structured_output.py
+"""
+Schema-constrained JSON output from Ollama.
+
+A caller declares a JSON schema for the reply. The schema is sent as Ollama's `format`, so the
+model's sampling is constrained to JSON of that shape, and the reply is validated locally with
+jsonschema, which also enforces the keywords Ollama's grammar ignores (enums on nested values,
+if/then, minLength, ...). Only a reply that is not valid JSON or violates the schema is retried,
+with the violations fed back to the model (see BaseAgent.structured).
+
+OLLAMA_FORMAT=json sends plain JSON mode instead of the schema, for Ollama servers older than 0.5.
+"""
+import os
+import re
+import json
+from typing import Dict, List, Union
+
+from jsonschema import Draft202012Validator
+
+# Keywords that only make sense to the local validator; stripped from the schema sent to Ollama
+_LOCAL_ONLY_KEYWORDS = ("if", "then", "else", "allOf", "not")
+_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*(.*?)\s*```\s*$", re.DOTALL)
+
+ENTITY_SCHEMA: Dict = {
+    "type": "object",
+    "properties": {
+        "material": {"type": "string", "minLength": 1},
+        "defect": {"type": "string", "minLength": 1},
+        "environment": {"type": "string", "minLength": 1},
+    },
+    "required": ["material", "defect", "environment"],
+}
+
+NAME_LISTS_SCHEMA: Dict = {
+    "type": "object",
+    "properties": {
+        "recommended_methods": {"type": "array", "items": {"type": "string", "minLength": 1}},
+        "recommended_sensors": {"type": "array", "items": {"type": "string", "minLength": 1}},
+    },
+    "required": ["recommended_methods", "recommended_sensors"],
+}
+
+FINAL_ANSWER = "Final Answer"
+
+
+def react_step_schema(tool_names: List[str]) -> Dict:
+    """One ReAct step: a tool call, or the final answer with the recommended name lists."""
+    return {
+        "type": "object",
+        "properties": {
+            "thought": {"type": "string"},
+            "action": {"type": "string", "enum": [*tool_names, FINAL_ANSWER]},
+            "action_input": {"type": "string"},
+            **NAME_LISTS_SCHEMA["properties"],
+        },
+        "required": ["thought", "action", "action_input"],
+        # The name lists are only required with the final answer
+        "if": {"properties": {"action": {"const": FINAL_ANSWER}}},
+        "then": {"required": NAME_LISTS_SCHEMA["required"]},
+    }
+
+
+class SchemaViolation(ValueError):
+    """The model's reply is not valid JSON or does not match the declared schema."""
+
+    def __init__(self, text: str, errors: List[str]):
+        super().__init__("; ".join(errors))
+        self.text = text
+        self.errors = errors
+
+
+def ollama_format(schema: Dict) -> Union[str, Dict]:
+    """The `format` to send to Ollama for `schema`."""
+    if os.getenv("OLLAMA_FORMAT", "schema").lower() == "json":
+        return "json"
+    return _strip_local_keywords(schema)
+
+
+def _strip_local_keywords(node):
+    if isinstance(node, dict):
+        return {k: _strip_local_keywords(v) for k, v in node.items() if k not in _LOCAL_ONLY_KEYWORDS}
+    if isinstance(node, list):
+        return [_strip_local_keywords(v) for v in node]
+    return node
+
+
+def parse_structured(text: str, schema: Dict):
+    """The reply decoded and validated against `schema`; raises SchemaViolation otherwise."""
+    fenced = _FENCE_RE.match(text)
+    try:
+        data = json.loads(fenced.group(1) if fenced else text)
+    except json.JSONDecodeError as e:
+        raise SchemaViolation(text, [f"not valid JSON ({e})"])
+    errors = [f"{'/'.join(str(p) for p in error.absolute_path) or '(root)'}: {error.message}"
+              for error in Draft202012Validator(schema).iter_errors(data)]
+    if errors:
+        raise SchemaViolation(text, errors)
+    return data
+
+
+def violation_feedback(violation: SchemaViolation) -> str:
+    """Message asking the model to correct a reply that violated the schema."""
+    problems = "\n".join(f"- {error}" for error in violation.errors)
+    return f"Your reply does not match the required JSON schema:\n{problems}\nReply again with only the corrected JSON object."
+
+
+def structured_retries() -> int:
+    """STRUCTURED_OUTPUT_RETRIES: extra attempts after a schema violation (default 2)."""
+    return int(os.getenv("STRUCTURED_OUTPUT_RETRIES", "2"))